@@ -0,0 +1,33 @@
+from django.contrib import admin
+from .models import Cart, CartItem, Order, OrderItem
+
+
+class CartItemInline(admin.TabularInline):
+    model = CartItem
+    extra = 0
+    raw_id_fields = ("produto",)
+
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    list_display = ("usuario", "criado_em", "atualizado_em")
+    search_fields = ("usuario__username", "usuario__email")
+    raw_id_fields = ("usuario",)
+    inlines = [CartItemInline]
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    raw_id_fields = ("produto",)
+    readonly_fields = ("preco_unitario",)
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ("id_pedido", "usuario", "status", "forma_pagamento", "criado_em")
+    list_filter = ("status", "forma_pagamento", "criado_em")
+    search_fields = ("id_pedido", "usuario__username", "usuario__email")
+    raw_id_fields = ("usuario",)
+    list_editable = ("status",)
+    inlines = [OrderItemInline]
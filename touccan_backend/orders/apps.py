@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class OrdersConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "orders"
+    verbose_name = "Pedidos"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,110 @@
+import uuid
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from products import inventory
+from products.models import Product
+from transactions.models import Transaction
+
+from .models import CartItem, Order, OrderItem
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+def line_total(quantity, price):
+    return F(quantity) * F(price)
+
+
+def cart_total(cart):
+    """Soma do carrinho aos preços atuais, calculada pelo banco."""
+    return CartItem.objects.filter(carrinho=cart).aggregate(
+        total=Coalesce(
+            Sum(line_total("quantidade", "produto__price"), output_field=MONEY),
+            Decimal("0"),
+            output_field=MONEY,
+        )
+    )["total"]
+
+
+def order_total(order):
+    return OrderItem.objects.filter(pedido=order).aggregate(
+        total=Sum(line_total("quantidade", "preco_unitario"), output_field=MONEY)
+    )["total"]
+
+
+def snapshot_items(order, cart):
+    """Copia os itens do carrinho para o pedido em um ``INSERT ... SELECT``.
+
+    O preço unitário sai do ``JOIN`` com ``products_product`` dentro do banco,
+    na mesma transação que baixou o estoque.
+    """
+    quote = connection.ops.quote_name
+
+    def column(model, name):
+        return quote(model._meta.get_field(name).column)
+
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    sql = (
+        f"INSERT INTO {quote(OrderItem._meta.db_table)} ("
+        f"{column(OrderItem, 'pedido')}, {column(OrderItem, 'produto')}, "
+        f"{column(OrderItem, 'quantidade')}, {column(OrderItem, 'preco_unitario')}, "
+        f"{column(OrderItem, 'criado_em')}, {column(OrderItem, 'atualizado_em')}) "
+        f"SELECT %s, i.{column(CartItem, 'produto')}, i.{column(CartItem, 'quantidade')}, "
+        f"p.{column(Product, 'price')}, %s, %s "
+        f"FROM {quote(CartItem._meta.db_table)} i "
+        f"INNER JOIN {quote(Product._meta.db_table)} p "
+        f"ON p.{quote(Product._meta.pk.column)} = i.{column(CartItem, 'produto')} "
+        f"WHERE i.{column(CartItem, 'carrinho')} = %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [order.pk, now, now, cart.pk])
+
+
+def checkout(cart, forma_pagamento, customer, id_endereco):
+    """Transforma o carrinho em pedido, em uma única transação.
+
+    O número de consultas é fixo, qualquer que seja o tamanho do carrinho:
+    itens (travados), pedido, reserva do estoque (``UPDATE`` condicional +
+    reservas), cópia dos itens com o preço, total, transação de pagamento e
+    limpeza do carrinho. As reservas usam o número do pedido como referência,
+    então aprovar ou recusar a transação confirma ou devolve o estoque.
+    """
+    with transaction.atomic():
+        items = dict(
+            CartItem.objects.select_for_update()
+            .filter(carrinho=cart)
+            .values_list("produto_id", "quantidade")
+        )
+        if not items:
+            raise EmptyCart("O carrinho está vazio.")
+        order = Order.objects.create(
+            usuario_id=cart.usuario_id,
+            forma_pagamento=forma_pagamento,
+            id_endereco=id_endereco,
+        )
+        inventory.reserve_many(items, reference=str(order.pk))
+        snapshot_items(order, cart)
+        order.total = order_total(order)
+        payment = Transaction.objects.create(
+            transaction_id=(
+                f"TXN-{timezone.now():%Y%m%d}-{uuid.uuid4().hex[:12].upper()}"
+            ),
+            order_id=str(order.pk),
+            payment_method=forma_pagamento,
+            amount=order.total,
+            description=f"Pedido {order.pk}",
+            **customer,
+        )
+        CartItem.objects.filter(carrinho=cart).delete()
+    return order, payment
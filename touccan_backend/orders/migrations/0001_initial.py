@@ -0,0 +1,202 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:50
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("products", "0004_stockreservation"),
+        ("transactions", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Cart",
+            fields=[
+                ("id_carrinho", models.AutoField(primary_key=True, serialize=False)),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+                (
+                    "usuario",
+                    models.OneToOneField(
+                        db_column="id_usuario",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="carrinho",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Usuário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Carrinho",
+                "verbose_name_plural": "Carrinhos",
+                "db_table": "tbl_carrinhos",
+            },
+        ),
+        migrations.CreateModel(
+            name="Order",
+            fields=[
+                ("id_pedido", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "id_endereco",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="Endereço"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("pago", "Pago"),
+                            ("enviado", "Enviado"),
+                            ("concluido", "Concluído"),
+                            ("cancelado", "Cancelado"),
+                        ],
+                        default="pendente",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+                ("deletado_em", models.DateTimeField(blank=True, null=True)),
+                (
+                    "forma_pagamento",
+                    models.ForeignKey(
+                        db_column="id_forma_pagamento",
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="pedidos",
+                        to="transactions.paymentmethod",
+                        verbose_name="Forma de pagamento",
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        db_column="id_usuario",
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="pedidos",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Usuário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Pedido",
+                "verbose_name_plural": "Pedidos",
+                "db_table": "tbl_pedidos",
+                "ordering": ["-criado_em", "-id_pedido"],
+            },
+        ),
+        migrations.CreateModel(
+            name="OrderItem",
+            fields=[
+                ("id_item", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "quantidade",
+                    models.PositiveIntegerField(
+                        validators=[django.core.validators.MinValueValidator(1)],
+                        verbose_name="Quantidade",
+                    ),
+                ),
+                (
+                    "preco_unitario",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="Preço unitário"
+                    ),
+                ),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+                ("deletado_em", models.DateTimeField(blank=True, null=True)),
+                (
+                    "pedido",
+                    models.ForeignKey(
+                        db_column="id_pedido",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="itens",
+                        to="orders.order",
+                        verbose_name="Pedido",
+                    ),
+                ),
+                (
+                    "produto",
+                    models.ForeignKey(
+                        db_column="id_produto",
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="itens_pedido",
+                        to="products.product",
+                        verbose_name="Produto",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Item do pedido",
+                "verbose_name_plural": "Itens do pedido",
+                "db_table": "tbl_itens_pedido",
+                "ordering": ["id_item"],
+            },
+        ),
+        migrations.CreateModel(
+            name="CartItem",
+            fields=[
+                ("id_item", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "quantidade",
+                    models.PositiveIntegerField(
+                        default=1,
+                        validators=[django.core.validators.MinValueValidator(1)],
+                        verbose_name="Quantidade",
+                    ),
+                ),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+                (
+                    "carrinho",
+                    models.ForeignKey(
+                        db_column="id_carrinho",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="itens",
+                        to="orders.cart",
+                        verbose_name="Carrinho",
+                    ),
+                ),
+                (
+                    "produto",
+                    models.ForeignKey(
+                        db_column="id_produto",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="itens_carrinho",
+                        to="products.product",
+                        verbose_name="Produto",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Item do carrinho",
+                "verbose_name_plural": "Itens do carrinho",
+                "db_table": "tbl_itens_carrinho",
+                "ordering": ["criado_em", "id_item"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("carrinho", "produto"),
+                        name="tbl_itens_carrinho_produto_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["usuario", "criado_em", "id_pedido"],
+                name="tbl_pedidos_id_usua_5e2169_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0002_atualizado_em_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="id_endereco",
+            field=models.PositiveIntegerField(verbose_name="Endereço"),
+        ),
+    ]
@@ -0,0 +1,217 @@
+from django.conf import settings
+from django.core.validators import MinValueValidator
+from django.db import models
+from django.utils.functional import cached_property
+from products.models import Product
+from transactions.models import PaymentMethod, Transaction
+
+
+class Cart(models.Model):
+    """Carrinho do usuário, guardado no servidor."""
+
+    id_carrinho = models.AutoField(primary_key=True)
+    usuario = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="carrinho",
+        db_column="id_usuario",
+        verbose_name="Usuário",
+    )
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "tbl_carrinhos"
+        verbose_name = "Carrinho"
+        verbose_name_plural = "Carrinhos"
+
+    def __str__(self):
+        return f"Carrinho de {self.usuario}"
+
+
+class CartItem(models.Model):
+
+    id_item = models.AutoField(primary_key=True)
+    carrinho = models.ForeignKey(
+        Cart,
+        on_delete=models.CASCADE,
+        related_name="itens",
+        db_column="id_carrinho",
+        verbose_name="Carrinho",
+    )
+    produto = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="itens_carrinho",
+        db_column="id_produto",
+        verbose_name="Produto",
+    )
+    quantidade = models.PositiveIntegerField(
+        default=1, validators=[MinValueValidator(1)], verbose_name="Quantidade"
+    )
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "tbl_itens_carrinho"
+        verbose_name = "Item do carrinho"
+        verbose_name_plural = "Itens do carrinho"
+        ordering = ["criado_em", "id_item"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["carrinho", "produto"], name="tbl_itens_carrinho_produto_uniq"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.quantidade}x {self.produto}"
+
+
+class OrderQuerySet(models.QuerySet):
+    """``with_transacao`` carrega a transação de cada pedido numa consulta.
+
+    Não há chave estrangeira (a transação guarda o número do pedido como
+    texto), então ``prefetch_related`` não serve: a carga é feita junto com
+    a dos pedidos e preenche ``Order.transacao``.
+    """
+
+    _with_transacao = False
+
+    def with_transacao(self):
+        clone = self._chain()
+        clone._with_transacao = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._with_transacao = self._with_transacao
+        return clone
+
+    def _fetch_all(self):
+        loaded = self._result_cache is not None
+        super()._fetch_all()
+        if self._with_transacao and not loaded:
+            attach_transactions(
+                [order for order in self._result_cache if isinstance(order, Order)]
+            )
+
+
+def attach_transactions(orders):
+    """Preenche ``transacao`` com a transação mais recente de cada pedido."""
+    if not orders:
+        return
+    latest = {}
+    payments = Transaction.objects.filter(
+        order_id__in=[str(order.pk) for order in orders]
+    ).order_by("created_at", "pk")
+    for payment in payments:
+        latest[payment.order_id] = payment
+    for order in orders:
+        order.__dict__["transacao"] = latest.get(str(order.pk))
+
+
+class Order(models.Model):
+    """Pedido (``tbl_pedidos`` em ``database/db.sql``)."""
+
+    PENDENTE = "pendente"
+    PAGO = "pago"
+    ENVIADO = "enviado"
+    CONCLUIDO = "concluido"
+    CANCELADO = "cancelado"
+    STATUS_CHOICES = [
+        (PENDENTE, "Pendente"),
+        (PAGO, "Pago"),
+        (ENVIADO, "Enviado"),
+        (CONCLUIDO, "Concluído"),
+        (CANCELADO, "Cancelado"),
+    ]
+
+    id_pedido = models.AutoField(primary_key=True)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.PROTECT,
+        related_name="pedidos",
+        db_column="id_usuario",
+        verbose_name="Usuário",
+    )
+    id_endereco = models.PositiveIntegerField(verbose_name="Endereço")
+    forma_pagamento = models.ForeignKey(
+        PaymentMethod,
+        on_delete=models.PROTECT,
+        related_name="pedidos",
+        db_column="id_forma_pagamento",
+        verbose_name="Forma de pagamento",
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDENTE, verbose_name="Status"
+    )
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+    deletado_em = models.DateTimeField(null=True, blank=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        db_table = "tbl_pedidos"
+        verbose_name = "Pedido"
+        verbose_name_plural = "Pedidos"
+        ordering = ["-criado_em", "-id_pedido"]
+        indexes = [
+            models.Index(fields=["usuario", "criado_em", "id_pedido"]),
+            models.Index(fields=["atualizado_em"]),
+        ]
+
+    def __str__(self):
+        return f"Pedido {self.pk} - {self.get_status_display()}"
+
+    @cached_property
+    def transacao(self):
+        """Transação de pagamento mais recente, ligada pelo ``order_id`` dela.
+
+        Numa listagem, use ``Order.objects.with_transacao()``: sem isso, cada
+        pedido faz a sua consulta.
+        """
+        return (
+            Transaction.objects.filter(order_id=str(self.pk))
+            .order_by("-created_at", "-pk")
+            .first()
+        )
+
+
+class OrderItem(models.Model):
+    """Item do pedido (``tbl_itens_pedido``), com o preço da hora da compra."""
+
+    id_item = models.AutoField(primary_key=True)
+    pedido = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name="itens",
+        db_column="id_pedido",
+        verbose_name="Pedido",
+    )
+    produto = models.ForeignKey(
+        Product,
+        on_delete=models.PROTECT,
+        related_name="itens_pedido",
+        db_column="id_produto",
+        verbose_name="Produto",
+    )
+    quantidade = models.PositiveIntegerField(
+        validators=[MinValueValidator(1)], verbose_name="Quantidade"
+    )
+    preco_unitario = models.DecimalField(
+        max_digits=10, decimal_places=2, verbose_name="Preço unitário"
+    )
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+    deletado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "tbl_itens_pedido"
+        verbose_name = "Item do pedido"
+        verbose_name_plural = "Itens do pedido"
+        ordering = ["id_item"]
+        indexes = [models.Index(fields=["atualizado_em"])]
+
+    def __str__(self):
+        return f"{self.quantidade}x {self.produto} (pedido {self.pedido_id})"
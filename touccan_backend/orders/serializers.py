@@ -0,0 +1,107 @@
+from rest_framework import serializers
+from transactions.models import PaymentMethod
+
+from .models import CartItem, Order, OrderItem
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    produto_titulo = serializers.CharField(source="produto.title", read_only=True)
+    produto_slug = serializers.CharField(source="produto.slug", read_only=True)
+    preco_unitario = serializers.DecimalField(
+        source="produto.price", max_digits=10, decimal_places=2, read_only=True
+    )
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CartItem
+        fields = [
+            "produto",
+            "produto_titulo",
+            "produto_slug",
+            "preco_unitario",
+            "quantidade",
+            "subtotal",
+            "atualizado_em",
+        ]
+        read_only_fields = ["atualizado_em"]
+
+    def validate_produto(self, value):
+        if not value.is_active:
+            raise serializers.ValidationError("Produto indisponível.")
+        return value
+
+
+class CartItemQuantitySerializer(serializers.Serializer):
+    quantidade = serializers.IntegerField(min_value=1)
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    produto_titulo = serializers.CharField(source="produto.title", read_only=True)
+    produto_slug = serializers.CharField(source="produto.slug", read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = [
+            "produto",
+            "produto_titulo",
+            "produto_slug",
+            "quantidade",
+            "preco_unitario",
+        ]
+        read_only_fields = fields
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    itens = OrderItemSerializer(many=True, read_only=True)
+    forma_pagamento_nome = serializers.CharField(
+        source="forma_pagamento.name", read_only=True
+    )
+    total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    transacao = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = [
+            "id_pedido",
+            "status",
+            "forma_pagamento",
+            "forma_pagamento_nome",
+            "id_endereco",
+            "total",
+            "transacao",
+            "itens",
+            "criado_em",
+            "atualizado_em",
+        ]
+        read_only_fields = fields
+
+    def get_transacao(self, obj):
+        payment = obj.transacao
+        if payment is None:
+            return None
+        return {"transaction_id": payment.transaction_id, "status": payment.status}
+
+
+class CheckoutSerializer(serializers.Serializer):
+    forma_pagamento = serializers.PrimaryKeyRelatedField(
+        queryset=PaymentMethod.objects.filter(is_active=True)
+    )
+    id_endereco = serializers.IntegerField(min_value=1)
+    customer_name = serializers.CharField(max_length=200, required=False)
+    customer_email = serializers.EmailField(required=False)
+    customer_phone = serializers.CharField(
+        max_length=20, required=False, allow_blank=True, default=""
+    )
+    customer_document = serializers.CharField(
+        max_length=20, required=False, allow_blank=True, default=""
+    )
+
+    def validate(self, attrs):
+        user = self.context["request"].user
+        attrs.setdefault("customer_name", user.get_full_name() or user.username)
+        attrs.setdefault("customer_email", user.email)
+        if not attrs["customer_email"]:
+            raise serializers.ValidationError(
+                {"customer_email": "Informe o e-mail do cliente."}
+            )
+        return attrs
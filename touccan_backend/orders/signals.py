@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from transactions.models import Transaction, TransactionStatus
+
+from .models import Order
+
+ORDER_STATUS = {
+    TransactionStatus.APPROVED: Order.PAGO,
+    TransactionStatus.REJECTED: Order.CANCELADO,
+    TransactionStatus.CANCELLED: Order.CANCELADO,
+}
+
+
+@receiver(post_save, sender=Transaction)
+def update_order_status(sender, instance, **kwargs):
+    status = ORDER_STATUS.get(instance.status)
+    if status is None or not str(instance.order_id).isdigit():
+        return
+    Order.objects.filter(pk=int(instance.order_id), status=Order.PENDENTE).update(
+        status=status, atualizado_em=timezone.now()
+    )
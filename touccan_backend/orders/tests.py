@@ -0,0 +1,173 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from products import inventory
+from products.models import Category, Product, StockReservation
+from transactions.models import PaymentMethod, Transaction
+
+from .models import Cart, CartItem, Order, OrderItem
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create_user(
+            "comprador", email="comprador@example.com", password="senha-de-teste"
+        )
+        cls.rival = User.objects.create_user(
+            "rival", email="rival@example.com", password="senha-de-teste"
+        )
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        category = Category.objects.create(name="Esporte")
+        cls.ball, cls.net = (
+            Product.objects.create(
+                title=title,
+                description="Oficial",
+                price=price,
+                stock_quantity=3,
+                category=category,
+                seller=seller,
+            )
+            for title, price in (("Bola", Decimal("90.00")), ("Rede", Decimal("45.50")))
+        )
+        cls.method = PaymentMethod.objects.create(name="Pix")
+
+    def setUp(self):
+        self.client.force_login(self.buyer)
+        self.cart_url = reverse("orders:cart-list")
+        self.checkout_url = reverse("orders:cart-checkout")
+
+    def add(self, product, quantity):
+        return self.client.post(
+            reverse("orders:cart-add-item"),
+            {"produto": product.pk, "quantidade": quantity},
+            content_type="application/json",
+        )
+
+    def checkout(self):
+        return self.client.post(
+            self.checkout_url,
+            {"forma_pagamento": self.method.pk, "id_endereco": 1},
+            content_type="application/json",
+        )
+
+    def stock(self, product):
+        return Product.objects.get(pk=product.pk).stock_quantity
+
+    def test_reading_the_cart_does_not_create_it(self):
+        response = self.client.get(self.cart_url)
+        self.assertEqual(
+            response.json(), {"id_carrinho": None, "itens": [], "total": "0.00"}
+        )
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.checkout().status_code, 400)
+        self.assertEqual(self.add(self.ball, 1).status_code, 201)
+        self.assertEqual(Cart.objects.get().usuario, self.buyer)
+
+    def test_order_keeps_the_prices_of_checkout_time(self):
+        self.add(self.ball, 2)
+        self.add(self.net, 1)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.json()["id_pedido"])
+        Product.objects.filter(pk=self.ball.pk).update(price=Decimal("120.00"))
+        self.assertEqual(
+            dict(
+                OrderItem.objects.filter(pedido=order).values_list(
+                    "produto_id", "preco_unitario"
+                )
+            ),
+            {self.ball.pk: Decimal("90.00"), self.net.pk: Decimal("45.50")},
+        )
+        self.assertEqual(response.json()["total"], "225.50")
+        payment = Transaction.objects.get(order_id=str(order.pk))
+        self.assertEqual(payment.amount, Decimal("225.50"))
+        self.assertEqual(self.stock(self.ball), 1)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_never_sells_beyond_stock(self):
+        self.add(self.ball, 2)
+        self.add(self.net, 1)
+        reserve_many = inventory.reserve_many
+        stock_at_conflict = {}
+
+        def rival_buys_first(items, **kwargs):
+            # Outro comprador leva duas bolas entre a leitura do carrinho e a
+            # baixa do estoque deste pedido.
+            inventory.reserve(self.ball.pk, 2, user=self.rival)
+            try:
+                return reserve_many(items, **kwargs)
+            except inventory.InsufficientStock:
+                stock_at_conflict.update(
+                    ball=self.stock(self.ball), net=self.stock(self.net)
+                )
+                raise
+
+        with mock.patch.object(inventory, "reserve_many", rival_buys_first):
+            response = self.checkout()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["produtos"], [self.ball.pk])
+        # Só a reserva do rival baixou o estoque; nada deste pedido ficou.
+        self.assertEqual(stock_at_conflict, {"ball": 1, "net": 3})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_failed_payment_record_rolls_back_the_reservation(self):
+        self.add(self.ball, 2)
+        with mock.patch.object(
+            Transaction.objects, "create", side_effect=DatabaseError("falhou")
+        ):
+            with self.assertRaises(DatabaseError):
+                self.checkout()
+        self.assertEqual(self.stock(self.ball), 3)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.get().quantidade, 2)
+
+    def test_checkout_requires_an_address(self):
+        self.add(self.ball, 1)
+        response = self.client.post(
+            self.checkout_url,
+            {"forma_pagamento": self.method.pk},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("id_endereco", response.json())
+        self.assertFalse(Order.objects.exists())
+
+    def test_cart_items_carry_their_own_subtotal(self):
+        self.add(self.ball, 2)
+        self.add(self.net, 1)
+        items = self.client.get(self.cart_url).json()["itens"]
+        self.assertEqual(
+            sorted(item["subtotal"] for item in items), ["180.00", "45.50"]
+        )
+
+    def test_order_list_loads_transactions_in_one_query(self):
+        orders_url = reverse("orders:order-list")
+
+        def list_orders():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(orders_url)
+            return response.json()["results"], len(queries)
+
+        self.add(self.ball, 1)
+        self.checkout()
+        _, one_order = list_orders()
+        self.add(self.net, 1)
+        self.checkout()
+        orders, two_orders = list_orders()
+        self.assertEqual(one_order, two_orders)
+        payments = dict(Transaction.objects.values_list("order_id", "transaction_id"))
+        self.assertEqual(
+            {
+                str(order["id_pedido"]): order["transacao"]["transaction_id"]
+                for order in orders
+            },
+            payments,
+        )
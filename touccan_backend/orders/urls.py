@@ -0,0 +1,13 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import CartViewSet, OrderViewSet
+
+router = DefaultRouter()
+router.register(r"cart", CartViewSet, basename="cart")
+router.register(r"orders", OrderViewSet, basename="order")
+
+urlpatterns = [
+    path("", include(router.urls)),
+]
+
+app_name = "orders"
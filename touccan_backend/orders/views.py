@@ -0,0 +1,157 @@
+from decimal import Decimal
+
+from django.db.models import ExpressionWrapper, F, Sum
+from products.counters import product_counters
+from products.inventory import InsufficientStock
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .checkout import MONEY, EmptyCart, cart_total, checkout, line_total
+from .models import Cart, CartItem, Order
+from .serializers import (
+    CartItemQuantitySerializer,
+    CartItemSerializer,
+    CheckoutSerializer,
+    OrderSerializer,
+)
+
+
+class CartViewSet(viewsets.GenericViewSet):
+    serializer_class = CartItemSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+    total_field = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+    def get_cart(self, create=False):
+        """Carrinho do usuário; só é criado na primeira adição de produto."""
+        if create:
+            return Cart.objects.get_or_create(usuario=self.request.user)[0]
+        return Cart.objects.filter(usuario=self.request.user).first()
+
+    def get_queryset(self):
+        # Uma linha por item: o subtotal é uma expressão, sem GROUP BY.
+        return (
+            CartItem.objects.filter(carrinho__usuario=self.request.user)
+            .select_related("produto")
+            .annotate(
+                subtotal=ExpressionWrapper(
+                    line_total("quantidade", "produto__price"), output_field=MONEY
+                )
+            )
+        )
+
+    def cart_response(self, cart, status=status.HTTP_200_OK):
+        if cart is None:
+            return Response(
+                {
+                    "id_carrinho": None,
+                    "itens": [],
+                    "total": self.total_field.to_representation(Decimal("0")),
+                },
+                status=status,
+            )
+        items = self.get_serializer(self.get_queryset(), many=True).data
+        return Response(
+            {
+                "id_carrinho": cart.pk,
+                "itens": items,
+                "total": self.total_field.to_representation(cart_total(cart)),
+            },
+            status=status,
+        )
+
+    def list(self, request):
+        return self.cart_response(self.get_cart())
+
+    @action(detail=False, methods=["post"], url_path="items")
+    def add_item(self, request):
+        """Adiciona o produto ao carrinho (ou soma à quantidade já existente)."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = self.get_cart(create=True)
+        quantity = serializer.validated_data.get("quantidade", 1)
+        item, created = CartItem.objects.get_or_create(
+            carrinho=cart,
+            produto=serializer.validated_data["produto"],
+            defaults={"quantidade": quantity},
+        )
+        if not created:
+            CartItem.objects.filter(pk=item.pk).update(
+                quantidade=F("quantidade") + quantity
+            )
+        product_counters.incr(item.produto.slug, "cart_adds")
+        return self.cart_response(cart, status=status.HTTP_201_CREATED)
+
+    @action(
+        detail=False,
+        methods=["patch", "delete"],
+        url_path=r"items/(?P<produto>\d+)",
+    )
+    def item(self, request, produto=None):
+        cart = self.get_cart()
+        items = CartItem.objects.filter(carrinho=cart, produto_id=produto)
+        if request.method == "DELETE":
+            items.delete()
+            return self.cart_response(cart)
+        serializer = CartItemQuantitySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not items.update(quantidade=serializer.validated_data["quantidade"]):
+            return Response(
+                {"detail": "Produto não está no carrinho."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return self.cart_response(cart)
+
+    @action(detail=False, methods=["post"])
+    def checkout(self, request):
+        """Fecha o carrinho: cria o pedido, reserva o estoque e a transação."""
+        serializer = CheckoutSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        forma_pagamento = data.pop("forma_pagamento")
+        id_endereco = data.pop("id_endereco")
+        cart = self.get_cart()
+        try:
+            if cart is None:
+                raise EmptyCart("O carrinho está vazio.")
+            order, payment = checkout(
+                cart, forma_pagamento, data, id_endereco=id_endereco
+            )
+        except EmptyCart as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as error:
+            return Response(
+                {"detail": str(error), "produtos": error.product_ids},
+                status=status.HTTP_409_CONFLICT,
+            )
+        order = orders_with_totals().get(pk=order.pk)
+        return Response(
+            OrderSerializer(order, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+def orders_with_totals():
+    return (
+        Order.objects.with_transacao()
+        .select_related("forma_pagamento")
+        .prefetch_related("itens__produto")
+        .annotate(
+            total=Sum(
+                line_total("itens__quantidade", "itens__preco_unitario"),
+                output_field=MONEY,
+            )
+        )
+    )
+
+
+class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return orders_with_totals().filter(usuario=self.request.user)
@@ -0,0 +1,147 @@
+"""
+Leituras do catálogo em views assíncronas, para servir sob ASGI.
+
+Mesmas respostas (JSON) de ``ProductViewSet.list``/``retrieve``/``search`` e
+``CategoryViewSet.tree``: filtros, busca e ordenação são os backends do
+próprio viewset, e o cache de respostas e o ``ETag`` são os das versões
+síncronas (``cached_json``). O ganho aqui é não ocupar uma thread por
+requisição enquanto o banco responde; só a montagem do queryset (que pode
+carregar a árvore de categorias ou validar um ``category`` no banco) vai
+para uma thread.
+"""
+
+from asgiref.sync import sync_to_async
+from django.db.models import Case, Q, When
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
+from touccan_backend.async_api import (
+    api_request,
+    cached_json,
+    json_response,
+    not_found,
+    viewset_for,
+)
+from touccan_backend.db_routing import ause_replicas
+from touccan_backend.pagination import KeysetPagination
+from touccan_backend.planner import plan_queryset
+
+from .counters import product_counters
+from .models import Product
+from .search import search_index
+from .serializers import CategorySerializer, ProductSerializer, compiled_product_list
+from .tree import acategory_tree
+from .views import CategoryViewSet, ProductViewSet
+
+
+async def product_queryset(view, narrow=None):
+    """``filter_queryset(get_queryset())`` do viewset, montado numa thread."""
+
+    def build():
+        queryset = view.get_queryset()
+        if narrow is not None:
+            queryset = narrow(queryset)
+        return view.filter_queryset(queryset)
+
+    return await sync_to_async(build)()
+
+
+async def paginated_products(request, queryset):
+    paginator = KeysetPagination()
+    rows = await paginator.apaginate_queryset(
+        compiled_product_list.values(queryset), request
+    )
+    data = await compiled_product_list.aserialize(rows, {"request": request})
+    return paginator.get_paginated_response(data).data
+
+
+@require_safe
+async def product_list(request):
+    await ause_replicas(request)
+    request = api_request(request)
+    view = viewset_for(ProductViewSet, request, "list")
+
+    async def respond():
+        try:
+            queryset = await product_queryset(view)
+            return await paginated_products(request, queryset)
+        except ValidationError as error:
+            return json_response(error.detail, status=400)
+        except NotFound:
+            return not_found()
+
+    return await cached_json(request, view, respond)
+
+
+@require_safe
+async def product_search(request):
+    await ause_replicas(request)
+    request = api_request(request)
+    query = request.query_params.get("q", "")
+    if not query:
+        return json_response(
+            {"detail": 'Parâmetro de busca "q" é obrigatório.'}, status=400
+        )
+    view = viewset_for(ProductViewSet, request, "search")
+    ranked_ids = await sync_to_async(search_index.search)(query)
+    try:
+        if ranked_ids is None:
+            products = await product_queryset(
+                view,
+                lambda queryset: queryset.filter(
+                    Q(title__icontains=query) | Q(description__icontains=query)
+                ),
+            )
+            return json_response(await paginated_products(request, products))
+        products = await product_queryset(
+            view, lambda queryset: queryset.filter(pk__in=ranked_ids)
+        )
+        if not request.query_params.get(OrderingFilter.ordering_param):
+            products = products.order_by(
+                Case(*[When(pk=pk, then=rank) for rank, pk in enumerate(ranked_ids)])
+            )
+        return json_response(await paginated_products(request, products))
+    except ValidationError as error:
+        return json_response(error.detail, status=400)
+    except NotFound:
+        return not_found()
+
+
+@require_safe
+async def product_detail(request, slug):
+    await ause_replicas(request)
+    request = api_request(request)
+    view = viewset_for(ProductViewSet, request, "retrieve", slug=slug)
+
+    async def respond():
+        queryset = plan_queryset(
+            Product.objects.filter(is_active=True), ProductSerializer
+        )
+        try:
+            product = await queryset.aget(slug=slug)
+        except Product.DoesNotExist:
+            return not_found(Product)
+        # ``category_path`` vem do snapshot da árvore; carregado aqui, fora do loop.
+        await acategory_tree()
+        return ProductSerializer(product, context={"request": request}).data
+
+    response = await cached_json(request, view, respond)
+    # Só slugs que existem entram no buffer (um 304 também é uma visita).
+    if response.status_code in (200, 304):
+        product_counters.incr(slug, "views")
+    return response
+
+
+@require_safe
+async def category_tree_view(request):
+    await ause_replicas(request)
+    request = api_request(request)
+    view = viewset_for(CategoryViewSet, request, "tree")
+
+    async def respond():
+        tree = await acategory_tree()
+        return CategorySerializer(
+            tree.roots, many=True, context={"request": request}
+        ).data
+
+    return await cached_json(request, view, respond)
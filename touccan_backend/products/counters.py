@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Case, F, FloatField, PositiveBigIntegerField, Value, When
+from django.db.models.functions import Power
+
+from .models import Product, ProductActivity
+
+logger = logging.getLogger(__name__)
+
+
+class ProductCounters:
+    """Buffer, por processo, de visualizações e adições ao carrinho.
+
+    Os incrementos ficam em memória (por slug) e vão para o banco em lote
+    quando o buffer enche ou o intervalo vence: um ``INSERT`` que ignora as
+    linhas já existentes e um único ``UPDATE ... CASE`` para todos os
+    produtos. Na mesma consulta a pontuação de tendência decai com meia-vida
+    ``HALF_LIFE`` e recebe o ganho do lote:
+    ``score * 0.5 ** ((agora - score_at) / meia_vida) + ganho``.
+
+    Um timer grava o que sobrou num worker que parou de receber acessos.
+    Nada é gravado na saída do processo: comandos do ``manage.py`` e a
+    suíte de testes não escrevem no banco por importar este módulo, e os
+    incrementos de um worker encerrado antes do intervalo se perdem.
+    """
+
+    fields = ("views", "cart_adds")
+    trending_key = "products:trending"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = self._empty()
+        self._flushed_at = time.monotonic()
+        self._flushing = False
+        self._timer = None
+
+    @property
+    def options(self):
+        options = {
+            "FLUSH_INTERVAL": 10,
+            "MAX_PENDING": 500,
+            "HALF_LIFE": 6 * 3600,
+            "WEIGHTS": {"views": 1.0, "cart_adds": 5.0},
+            "TRENDING_SIZE": 100,
+            "TRENDING_TTL": 60,
+            "BACKGROUND_FLUSH": True,
+        }
+        options.update(getattr(settings, "PRODUCT_COUNTERS", {}))
+        return options
+
+    def _empty(self):
+        return {field: Counter() for field in self.fields}
+
+    def incr(self, slug, field, amount=1):
+        options = self.options
+        with self._lock:
+            self._pending[field][slug] += amount
+            if not options["BACKGROUND_FLUSH"]:
+                return
+            wait = options["FLUSH_INTERVAL"] - (time.monotonic() - self._flushed_at)
+            full = (
+                sum(len(counts) for counts in self._pending.values())
+                >= options["MAX_PENDING"]
+            )
+            if not full and wait > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self.flush_in_background)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        threading.Thread(
+            target=self.flush_in_background, name="product-counters", daemon=True
+        ).start()
+
+    def flush_in_background(self):
+        """Alvo das threads e do timer; uma gravação por vez."""
+        with self._lock:
+            if self._flushing:
+                return
+            self._flushing = True
+        try:
+            self.flush()
+        finally:
+            self._flushing = False
+            close_old_connections()
+
+    def flush(self):
+        """Grava o buffer; devolve quantos produtos foram atualizados."""
+        with self._lock:
+            pending, self._pending = self._pending, self._empty()
+            self._flushed_at = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        slugs = set().union(*pending.values())
+        if not slugs:
+            return 0
+        try:
+            return self.write(pending, slugs)
+        except DatabaseError:
+            logger.exception(
+                "Falha ao gravar os contadores; ficam para o próximo lote."
+            )
+            with self._lock:
+                for field, counts in pending.items():
+                    self._pending[field].update(counts)
+            return 0
+
+    def write(self, pending, slugs):
+        ids = dict(Product.objects.filter(slug__in=slugs).values_list("slug", "pk"))
+        options = self.options
+        totals = {field: Counter() for field in ("score", *self.fields)}
+        for field, counts in pending.items():
+            for slug, count in counts.items():
+                if slug in ids:
+                    totals[field][ids[slug]] += count
+                    totals["score"][ids[slug]] += options["WEIGHTS"][field] * count
+        if not totals["score"]:
+            return 0
+
+        def per_product(field, output_field):
+            return Case(
+                *(
+                    When(product_id=pk, then=Value(value))
+                    for pk, value in totals[field].items()
+                ),
+                default=Value(0),
+                output_field=output_field,
+            )
+
+        now = time.time()
+        product_ids = list(totals["score"])
+        with transaction.atomic():
+            ProductActivity.objects.bulk_create(
+                [ProductActivity(product_id=pk, score_at=now) for pk in product_ids],
+                ignore_conflicts=True,
+            )
+            # ``score`` vem antes de ``score_at``: o MySQL avalia o SET da
+            # esquerda para a direita e o decaimento precisa do valor antigo.
+            ProductActivity.objects.filter(product_id__in=product_ids).update(
+                views=F("views") + per_product("views", PositiveBigIntegerField()),
+                cart_adds=F("cart_adds")
+                + per_product("cart_adds", PositiveBigIntegerField()),
+                score=F("score") * self.decay(now) + per_product("score", FloatField()),
+                score_at=Value(now),
+            )
+        return len(product_ids)
+
+    def decay(self, now):
+        return Power(
+            Value(0.5),
+            (Value(now) - F("score_at")) / Value(float(self.options["HALF_LIFE"])),
+            output_field=FloatField(),
+        )
+
+    def rank(self):
+        now = time.time()
+        return list(
+            ProductActivity.objects.filter(product__is_active=True, score__gt=0)
+            .annotate(current=F("score") * self.decay(now))
+            .order_by("-current", "product_id")
+            .values_list("product_id", flat=True)[: self.options["TRENDING_SIZE"]]
+        )
+
+    def trending(self):
+        """Ids dos produtos em alta, do ranking pré-calculado.
+
+        O ranking fica no cache compartilhado e é refeito no máximo uma vez
+        a cada ``TRENDING_TTL`` segundos.
+        """
+        ranking = cache.get(self.trending_key)
+        if ranking is None:
+            ranking = self.rank()
+            cache.set(self.trending_key, ranking, self.options["TRENDING_TTL"])
+        return ranking
+
+
+product_counters = ProductCounters()
@@ -0,0 +1,454 @@
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Count, Q
+
+from .models import Product
+from .tree import category_tree
+
+logger = logging.getLogger(__name__)
+
+NONZERO_BYTE_RE = re.compile(rb"[^\x00]")
+
+FILTER_PARAMS = frozenset(
+    [
+        "category",
+        "category_slug",
+        "seller",
+        "featured",
+        "in_stock",
+        "price_min",
+        "price_max",
+    ]
+)
+
+IGNORED_PARAMS = frozenset(["format", "cursor", "page_size", "count"])
+
+TRUE_VALUES = {"true", "True", "1"}
+FALSE_VALUES = {"false", "False", "0"}
+
+
+def bitset(positions):
+    """Monta um bitset (``int``) a partir de posições."""
+    return int.from_bytes(bitmap(positions), "little")
+
+
+def bitmap(positions):
+    """Bytes de um bitset, alteráveis bit a bit."""
+    positions = list(positions)
+    if not positions:
+        return bytearray()
+    data = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return data
+
+
+class Bitsets:
+    """Bitsets de um atributo, um por valor.
+
+    Guardados como ``bytearray``: ligar ou desligar um bit ao salvar um
+    produto é O(1). O ``int`` usado nas interseções é montado na primeira
+    consulta depois de uma mudança naquele valor, e não a cada escrita.
+    """
+
+    def __init__(self, groups=()):
+        self.data = {value: bitmap(positions) for value, positions in groups}
+        self.ints = {}
+
+    def get(self, value, default=0):
+        bits = self.ints.get(value)
+        if bits is None:
+            data = self.data.get(value)
+            if data is None:
+                return default
+            bits = self.ints[value] = int.from_bytes(data, "little")
+        return bits
+
+    def items(self):
+        for value in list(self.data):
+            yield value, self.get(value)
+
+    def set(self, value, position, on):
+        index, bit = position >> 3, 1 << (position & 7)
+        data = self.data.get(value)
+        if data is None:
+            if not on:
+                return
+            data = self.data[value] = bytearray()
+        if index >= len(data):
+            if not on:
+                return
+            data.extend(bytes(index + 1 - len(data)))
+        if on:
+            data[index] |= bit
+        else:
+            data[index] &= ~bit & 0xFF
+        self.ints.pop(value, None)
+
+
+def iter_positions(bits, reverse=False):
+    """Percorre as posições ligadas, pulando bytes zerados."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    matches = list(NONZERO_BYTE_RE.finditer(data))
+    for match in reversed(matches) if reverse else matches:
+        index = match.start()
+        byte = data[index]
+        offsets = range(7, -1, -1) if reverse else range(8)
+        for offset in offsets:
+            if byte >> offset & 1:
+                yield index * 8 + offset
+
+
+class CatalogIndex:
+    """Índice de bitsets sobre os produtos ativos para filtros e facetas.
+
+    Cada produto recebe uma posição densa (ordem de criação) e cada valor de
+    categoria, vendedor, destaque, estoque e faixa de preço guarda um bitset
+    dessas posições. Um filtro vira uma interseção de inteiros e as contagens
+    de facetas saem de ``bit_count()`` sobre o resultado.
+
+    Cada processo tem a sua cópia. Toda escrita que muda um atributo
+    indexado (``save()``, escritas em lote, estoque que zera ou volta,
+    importação) avança uma versão no cache compartilhado com ``touch()``; um
+    índice carregado com outra versão não responde (as consultas vão para o
+    SQL) até ser recarregado em segundo plano.
+    """
+
+    version_key = "catalog-index:version"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loading = False
+        self._loaded_at = 0.0
+        self.ready = False
+        self.version = None
+
+    @property
+    def options(self):
+        options = {
+            "PRICE_BUCKETS": [0, 50, 100, 200, 500, 1000, 5000],
+            "MAX_IN_IDS": 2000,
+            "TTL": 300,
+        }
+        options.update(getattr(settings, "CATALOG_INDEX", {}))
+        return options
+
+    @property
+    def bounds(self):
+        return [Decimal(str(bound)) for bound in self.options["PRICE_BUCKETS"]]
+
+    def bucket_for(self, price):
+        index = 0
+        for index, lower in enumerate(self.price_bounds):
+            if price < lower:
+                return index - 1
+        return index
+
+    def bucket_label(self, index):
+        lower = self.price_bounds[index]
+        if index + 1 < len(self.price_bounds):
+            return f"{lower}-{self.price_bounds[index + 1]}"
+        return f"{lower}+"
+
+    def shared_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # Parte do relógio, como as versões de tag do cache de respostas.
+            cache.add(self.version_key, time.time_ns(), timeout=None)
+            version = cache.get(self.version_key)
+        return version
+
+    def touch(self):
+        """Avança a versão compartilhada depois de uma escrita confirmada.
+
+        Se ninguém mais escreveu desde a carga, as mudanças já aplicadas
+        aqui por ``update``/``remove`` deixam o índice local em dia.
+        """
+        try:
+            version = cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, time.time_ns(), timeout=None)
+            return
+        with self._lock:
+            if self.ready and self.version == version - 1:
+                self.version = version
+
+    def load(self):
+        # Lida antes das linhas: uma escrita durante a carga muda a versão.
+        version = self.shared_version()
+        rows = (
+            Product.objects.filter(is_active=True)
+            .order_by("created_at", "id")
+            .values_list(
+                "id", "category_id", "seller_id", "featured", "stock_quantity", "price"
+            )
+        )
+        self.price_bounds = self.bounds
+        positions = {}
+        ids, prices, facts = [], [], []
+        groups = {
+            name: defaultdict(list)
+            for name in ("category", "seller", "featured", "in_stock", "price")
+        }
+
+        for position, (pk, category_id, seller_id, featured, stock, price) in enumerate(
+            rows.iterator(chunk_size=5000)
+        ):
+            positions[pk] = position
+            ids.append(pk)
+            prices.append(price)
+            fact = {
+                "category": category_id,
+                "seller": seller_id,
+                "featured": featured,
+                "in_stock": stock > 0,
+                "price": self.bucket_for(price),
+            }
+            facts.append(fact)
+            for name, value in fact.items():
+                groups[name][value].append(position)
+
+        bitsets = {name: Bitsets(values.items()) for name, values in groups.items()}
+        with self._lock:
+            self.positions, self.product_ids, self.prices, self.facts = (
+                positions,
+                ids,
+                prices,
+                facts,
+            )
+            self.bitsets = bitsets
+            self.active_bits = Bitsets([(True, range(len(ids)))])
+            self.version = version
+            self.ready = True
+            self._loaded_at = time.monotonic()
+
+    @property
+    def active(self):
+        return self.active_bits.get(True)
+
+    def is_warm(self):
+        """Indica se o índice pode responder; se não, agenda a carga."""
+        if not self.ready:
+            self.warm_up()
+            return False
+        if self.version != self.shared_version():
+            # Escrita em outro processo (ou ``UPDATE`` direto): até a nova
+            # carga, as consultas vão para o SQL.
+            self.warm_up(force=True)
+            return False
+        if time.monotonic() - self._loaded_at >= self.options["TTL"]:
+            # Rede de segurança para escritas que não chamam ``touch``.
+            self.warm_up(force=True)
+        return True
+
+    def warm_up(self, force=False):
+        """Carrega o índice em segundo plano; até lá as consultas usam SQL."""
+        with self._lock:
+            if (self.ready and not force) or self._loading:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                self.load()
+            except DatabaseError as error:
+                # Continua fora de uso; a próxima consulta tenta de novo.
+                logger.warning("Falha ao carregar o índice do catálogo: %s", error)
+            finally:
+                self._loading = False
+                close_old_connections()
+
+        threading.Thread(target=run, name="catalog-index", daemon=True).start()
+
+    def _set(self, name, value, position, on):
+        self.bitsets[name].set(value, position, on)
+
+    def update(self, product):
+        with self._lock:
+            if not self.ready:
+                return
+            position = self.positions.get(product.pk)
+            if position is None:
+                if not product.is_active:
+                    return
+                position = len(self.product_ids)
+                self.positions[product.pk] = position
+                self.product_ids.append(product.pk)
+                self.prices.append(product.price)
+                self.facts.append({})
+            for name, value in self.facts[position].items():
+                self._set(name, value, position, False)
+
+            if not product.is_active:
+                self.facts[position] = {}
+                self.active_bits.set(True, position, False)
+                return
+            fact = {
+                "category": product.category_id,
+                "seller": product.seller_id,
+                "featured": product.featured,
+                "in_stock": product.stock_quantity > 0,
+                "price": self.bucket_for(Decimal(str(product.price))),
+            }
+            for name, value in fact.items():
+                self._set(name, value, position, True)
+            self.facts[position] = fact
+            self.prices[position] = Decimal(str(product.price))
+            self.active_bits.set(True, position, True)
+
+    def remove(self, product_id):
+        with self._lock:
+            if not self.ready or product_id not in self.positions:
+                return
+            position = self.positions[product_id]
+            for name, value in self.facts[position].items():
+                self._set(name, value, position, False)
+            self.facts[position] = {}
+            self.active_bits.set(True, position, False)
+
+    def supports(self, params):
+        return set(params) - IGNORED_PARAMS <= FILTER_PARAMS
+
+    def filter(self, params, tree=None):
+        """Interseção dos filtros; ``None`` se algum valor não for reconhecido."""
+        with self._lock:
+            result = self.active
+            bitsets = self.bitsets
+            try:
+                if params.get("category"):
+                    result &= bitsets["category"].get(int(params["category"]), 0)
+                if params.get("seller"):
+                    result &= bitsets["seller"].get(int(params["seller"]), 0)
+            except ValueError:
+                return None
+            if params.get("category_slug"):
+                tree = category_tree() if tree is None else tree
+                path = tree.get_path_for_slug(params["category_slug"])
+                subtree = 0
+                if path is not None:
+                    for category in tree.by_id.values():
+                        if category.path.startswith(path):
+                            subtree |= bitsets["category"].get(category.pk, 0)
+                result &= subtree
+            for name in ("featured", "in_stock"):
+                value = params.get(name)
+                if value in TRUE_VALUES:
+                    result &= bitsets[name].get(True, 0)
+                elif value in FALSE_VALUES and name == "featured":
+                    result &= bitsets[name].get(False, 0)
+            try:
+                price_min = (
+                    Decimal(params["price_min"]) if params.get("price_min") else None
+                )
+                price_max = (
+                    Decimal(params["price_max"]) if params.get("price_max") else None
+                )
+            except InvalidOperation:
+                return None
+            if price_min is not None or price_max is not None:
+                result &= self._price_range(price_min, price_max)
+            return result
+
+    def _price_range(self, price_min, price_max):
+        low = 0 if price_min is None else self.bucket_for(price_min)
+        high = (
+            len(self.price_bounds) - 1
+            if price_max is None
+            else self.bucket_for(price_max)
+        )
+        matched = 0
+        for bucket in range(max(low, 0), high + 1):
+            bits = self.bitsets["price"].get(bucket, 0)
+            if bucket in (low, high):
+                bits = bitset(
+                    position
+                    for position in iter_positions(bits)
+                    if (price_min is None or self.prices[position] >= price_min)
+                    and (price_max is None or self.prices[position] <= price_max)
+                )
+            matched |= bits
+        return matched
+
+    def facets(self, result):
+        with self._lock:
+            counts = {}
+            for name, values in self.bitsets.items():
+                counts[name] = {
+                    self.bucket_label(value) if name == "price" else value: count
+                    for value, bits in values.items()
+                    if (count := (result & bits).bit_count())
+                }
+            return result.bit_count(), counts
+
+    def lookup(self, params, tree=None):
+        """Ids filtrados pelo índice, ou ``None`` para cair no SQL.
+
+        ``tree`` é o snapshot de categorias a usar; sem ele, o atual (que pode
+        ser carregado do banco aqui).
+        """
+        params = {name: value for name, value in params.items() if value}
+        if not self.supports(params) or not self.is_warm():
+            return None
+        result = self.filter(params, tree)
+        if result is None or result.bit_count() > self.options["MAX_IN_IDS"]:
+            return None
+        return self.ids(result)
+
+    def ids(self, result, limit=None):
+        """Ids do resultado do mais novo para o mais antigo."""
+        ids = []
+        for position in iter_positions(result, reverse=True):
+            ids.append(self.product_ids[position])
+            if limit is not None and len(ids) >= limit:
+                break
+        return ids
+
+
+def sql_facets(queryset, bounds):
+    """Mesmas contagens do ``CatalogIndex``, calculadas no banco."""
+    queryset = queryset.order_by()
+    buckets = {}
+    for index, lower in enumerate(bounds):
+        condition = Q(price__gte=lower)
+        label = f"{lower}+"
+        if index + 1 < len(bounds):
+            condition &= Q(price__lt=bounds[index + 1])
+            label = f"{lower}-{bounds[index + 1]}"
+        buckets[label] = Count("id", filter=condition)
+    totals = queryset.aggregate(
+        total=Count("id"),
+        featured_true=Count("id", filter=Q(featured=True)),
+        in_stock_true=Count("id", filter=Q(stock_quantity__gt=0)),
+        **{f"price_{index}": bucket for index, bucket in enumerate(buckets.values())},
+    )
+    grouped = {
+        name: {
+            row[name]: row["total"]
+            for row in queryset.values(name).annotate(total=Count("id"))
+        }
+        for name in ("category", "seller")
+    }
+    featured_false = totals["total"] - totals["featured_true"]
+    in_stock_false = totals["total"] - totals["in_stock_true"]
+    facets = {
+        **grouped,
+        "featured": {True: totals["featured_true"], False: featured_false},
+        "in_stock": {True: totals["in_stock_true"], False: in_stock_false},
+        "price": {
+            label: totals[f"price_{index}"] for index, label in enumerate(buckets)
+        },
+    }
+    for name in ("featured", "in_stock", "price"):
+        facets[name] = {value: count for value, count in facets[name].items() if count}
+    return totals["total"], facets
+
+
+catalog_index = CatalogIndex()
@@ -0,0 +1,256 @@
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from touccan_backend.response_cache import response_cache
+
+from .models import Product, StockReservation
+from .signals import sync_bulk_products
+
+
+class StockError(Exception):
+    pass
+
+
+class InsufficientStock(StockError):
+    def __init__(self, message="Estoque insuficiente.", product_ids=()):
+        super().__init__(message)
+        self.product_ids = list(product_ids)
+
+
+class ReservationNotActive(StockError):
+    pass
+
+
+class ReservationLimit(StockError):
+    pass
+
+
+def reservation_ttl():
+    return datetime.timedelta(seconds=getattr(settings, "STOCK_RESERVATION_TTL", 900))
+
+
+def max_held_per_user():
+    return getattr(settings, "STOCK_RESERVATION_MAX_HELD", 20)
+
+
+def check_user_limit(user, quantity):
+    """Barra quem passaria de ``STOCK_RESERVATION_MAX_HELD`` unidades retidas.
+
+    A linha do usuário fica travada até o fim da transação, para que duas
+    reservas simultâneas do mesmo usuário não passem ambas pelo limite.
+    """
+    list(
+        get_user_model()
+        .objects.select_for_update()
+        .filter(pk=user.pk)
+        .values_list("pk", flat=True)
+    )
+    held = StockReservation.objects.filter(
+        user=user, status=StockReservation.HELD, expires_at__gt=timezone.now()
+    ).aggregate(total=Sum("quantity"))["total"]
+    limit = max_held_per_user()
+    if (held or 0) + quantity > limit:
+        raise ReservationLimit(
+            f"Limite de {limit} unidades reservadas por usuário atingido."
+        )
+
+
+def stock_changed(product_id, crossed_zero):
+    """Atualiza índices e caches depois de mexer no estoque por ``UPDATE``."""
+
+    def run():
+        if crossed_zero:
+            sync_bulk_products(Product.objects.filter(pk=product_id))
+        else:
+            response_cache.invalidate(f"product:{product_id}")
+
+    transaction.on_commit(run)
+
+
+def reserve(product_id, quantity, reference="", ttl=None, user=None):
+    """Retira ``quantity`` do estoque e devolve a reserva criada.
+
+    O decremento é um único ``UPDATE ... WHERE stock_quantity >= n``: com
+    compradores concorrentes, o banco serializa as linhas e só quem ainda
+    encontra estoque suficiente tem a linha atualizada. Nada é lido antes,
+    então não há janela para vender além do estoque. Com ``user``, a reserva
+    fica em nome dele e conta no limite por usuário.
+    """
+    if quantity < 1:
+        raise StockError("A quantidade deve ser maior que zero.")
+    with transaction.atomic():
+        if user is not None:
+            check_user_limit(user, quantity)
+        updated = Product.objects.filter(
+            pk=product_id, is_active=True, stock_quantity__gte=quantity
+        ).update(
+            stock_quantity=F("stock_quantity") - quantity, updated_at=timezone.now()
+        )
+        if not updated:
+            raise InsufficientStock("Estoque insuficiente.")
+        reservation = StockReservation.objects.create(
+            product_id=product_id,
+            user=user,
+            quantity=quantity,
+            reference=reference,
+            expires_at=timezone.now() + (ttl or reservation_ttl()),
+        )
+        remaining = (
+            Product.objects.filter(pk=product_id)
+            .values_list("stock_quantity", flat=True)
+            .first()
+        )
+        stock_changed(product_id, crossed_zero=remaining == 0)
+    return reservation
+
+
+def reserve_many(quantities, reference="", ttl=None):
+    """Reserva vários produtos de uma vez; tudo ou nada.
+
+    ``quantities`` mapeia ``product_id -> quantidade``. Um único ``UPDATE``
+    com ``CASE`` baixa o estoque de todos os produtos, condicionado a cada um
+    ter o suficiente, e as reservas entram em um ``bulk_create``: o número de
+    consultas não depende da quantidade de produtos.
+    """
+    quantities = dict(quantities)
+    if not quantities or min(quantities.values()) < 1:
+        raise StockError("A quantidade deve ser maior que zero.")
+    wanted = Case(
+        *(When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()),
+        output_field=IntegerField(),
+    )
+    available = Product.objects.filter(
+        pk__in=quantities, is_active=True, stock_quantity__gte=wanted
+    )
+    try:
+        with transaction.atomic():
+            updated = available.update(
+                stock_quantity=F("stock_quantity") - wanted, updated_at=timezone.now()
+            )
+            if updated != len(quantities):
+                raise InsufficientStock()
+            emptied = list(Product.objects.filter(pk__in=quantities, stock_quantity=0))
+            expires_at = timezone.now() + (ttl or reservation_ttl())
+            reservations = StockReservation.objects.bulk_create(
+                StockReservation(
+                    product_id=pk,
+                    quantity=quantity,
+                    reference=reference,
+                    expires_at=expires_at,
+                )
+                for pk, quantity in quantities.items()
+            )
+            if emptied:
+                sync_bulk_products(emptied)
+            others = set(quantities) - {product.pk for product in emptied}
+            if others:
+                transaction.on_commit(
+                    lambda: response_cache.invalidate(
+                        *(f"product:{pk}" for pk in others)
+                    )
+                )
+    except InsufficientStock:
+        # Só depois do rollback o estoque volta a refletir quem faltou.
+        short = set(quantities) - set(available.values_list("pk", flat=True))
+        raise InsufficientStock(product_ids=sorted(short))
+    return reservations
+
+
+def transition(token, status):
+    """Troca o status de uma reserva ativa; ``None`` se ela não estava ativa."""
+    reservation = (
+        StockReservation.objects.filter(token=token)
+        .only("pk", "product_id", "quantity")
+        .first()
+    )
+    if reservation is None:
+        return None
+    updated = StockReservation.objects.filter(
+        pk=reservation.pk, status=StockReservation.HELD
+    ).update(status=status, updated_at=timezone.now())
+    return reservation if updated else None
+
+
+def restock(product_id, quantity):
+    previous = (
+        Product.objects.filter(pk=product_id)
+        .values_list("stock_quantity", flat=True)
+        .first()
+    )
+    Product.objects.filter(pk=product_id).update(
+        stock_quantity=F("stock_quantity") + quantity, updated_at=timezone.now()
+    )
+    stock_changed(product_id, crossed_zero=previous == 0)
+
+
+def commit(token):
+    """Confirma a reserva (pagamento aprovado); o estoque já foi baixado.
+
+    Sem endpoint público: quem confirma é o resultado do pagamento
+    (``settle_reference``, chamado pelos signals de ``transactions``).
+    """
+    with transaction.atomic():
+        reservation = transition(token, StockReservation.COMMITTED)
+        if reservation is None:
+            raise ReservationNotActive("A reserva não está mais ativa.")
+    return reservation
+
+
+def release(token):
+    """Libera a reserva (pagamento recusado ou carrinho abandonado)."""
+    with transaction.atomic():
+        reservation = transition(token, StockReservation.RELEASED)
+        if reservation is None:
+            raise ReservationNotActive("A reserva não está mais ativa.")
+        restock(reservation.product_id, reservation.quantity)
+    return reservation
+
+
+def settle_reference(reference, approved):
+    """Confirma ou libera todas as reservas ativas de um pedido."""
+    status = StockReservation.COMMITTED if approved else StockReservation.RELEASED
+    tokens = StockReservation.objects.filter(
+        reference=reference, status=StockReservation.HELD
+    ).values_list("token", flat=True)
+    settled = 0
+    for token in list(tokens):
+        with transaction.atomic():
+            reservation = transition(token, status)
+            if reservation is None:
+                continue
+            if not approved:
+                restock(reservation.product_id, reservation.quantity)
+            settled += 1
+    return settled
+
+
+def sweep_expired(now=None, batch_size=500):
+    """Devolve ao estoque as reservas vencidas; retorna quantas expiraram."""
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        candidates = list(
+            StockReservation.objects.filter(
+                status=StockReservation.HELD, expires_at__lt=now
+            ).values_list("pk", "product_id", "quantity")[:batch_size]
+        )
+        if not candidates:
+            return expired
+        with transaction.atomic():
+            restocked = defaultdict(int)
+            for pk, product_id, quantity in candidates:
+                # Condicional: uma reserva confirmada no meio da varredura
+                # não é devolvida.
+                if StockReservation.objects.filter(
+                    pk=pk, status=StockReservation.HELD
+                ).update(status=StockReservation.EXPIRED, updated_at=now):
+                    restocked[product_id] += quantity
+                    expired += 1
+            for product_id, quantity in restocked.items():
+                restock(product_id, quantity)
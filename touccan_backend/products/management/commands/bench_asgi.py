@@ -0,0 +1,154 @@
+import asyncio
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from products.models import Product
+
+HOST = "localhost"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara, em processo, a listagem de produtos servida por WSGI (views "
+        "síncronas em um pool de threads) e por ASGI (views assíncronas) com "
+        "muitas conexões simultâneas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=16,
+            help="Threads do servidor WSGI (como um worker gthread).",
+        )
+        parser.add_argument("--path", default="/api/products/v1/products/?page_size=24")
+        parser.add_argument(
+            "--async-path", default="/api/products/v1/async/products/?page_size=24"
+        )
+
+    def handle(self, *args, **options):
+        if not Product.objects.filter(is_active=True).exists():
+            raise CommandError("Nenhum produto ativo; importe um catálogo antes.")
+        # Sem o cache de respostas, as duas pilhas fazem o mesmo trabalho.
+        with override_settings(
+            ALLOWED_HOSTS=[HOST],
+            RESPONSE_CACHE={"ALIAS": "bench"},
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "bench": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+            },
+        ):
+            for label, run, path in (
+                ("WSGI + views síncronas", self.run_wsgi, options["path"]),
+                ("ASGI + views síncronas", self.run_asgi, options["path"]),
+                ("ASGI + views assíncronas", self.run_asgi, options["async_path"]),
+            ):
+                latencies, statuses, elapsed = asyncio.run(run(path, options))
+                self.report(label, latencies, statuses, elapsed, options)
+
+    def split(self, path):
+        parts = urlsplit(path)
+        return parts.path, parts.query
+
+    async def clients(self, request, options):
+        """``--connections`` clientes repartindo ``--requests`` requisições."""
+        latencies, statuses = [], {}
+        remaining = options["requests"]
+
+        async def client():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                status = await request()
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options["connections"])))
+        return latencies, statuses, time.perf_counter() - start
+
+    async def run_wsgi(self, path, options):
+        handler = WSGIHandler()
+        path_info, query = self.split(path)
+        loop = asyncio.get_running_loop()
+
+        def call():
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path_info,
+                "QUERY_STRING": query,
+                "SERVER_NAME": HOST,
+                "SERVER_PORT": "80",
+                "HTTP_HOST": HOST,
+                "HTTP_ACCEPT": "application/json",
+                "wsgi.url_scheme": "http",
+                "wsgi.input": io.BytesIO(),
+                "wsgi.errors": io.StringIO(),
+            }
+            status = []
+            body = handler(environ, lambda line, headers: status.append(line))
+            for _ in body:
+                pass
+            body.close()
+            return int(status[0].split()[0])
+
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            return await self.clients(lambda: loop.run_in_executor(pool, call), options)
+
+    async def run_asgi(self, path, options):
+        handler = ASGIHandler()
+        path_info, query = self.split(path)
+
+        async def call():
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path_info,
+                "raw_path": path_info.encode(),
+                "query_string": query.encode(),
+                "root_path": "",
+                "headers": [(b"host", HOST.encode()), (b"accept", b"application/json")],
+                "client": ("127.0.0.1", 0),
+                "server": (HOST, 80),
+            }
+            messages = [{"type": "http.request", "body": b"", "more_body": False}]
+            status = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await asyncio.Event().wait()  # Sem desconexão durante o teste.
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            await handler(scope, receive, send)
+            return status[0]
+
+        return await self.clients(call, options)
+
+    def report(self, label, latencies, statuses, elapsed, options):
+        latencies.sort()
+        p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+        self.stdout.write(
+            f"{label}: {options['connections']} conexões, "
+            f"{len(latencies) / elapsed:,.0f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p99 {p99 * 1000:.1f} ms, máx {latencies[-1] * 1000:.1f} ms, "
+            f"status {statuses}"
+        )
@@ -0,0 +1,86 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from touccan_backend.mysql_pool.pool import close_pools, pool_stats
+from transactions.models import PaymentMethod
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara uma conexão por requisição com o pool de conexões, repetindo "
+        "a consulta de PaymentMethodViewSet em várias threads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--direct-engine", default="django.db.backends.mysql")
+        parser.add_argument("--pooled-engine", default="touccan_backend.mysql_pool")
+
+    def handle(self, *args, **options):
+        base = connections.settings[DEFAULT_DB_ALIAS]
+        db_options = dict(base["OPTIONS"])
+        pool_options = db_options.pop("pool", {})
+        modes = [
+            ("conexão por requisição", options["direct_engine"], db_options),
+            (
+                "pool",
+                options["pooled_engine"],
+                {
+                    **db_options,
+                    "pool": {**pool_options, "max_size": options["threads"]},
+                },
+            ),
+        ]
+        for label, engine, engine_options in modes:
+            alias = f"bench_{engine.rsplit('.', 1)[-1]}"
+            connections.settings[alias] = {
+                **base,
+                "ENGINE": engine,
+                "OPTIONS": engine_options,
+                "CONN_MAX_AGE": 0,
+            }
+            try:
+                self.run(label, alias, options)
+                stats = pool_stats().get(alias)
+                if stats:
+                    self.stdout.write(f"  pool: {stats}")
+            finally:
+                close_pools()
+                del connections.settings[alias]
+
+    def run(self, label, alias, options):
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            timings = []
+            for _ in range(options["requests"]):
+                start = time.perf_counter()
+                list(PaymentMethod.objects.using(alias).filter(is_active=True))
+                # Fim da requisição: o que o Django faz com CONN_MAX_AGE = 0.
+                connections[alias].close()
+                timings.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(timings)
+
+        threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f"{label}: {len(latencies)} requisições em {options['threads']} threads, "
+            f"{len(latencies) / elapsed:,.0f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.2f} ms, "
+            f"p95 {p95 * 1000:.2f} ms"
+        )
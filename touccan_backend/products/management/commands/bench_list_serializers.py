@@ -0,0 +1,139 @@
+import time
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from products.models import Category, Product, ProductImage
+from products.serializers import ProductListSerializer, compiled_product_list
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o serializer DRF de listagem com a versão compilada "
+        "(tempo e igualdade byte a byte) usando dados temporários."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.rows = options["rows"]
+        self.repeat = options["repeat"]
+        self.renderer = JSONRenderer()
+        self.request = APIRequestFactory().get("/api/products/v1/products/")
+        try:
+            with transaction.atomic():
+                self.bench_products()
+                if apps.is_installed("transactions"):
+                    self.bench_transactions()
+                raise Rollback
+        except Rollback:
+            pass
+
+    def timed(self, render):
+        best, output = None, None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            output = render()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
+
+    def report(self, label, drf, compiled):
+        (drf_time, drf_bytes), (compiled_time, compiled_bytes) = drf, compiled
+        if drf_bytes != compiled_bytes:
+            raise CommandError(f"{label}: saída compilada difere do serializer DRF.")
+        self.stdout.write(
+            f"{label}: {self.rows} linhas | DRF {drf_time * 1000:.1f} ms | "
+            f"compilado {compiled_time * 1000:.1f} ms | "
+            f"{drf_time / compiled_time:.1f}x | {len(drf_bytes)} bytes idênticos"
+        )
+
+    def bench_products(self):
+        seller = User.objects.create(username="bench-serializers")
+        category = Category.objects.create(name="Bench Serializers")
+        Product.objects.bulk_create(
+            Product(
+                title=f"Produto {i}",
+                description="Descrição de benchmark",
+                price=Decimal("10.00") + i,
+                stock_quantity=i % 7,
+                category=category,
+                seller=seller,
+                slug=f"bench-serializers-{i}",
+                featured=i % 5 == 0,
+            )
+            for i in range(self.rows)
+        )
+        products = Product.objects.filter(category=category)
+        ProductImage.objects.bulk_create(
+            ProductImage(
+                product_id=pk, image=f"products/images/{pk}.png", is_primary=True
+            )
+            for pk in products.values_list("pk", flat=True)[::2]
+        )
+        queryset = products.select_related("category", "seller").prefetch_related(
+            "images"
+        )
+        context = {"request": self.request}
+
+        drf = self.timed(
+            lambda: self.renderer.render(
+                ProductListSerializer(queryset.all(), many=True, context=context).data
+            )
+        )
+        compiled = self.timed(
+            lambda: self.renderer.render(
+                compiled_product_list.serialize(
+                    compiled_product_list.values(queryset.all()), context
+                )
+            )
+        )
+        self.report("ProductListSerializer", drf, compiled)
+
+    def bench_transactions(self):
+        from transactions.models import PaymentMethod, Transaction, TransactionStatus
+        from transactions.serializers import TransactionSerializer, compiled_transaction
+
+        method = PaymentMethod.objects.create(name="bench-serializers")
+        statuses = [choice[0] for choice in TransactionStatus.choices]
+        Transaction.objects.bulk_create(
+            Transaction(
+                transaction_id=f"BENCH-{i}",
+                order_id=f"PED-{i}",
+                customer_name=f"Cliente {i}",
+                customer_email=f"cliente{i}@example.com",
+                payment_method=method,
+                amount=Decimal("99.90"),
+                status=statuses[i % len(statuses)],
+                metadata={"i": i},
+            )
+            for i in range(self.rows)
+        )
+        queryset = Transaction.objects.filter(payment_method=method).select_related(
+            "payment_method"
+        )
+
+        drf = self.timed(
+            lambda: self.renderer.render(
+                TransactionSerializer(queryset.all(), many=True).data
+            )
+        )
+        compiled = self.timed(
+            lambda: self.renderer.render(
+                compiled_transaction.serialize(
+                    compiled_transaction.values(queryset.all())
+                )
+            )
+        )
+        self.report("TransactionSerializer", drf, compiled)
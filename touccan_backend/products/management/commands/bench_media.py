@@ -0,0 +1,79 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.views import static
+
+from touccan_backend import media
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a view de mídia com django.views.static.serve: arquivo "
+        "inteiro, intervalo (Range) e revalidação (If-None-Match)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=8, help="Tamanho em MB.")
+        parser.add_argument("--chunk", type=int, default=256, help="Range em KB.")
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args, **options):
+        size = options["size"] * 1024 * 1024
+        chunk = options["chunk"] * 1024
+        self.requests = options["requests"]
+        self.factory = RequestFactory()
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, "video.mp4"), "wb") as output:
+                output.write(os.urandom(size))
+            with override_settings(MEDIA_ROOT=root, MEDIA_SERVING={"ACCEL": None}):
+                etag = media.serve(self.factory.get("/media/video.mp4"), "video.mp4")
+                scenarios = [
+                    ("arquivo inteiro", {}),
+                    (
+                        "intervalo",
+                        {"HTTP_RANGE": f"bytes={size // 2}-{size // 2 + chunk - 1}"},
+                    ),
+                    ("revalidação", {"HTTP_IF_NONE_MATCH": etag["ETag"]}),
+                ]
+                etag.close()
+                for label, headers in scenarios:
+                    before = self.run(
+                        lambda request: static.serve(request, "video.mp4", root),
+                        headers,
+                    )
+                    after = self.run(
+                        lambda request: media.serve(request, "video.mp4"), headers
+                    )
+                    self.report(label, before, after)
+        self.stdout.write(
+            "Medido em processo; sob gunicorn/uWSGI o corpo de media.serve sai "
+            "por sendfile e, com ACCEL, pelo servidor web."
+        )
+
+    def run(self, view, headers):
+        transferred, statuses = 0, set()
+        start = time.perf_counter()
+        for _ in range(self.requests):
+            response = view(self.factory.get("/media/video.mp4", **headers))
+            statuses.add(response.status_code)
+            for block in response:
+                transferred += len(block)
+            response.close()
+        return time.perf_counter() - start, transferred, statuses
+
+    def report(self, label, before, after):
+        line = []
+        for name, (elapsed, transferred, statuses) in (
+            ("static.serve", before),
+            ("media.serve", after),
+        ):
+            line.append(
+                f"{name} {self.requests / elapsed:,.0f} req/s "
+                f"({transferred / elapsed / 1024 / 1024:,.0f} MB/s, "
+                f"{transferred / self.requests / 1024:,.0f} KB/req, "
+                f"status {'/'.join(map(str, sorted(statuses)))})"
+            )
+        self.stdout.write(f"{label}: " + " | ".join(line))
@@ -0,0 +1,155 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from touccan_backend.startup import startup_options
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+# Roda num interpretador novo: mede o boot como um worker recém-criado.
+CHILD = """
+import io, json, sys, time
+start = time.perf_counter()
+from django.conf import settings
+from django.utils.module_loading import import_string
+if not {warm_up!r}:
+    settings.STARTUP = {{**getattr(settings, "STARTUP", {{}}), "WARM_UP": False}}
+application = import_string({application!r})
+booted = time.perf_counter()
+status = []
+if {path!r}:
+    path, _, query = {path!r}.partition("?")
+    environ = {{
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "HTTP_HOST": "localhost",
+        "HTTP_ACCEPT": "application/json",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": io.StringIO(),
+    }}
+    body = application(environ, lambda line, headers: status.append(line))
+    for _ in body:
+        pass
+    body.close()
+done = time.perf_counter()
+print(json.dumps({{
+    "boot": booted - start,
+    "first_request": done - booted,
+    "status": status[0] if status else None,
+    "modules": len(sys.modules),
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o boot de um worker (import da aplicação WSGI, com o aquecimento) "
+        "e a primeira requisição em processos novos, lista os imports mais "
+        "caros (-X importtime) e falha se o boot passar do orçamento."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument(
+            "--budget-ms",
+            type=float,
+            help="Orçamento do boot + primeira requisição (padrão: STARTUP).",
+        )
+        parser.add_argument("--application", default=settings.WSGI_APPLICATION)
+        parser.add_argument(
+            "--path",
+            default="",
+            help="Rota da primeira requisição (vazio: só o boot).",
+        )
+        parser.add_argument("--top", type=int, default=15)
+        parser.add_argument(
+            "--no-warm-up",
+            action="store_true",
+            help="Desliga STARTUP['WARM_UP'] nos processos medidos.",
+        )
+
+    def handle(self, *args, **options):
+        budget = options["budget_ms"] or startup_options()["BUDGET_MS"]
+        code = CHILD.format(
+            application=options["application"],
+            path=options["path"],
+            warm_up=not options["no_warm_up"],
+        )
+
+        profile, imports = self.run_child(code, importtime=True)
+        self.report_imports(imports, options["top"])
+        self.stdout.write(f"  módulos carregados: {profile['modules']}")
+
+        runs = [self.run_child(code)[0] for _ in range(options["runs"])]
+        boot = statistics.median(run["boot"] for run in runs) * 1000
+        first = statistics.median(run["first_request"] for run in runs) * 1000
+        status = runs[-1]["status"]
+        self.stdout.write(
+            f"Boot: {boot:.0f} ms, primeira requisição: {first:.0f} ms"
+            + (f" ({status})" if status else "")
+            + f", total {boot + first:.0f} ms (mediana de {len(runs)}), "
+            f"orçamento {budget:.0f} ms"
+        )
+        if boot + first > budget:
+            raise CommandError(
+                f"Boot acima do orçamento: {boot + first:.0f} ms > {budget:.0f} ms."
+            )
+
+    def run_child(self, code, importtime=False):
+        command = [sys.executable]
+        if importtime:
+            command += ["-X", "importtime"]
+        result = subprocess.run(
+            [*command, "-c", code],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE},
+        )
+        lines = result.stdout.strip().splitlines()
+        if result.returncode or not lines:
+            raise CommandError(f"O processo de boot falhou:\n{result.stderr[-2000:]}")
+        imports = []
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match:
+                imports.append(
+                    (match[4], int(match[1]), int(match[2]), len(match[3]) // 2)
+                )
+        return json.loads(lines[-1]), imports
+
+    def report_imports(self, imports, top):
+        by_package = defaultdict(int)
+        for name, own, cumulative, depth in imports:
+            by_package[name.split(".")[0]] += own
+        total = sum(by_package.values())
+        self.stdout.write(f"Imports: {total / 1000:.0f} ms (-X importtime)")
+        self.stdout.write("  pacotes (tempo próprio dos módulos):")
+        for package, own in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"    {package:<32} {own / 1000:7.1f} ms")
+        self.stdout.write("  módulos (cumulativo, importados do projeto ou do boot):")
+        roots = [
+            (name, cumulative)
+            for name, own, cumulative, depth in imports
+            if depth == 0 or name.split(".")[0] in self.project_packages()
+        ]
+        for name, cumulative in sorted(roots, key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"    {name:<32} {cumulative / 1000:7.1f} ms")
+
+    def project_packages(self):
+        return {
+            name
+            for name in os.listdir(settings.BASE_DIR)
+            if os.path.isfile(os.path.join(settings.BASE_DIR, name, "__init__.py"))
+        }
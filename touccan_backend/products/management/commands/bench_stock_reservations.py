@@ -0,0 +1,121 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from products import inventory
+from products.models import Category, Product, StockReservation
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede reservas concorrentes de um único produto: vazão e ausência de "
+        "venda além do estoque."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=300)
+        parser.add_argument("--stock", type=int, default=100)
+        parser.add_argument("--quantity", type=int, default=1)
+        parser.add_argument(
+            "--naive",
+            action="store_true",
+            help="Roda também a versão ler-alterar-salvar, para comparação.",
+        )
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        seller = User.objects.create(username=f"bench-{suffix}")
+        category = Category.objects.create(name=f"bench-{suffix}")
+        try:
+            modes = [("reserva condicional", self.reserve)]
+            if options["naive"]:
+                modes.append(("ler-alterar-salvar", self.naive))
+            for label, buy in modes:
+                product = Product.objects.create(
+                    title=f"bench {suffix}",
+                    description="bench",
+                    price=1,
+                    stock_quantity=options["stock"],
+                    category=category,
+                    seller=seller,
+                    slug=f"bench-{suffix}-{len(label)}",
+                )
+                self.run(label, buy, product, options)
+        finally:
+            Product.objects.filter(category=category).delete()
+            category.delete()
+            seller.delete()
+
+    def reserve(self, product_id, quantity):
+        try:
+            inventory.reserve(product_id, quantity)
+        except inventory.InsufficientStock:
+            return False
+        return True
+
+    def naive(self, product_id, quantity):
+        product = Product.objects.get(pk=product_id)
+        if product.stock_quantity < quantity:
+            return False
+        time.sleep(0)  # Cede a vez, como uma requisição real entre ler e salvar.
+        product.stock_quantity -= quantity
+        product.save(update_fields=["stock_quantity", "updated_at"])
+        return True
+
+    def run(self, label, buy, product, options):
+        buyers, quantity = options["buyers"], options["quantity"]
+        barrier = threading.Barrier(buyers)
+        results = {"sold": 0, "rejected": 0, "retries": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def buyer():
+            barrier.wait()
+            outcome = "errors"
+            try:
+                for attempt in range(50):
+                    try:
+                        outcome = "sold" if buy(product.pk, quantity) else "rejected"
+                        break
+                    except OperationalError:
+                        # SQLite devolve "database is locked" sob contenção.
+                        with lock:
+                            results["retries"] += 1
+                        time.sleep(0.001 * (attempt + 1))
+            finally:
+                connection.close()
+            with lock:
+                results[outcome] += 1
+
+        threads = [threading.Thread(target=buyer) for _ in range(buyers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        product.refresh_from_db()
+        sold_units = results["sold"] * quantity
+        oversold = max(sold_units - options["stock"], 0)
+        held = StockReservation.objects.filter(product=product).count()
+        self.stdout.write(
+            f"{label}: {buyers} compradores, estoque {options['stock']} -> "
+            f"{product.stock_quantity}; vendidos {results['sold']}, recusados "
+            f"{results['rejected']}, erros {results['errors']}, novas tentativas "
+            f"{results['retries']}; {buyers / elapsed:,.0f} tentativas/s"
+        )
+        if oversold or product.stock_quantity != options["stock"] - sold_units:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"  venda além do estoque: {oversold} unidades; estoque final "
+                    f"{product.stock_quantity} para {sold_units} vendidas"
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"  sem venda além do estoque ({held} reservas)")
+            )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula os produtos relacionados ("quem comprou também comprou") '
+        "a partir dos pedidos novos ou alterados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Descarta a matriz salva e refaz tudo a partir de todos os pedidos.",
+        )
+        parser.add_argument(
+            "--loop",
+            type=float,
+            metavar="SEGUNDOS",
+            help="Repete a atualização a cada SEGUNDOS em vez de sair.",
+        )
+
+    def handle(self, *args, **options):
+        full = options["full"]
+        while True:
+            started = time.perf_counter()
+            stats = build_recommendations(full=full)
+            if stats["orders"] or not options["loop"]:
+                self.stdout.write(
+                    f"{stats['orders']} pedidos alterados, {stats['products']} produtos "
+                    f"recalculados, {stats['links']} vizinhos gravados em "
+                    f"{time.perf_counter() - started:.1f}s."
+                )
+            if not options["loop"]:
+                return
+            full = False
+            time.sleep(options["loop"])
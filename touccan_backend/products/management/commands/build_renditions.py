@@ -0,0 +1,80 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.models import ProductImage
+from products.renditions import render, rendition_options, save_renditions
+
+
+def render_in_worker(name, options):
+    try:
+        return name, render(name, options), None
+    except Exception as error:  # Um arquivo ruim não derruba o lote.
+        return name, None, f"{type(error).__name__}: {error}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera as versões reduzidas (WebP e formato de reserva) das imagens de "
+        "produto que ainda não as têm, em um pool de processos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processos de trabalho (padrão: número de CPUs).",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Refaz também as imagens que já têm versões.",
+        )
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.exclude(image="")
+        if not options["force"]:
+            images = images.filter(renditions={})
+        pending = {}
+        for pk, name in images.order_by("pk").values_list("pk", "image").iterator():
+            pending.setdefault(name, []).append(pk)
+        if not pending:
+            self.stdout.write("Nenhuma imagem sem versões.")
+            return
+
+        render_options = rendition_options()
+        started = time.perf_counter()
+        done = failed = 0
+        # Os processos filhos não podem herdar conexões abertas.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=max(options["workers"], 1), initializer=django.setup
+        ) as pool:
+            results = pool.map(
+                render_in_worker,
+                list(pending),
+                [render_options] * len(pending),
+                chunksize=4,
+            )
+            for name, renditions, error in results:
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                    continue
+                save_renditions(pending[name], name, renditions)
+                done += 1
+                if done % 100 == 0:
+                    self.stdout.write(f"{done}/{len(pending)} arquivos processados")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{done} arquivos com versões geradas ({failed} falhas) em "
+                f"{elapsed:.1f}s ({done / elapsed if elapsed else 0:.1f}/s)."
+            )
+        )
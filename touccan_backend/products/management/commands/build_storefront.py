@@ -0,0 +1,238 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import posixpath
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, features
+
+try:
+    import brotli
+except ImportError:  # As variantes .br só são geradas com o pacote instalado.
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = {".css", ".js", ".html", ".svg", ".json", ".txt", ".xml", ".ico"}
+CONVERTIBLE = {".png", ".jpg", ".jpeg"}
+ATTRIBUTE_RE = re.compile(r"""(\s(?:src|href)\s*=\s*)(["'])([^"']+)\2""", re.I)
+IMG_RE = re.compile(r"<img\b[^>]*>", re.I)
+CSS_URL_RE = re.compile(r"""url\(\s*(["']?)([^"')]+)\1\s*\)""")
+
+
+def fingerprint(path, data):
+    stem, extension = posixpath.splitext(path)
+    digest = hashlib.md5(data, usedforsecurity=False).hexdigest()[:12]
+    return f"{stem}.{digest}{extension}"
+
+
+def convert(data, fmt, **params):
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera a versão publicável da vitrine: arquivos com hash no nome, "
+        "variantes gzip/brotli, imagens em WebP/AVIF e HTML reescrito."
+    )
+
+    def add_arguments(self, parser):
+        storefront = getattr(settings, "STOREFRONT", {})
+        parser.add_argument("--source", default=storefront.get("SOURCE"))
+        parser.add_argument("--output", default=storefront.get("OUTPUT"))
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        if not options["source"] or not options["output"]:
+            raise CommandError("Informe --source e --output (ou settings.STOREFRONT).")
+        self.source = Path(options["source"])
+        self.output = Path(options["output"])
+        if not self.source.is_dir():
+            raise CommandError(f"Diretório não encontrado: {self.source}")
+        if self.output.exists():
+            if not (self.output / "manifest.json").exists():
+                raise CommandError(
+                    f"{self.output} existe e não é uma saída desta ferramenta."
+                )
+            shutil.rmtree(self.output)
+        self.formats = [("webp", "WEBP", {"quality": 85, "method": 6})]
+        if features.check("avif"):
+            self.formats.insert(0, ("avif", "AVIF", {"quality": 60}))
+        else:
+            self.stderr.write("Pillow sem suporte a AVIF; só WebP será gerado.")
+        if brotli is None:
+            self.stderr.write("Pacote brotli ausente; só gzip será gerado.")
+
+        started = time.perf_counter()
+        files = sorted(
+            path.relative_to(self.source).as_posix()
+            for path in self.source.rglob("*")
+            if path.is_file() and not path.name.startswith(".")
+        )
+        pages = [name for name in files if name.endswith(".html")]
+        assets = [name for name in files if not name.endswith(".html")]
+        self.manifest = {}
+
+        # CSS por último: o conteúdo (e o hash) depende dos nomes já gerados.
+        stylesheets = [name for name in assets if name.endswith(".css")]
+        others = [name for name in assets if not name.endswith(".css")]
+        with ThreadPoolExecutor(max_workers=max(options["workers"], 1)) as pool:
+            for name, entry in zip(others, pool.map(self.build_asset, others)):
+                self.manifest[name] = entry
+        for name in stylesheets:
+            self.manifest[name] = self.build_asset(name)
+        for name in pages:
+            self.manifest[name] = self.build_page(name)
+
+        self.write_manifest()
+        self.report(time.perf_counter() - started)
+
+    def read(self, name):
+        return (self.source / name).read_bytes()
+
+    def write(self, name, data):
+        path = self.output / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return name
+
+    def compressed(self, name, data):
+        """Grava ``.gz``/``.br`` ao lado de ``name`` quando compensam."""
+        encodings = {}
+        if posixpath.splitext(name)[1].lower() not in COMPRESSIBLE:
+            return encodings
+        variants = [("gzip", ".gz", lambda: gzip.compress(data, 9, mtime=0))]
+        if brotli is not None:
+            variants.append(("br", ".br", lambda: brotli.compress(data, quality=11)))
+        for encoding, suffix, compress in variants:
+            packed = compress()
+            if len(packed) < len(data) * 0.95:
+                encodings[encoding] = {
+                    "path": self.write(name + suffix, packed),
+                    "size": len(packed),
+                }
+        return encodings
+
+    def build_asset(self, name):
+        data = self.read(name)
+        if name.endswith(".css"):
+            data = self.rewrite_css(name, data.decode("utf-8")).encode("utf-8")
+        target = self.write(fingerprint(name, data), data)
+        entry = {
+            "path": target,
+            "size": len(data),
+            "cache_control": IMMUTABLE,
+            "encodings": self.compressed(target, data),
+            "variants": {},
+        }
+        if posixpath.splitext(name)[1].lower() in CONVERTIBLE:
+            for label, fmt, params in self.formats:
+                try:
+                    converted = convert(data, fmt, **params)
+                except (OSError, ValueError) as error:
+                    self.stderr.write(f"{name}: {label} falhou ({error})")
+                    continue
+                if len(converted) < len(data):
+                    variant = posixpath.splitext(name)[0] + "." + label
+                    entry["variants"][label] = {
+                        "path": self.write(fingerprint(variant, converted), converted),
+                        "size": len(converted),
+                    }
+        return entry
+
+    def resolve(self, page, reference):
+        """Nome no manifesto para uma referência relativa de ``page``."""
+        if re.match(r"^(?:[a-z]+:|//|#|\$|data:)", reference, re.I):
+            return None
+        path = reference.split("#", 1)[0].split("?", 1)[0]
+        name = posixpath.normpath(posixpath.join(posixpath.dirname(page), path))
+        return name if name in self.manifest else None
+
+    def relative(self, page, target):
+        return posixpath.relpath(target, posixpath.dirname(page) or ".")
+
+    def rewrite_css(self, name, text):
+        def replace(match):
+            asset = self.resolve(name, match.group(2))
+            if asset is None:
+                return match.group(0)
+            target = self.relative(name, self.manifest[asset]["path"])
+            return f"url({match.group(1)}{target}{match.group(1)})"
+
+        return CSS_URL_RE.sub(replace, text)
+
+    def rewrite_img(self, page, tag):
+        match = ATTRIBUTE_RE.search(tag)
+        asset = match and self.resolve(page, match.group(3))
+        if not asset or not self.manifest[asset]["variants"]:
+            return tag
+        sources = "".join(
+            f'<source type="image/{label}" srcset="'
+            f'{self.relative(page, variant["path"])}">'
+            for label, variant in self.manifest[asset]["variants"].items()
+        )
+        # ``display: contents`` tira o <picture> do layout: os seletores e o
+        # tamanho do <img> continuam valendo como antes.
+        return f'<picture style="display: contents">{sources}{tag}</picture>'
+
+    def rewrite_html(self, page, text):
+        text = IMG_RE.sub(lambda match: self.rewrite_img(page, match.group(0)), text)
+
+        def replace(match):
+            asset = self.resolve(page, match.group(3))
+            if asset is None:
+                return match.group(0)
+            target = self.relative(page, self.manifest[asset]["path"])
+            return f"{match.group(1)}{match.group(2)}{target}{match.group(2)}"
+
+        return ATTRIBUTE_RE.sub(replace, text)
+
+    def build_page(self, name):
+        # newline="" preserva as quebras de linha (CRLF) dos originais.
+        with open(self.source / name, encoding="utf-8", newline="") as handle:
+            text = handle.read()
+        data = self.rewrite_html(name, text).encode("utf-8")
+        self.write(name, data)
+        return {
+            "path": name,
+            "size": len(data),
+            "cache_control": REVALIDATE,
+            "encodings": self.compressed(name, data),
+            "variants": {},
+        }
+
+    def write_manifest(self):
+        data = json.dumps(
+            {"version": 1, "files": self.manifest}, indent=2, sort_keys=True
+        )
+        self.write("manifest.json", data.encode("utf-8"))
+
+    def report(self, elapsed):
+        original = sum((self.source / name).stat().st_size for name in self.manifest)
+        served = 0
+        for entry in self.manifest.values():
+            sizes = [entry["size"]]
+            sizes += [variant["size"] for variant in entry["variants"].values()]
+            sizes += [encoded["size"] for encoded in entry["encodings"].values()]
+            served += min(sizes)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(self.manifest)} arquivos em {self.output} ({elapsed:.1f}s): "
+                f"{original / 1024:,.0f} KB originais, {served / 1024:,.0f} KB no "
+                "melhor formato para um navegador atual."
+            )
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from touccan_backend.db_routing import query_stats, replica_aliases, reset_query_stats
+
+
+class Command(BaseCommand):
+    help = "Mostra quantas consultas as requisições fizeram em cada banco."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Zera os contadores depois de exibir."
+        )
+
+    def handle(self, *args, **options):
+        stats = query_stats()
+        total = sum(stats.values())
+        replicas = set(replica_aliases())
+        for alias, count in stats.items():
+            role = "réplica" if alias in replicas else "primário"
+            share = count / total if total else 0.0
+            self.stdout.write(f"{alias} ({role}): {count} consultas ({share:.1%})")
+        if options["reset"]:
+            reset_query_stats()
+            self.stdout.write(self.style.SUCCESS("Contadores zerados."))
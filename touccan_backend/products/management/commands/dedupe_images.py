@@ -0,0 +1,112 @@
+import datetime
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from products.models import ImageBlob, ProductImage
+from products.signals import count_image_references
+from products.storage import blob_digest
+from touccan_backend.response_cache import response_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Move as imagens de produto para o storage por conteúdo (um arquivo "
+        "por SHA-256), recalcula as referências e apaga os arquivos sem uso."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=60,
+            metavar="MINUTOS",
+            help="Só apaga arquivos sem referência criados há mais tempo que isso.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Só conta o que seria feito (sem mover nem apagar nada).",
+        )
+
+    def handle(self, *args, **options):
+        self.storage = ProductImage._meta.get_field("image").storage
+        self.dry_run = options["dry_run"]
+        self.adopt_files()
+        self.recount()
+        self.prune(options["grace"])
+
+    def adopt_files(self):
+        names = (
+            ProductImage.objects.exclude(image="")
+            .order_by()
+            .values_list("image", flat=True)
+            .distinct()
+        )
+        moved = duplicates = missing = freed = 0
+        products = set()
+        for name in list(names.iterator()):
+            if blob_digest(name):
+                continue
+            if not self.storage.exists(name):
+                missing += 1
+                continue
+            if self.dry_run:
+                moved += 1
+                continue
+            size = self.storage.size(name)
+            blob, duplicate = self.storage.adopt(name)
+            with transaction.atomic():
+                images = ProductImage.objects.filter(image=name)
+                products.update(images.values_list("product_id", flat=True))
+                images.update(image=blob)
+            moved += 1
+            if duplicate:
+                duplicates += 1
+                freed += size
+
+        if products:
+            response_cache.invalidate("products", *(f"product:{pk}" for pk in products))
+        action = "a converter" if self.dry_run else "convertidos"
+        self.stdout.write(
+            f"{moved} arquivos {action}, {duplicates} duplicados removidos "
+            f"({freed / 1024:,.0f} KB liberados), {missing} ausentes."
+        )
+
+    def recount(self):
+        """Refaz as contagens a partir das imagens, corrigindo qualquer deriva."""
+        if self.dry_run:
+            return
+        references = dict(
+            ProductImage.objects.exclude(image="")
+            .order_by()
+            .values("image")
+            .annotate(total=Count("id"))
+            .values_list("image", "total")
+        )
+        with transaction.atomic():
+            ImageBlob.objects.update(ref_count=0)
+            count_image_references(Counter(references).elements(), 1)
+
+    def prune(self, grace):
+        cutoff = timezone.now() - datetime.timedelta(minutes=grace)
+        unused = ImageBlob.objects.filter(ref_count=0, created_at__lt=cutoff)
+        removed = freed = 0
+        for blob in unused.iterator():
+            if ProductImage.objects.filter(image=blob.name).exists():
+                continue
+            if not self.dry_run:
+                # Condicional: um upload do mesmo conteúdo pode ter voltado a
+                # referenciar o blob depois da leitura.
+                if not ImageBlob.objects.filter(pk=blob.pk, ref_count=0).delete()[0]:
+                    continue
+                self.storage.delete(blob.name)
+            removed += 1
+            freed += blob.size
+        action = "a apagar" if self.dry_run else "apagados"
+        self.stdout.write(
+            f"{removed} arquivos sem uso {action} ({freed / 1024:,.0f} KB)."
+        )
@@ -0,0 +1,363 @@
+import csv
+import json
+import os
+import re
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+
+from products.facets import catalog_index
+from products.models import Category, Product, ProductImage
+from products.search import fold, search_index
+from products.signals import count_image_references
+from products.slugs import SlugAllocator
+from touccan_backend.response_cache import response_cache
+
+TRUE_VALUES = {"1", "true", "sim", "yes", "s", "y"}
+
+
+PRICE_LIMIT = Decimal(10) ** (
+    Product._meta.get_field("price").max_digits
+    - Product._meta.get_field("price").decimal_places
+)
+
+
+def read_records(path, fmt):
+    """Lê o arquivo linha a linha, sem carregá-lo inteiro na memória.
+
+    No JSONL as linhas saem cruas: ``decode`` as converte registro a
+    registro, para que uma linha malformada seja rejeitada sozinha.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        if fmt == "csv":
+            yield from csv.DictReader(handle)
+            return
+        for line in handle:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def decode(record):
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"JSON inválido: {error}")
+    if not isinstance(record, dict):
+        raise ValueError(f"registro deve ser um objeto, não {type(record).__name__}")
+    return record
+
+
+def parse_bool(value, default):
+    if value in (None, ""):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def parse_images(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(image) for image in value if image]
+    return [image.strip() for image in str(value).split("|") if image.strip()]
+
+
+class CategoryResolver:
+    """Resolve categorias por slug, caminho de slugs ou caminho de nomes.
+
+    Aceita ``camisetas``, ``roupas/camisetas`` ou ``Roupas > Camisetas``
+    (sem diferenciar acentos e maiúsculas). Todas as categorias são lidas em
+    uma consulta no início.
+    """
+
+    def __init__(self, create_missing=False):
+        self.create_missing = create_missing
+        self.lookup = {}
+        categories = {category.pk: category for category in Category.objects.all()}
+        for category in categories.values():
+            self.register(category, categories)
+
+    def register(self, category, categories):
+        chain = [categories[pk] for pk in category.get_path_ids() if pk in categories]
+        self.lookup[category.slug] = category.pk
+        self.lookup["/".join(item.slug for item in chain)] = category.pk
+        self.lookup[" > ".join(fold(item.name) for item in chain)] = category.pk
+
+    def key(self, value):
+        value = str(value).strip()
+        if ">" in value:
+            return " > ".join(fold(part.strip()) for part in value.split(">"))
+        return value.strip("/").lower()
+
+    def resolve(self, value):
+        if not value:
+            return None
+        key = self.key(value)
+        if key in self.lookup:
+            return self.lookup[key]
+        if not self.create_missing:
+            return None
+        return self.create(value)
+
+    def create(self, value):
+        names = [part.strip() for part in str(value).split(">")]
+        parent = None
+        for depth in range(len(names)):
+            key = " > ".join(fold(name) for name in names[: depth + 1])
+            if key in self.lookup:
+                parent = Category.objects.get(pk=self.lookup[key])
+                continue
+            parent = Category.objects.create(
+                name=names[depth], parent=parent, slug=self.free_slug(names[depth])
+            )
+            self.lookup[key] = parent.pk
+            self.lookup.setdefault(parent.slug, parent.pk)
+        return parent.pk
+
+    def free_slug(self, name):
+        base = slugify(name) or "categoria"
+        taken = set(
+            Category.objects.filter(
+                slug__regex=rf"^{re.escape(base)}(-[0-9]+)?$"
+            ).values_list("slug", flat=True)
+        )
+        slug, suffix = base, 2
+        while slug in taken:
+            slug, suffix = f"{base}-{suffix}", suffix + 1
+        return slug
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa um catálogo de produtos (CSV ou JSONL) em lotes, com "
+        "checkpoint para retomar importações interrompidas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Arquivo .csv ou .jsonl")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument(
+            "--seller", help="Usuário vendedor padrão (ou coluna 'seller')"
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--create-categories",
+            action="store_true",
+            help="Cria as categorias que não existirem (caminhos 'A > B').",
+        )
+        parser.add_argument(
+            "--images-dir",
+            help="Copia as imagens deste diretório para o storage; sem ele os "
+            "valores são nomes já existentes no storage.",
+        )
+        parser.add_argument(
+            "--checkpoint", help="Arquivo de checkpoint (padrão: <arquivo>.checkpoint)"
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continua a partir do último lote gravado no checkpoint.",
+        )
+        parser.add_argument(
+            "--errors", help="Grava as linhas rejeitadas neste arquivo JSONL."
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"Arquivo não encontrado: {path}")
+        fmt = options["format"] or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+        self.batch_size = max(options["batch_size"], 1)
+        self.images_dir = options["images_dir"]
+        self.checkpoint_path = Path(options["checkpoint"] or f"{path}.checkpoint")
+
+        self.state = {"records": 0, "imported": 0, "rejected": 0}
+        if options["resume"] and self.checkpoint_path.exists():
+            self.state.update(json.loads(self.checkpoint_path.read_text()))
+            self.stdout.write(
+                f"Retomando após {self.state['records']} registros "
+                f"({self.state['imported']} já importados)."
+            )
+
+        self.sellers = {}
+        self.default_seller = None
+        if options["seller"]:
+            self.default_seller = self.seller_id(options["seller"])
+            if self.default_seller is None:
+                raise CommandError(f"Vendedor não encontrado: {options['seller']}")
+
+        self.categories = CategoryResolver(options["create_categories"])
+        self.slugs = SlugAllocator()
+        self.errors = open(options["errors"], "a") if options["errors"] else None
+        self.started = time.perf_counter()
+        self.imported_now = 0
+
+        try:
+            batch = []
+            for number, record in enumerate(read_records(path, fmt), start=1):
+                if number <= self.state["records"]:
+                    continue
+                batch.append((number, record))
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+            if batch:
+                self.import_batch(batch)
+        finally:
+            if self.errors:
+                self.errors.close()
+
+        response_cache.invalidate("products", "categories")
+        # ``bulk_create`` não passa pelos sinais: os índices dos outros
+        # processos só percebem a importação pela versão compartilhada.
+        catalog_index.touch()
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Importação concluída: {self.state['imported']} produtos, "
+                f"{self.state['rejected']} rejeitados, em {elapsed:.1f}s."
+            )
+        )
+
+    def seller_id(self, username):
+        if username not in self.sellers:
+            self.sellers[username] = (
+                User.objects.filter(username=username)
+                .values_list("pk", flat=True)
+                .first()
+            )
+        return self.sellers[username]
+
+    def parse(self, record):
+        record = decode(record)
+        title = str(record.get("title") or "").strip()
+        if not title:
+            raise ValueError("título obrigatório")
+        try:
+            price = Decimal(str(record.get("price", "")).replace(",", "."))
+        except InvalidOperation:
+            raise ValueError(f"preço inválido: {record.get('price')!r}")
+        if not price.is_finite():
+            # ``NaN`` e ``Infinity`` são decimais válidos, mas não preços.
+            raise ValueError(f"preço inválido: {record.get('price')!r}")
+        if price < Decimal("0.01"):
+            raise ValueError("preço deve ser maior que zero")
+        if price >= PRICE_LIMIT:
+            raise ValueError(f"preço acima do limite: {record.get('price')!r}")
+        try:
+            stock = int(record.get("stock_quantity") or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"estoque inválido: {record.get('stock_quantity')!r}")
+        if stock < 0:
+            raise ValueError("estoque negativo")
+        category_id = self.categories.resolve(record.get("category"))
+        if category_id is None:
+            raise ValueError(f"categoria não encontrada: {record.get('category')!r}")
+        seller_id = (
+            self.seller_id(str(record["seller"]))
+            if record.get("seller")
+            else self.default_seller
+        )
+        if seller_id is None:
+            raise ValueError("vendedor não encontrado")
+
+        product = Product(
+            title=title[:200],
+            description=str(record.get("description") or ""),
+            price=price.quantize(Decimal("0.01")),
+            stock_quantity=stock,
+            category_id=category_id,
+            seller_id=seller_id,
+            is_active=parse_bool(record.get("is_active"), True),
+            featured=parse_bool(record.get("featured"), False),
+        )
+        return product, parse_images(record.get("images"))
+
+    def reject(self, number, record, reason):
+        self.state["rejected"] += 1
+        if self.errors:
+            self.errors.write(
+                json.dumps(
+                    {"line": number, "error": reason, "record": record},
+                    ensure_ascii=False,
+                    default=str,
+                )
+                + "\n"
+            )
+
+    def import_batch(self, batch):
+        products, images = [], []
+        for number, record in batch:
+            try:
+                product, product_images = self.parse(record)
+            except ValueError as error:
+                self.reject(number, record, str(error))
+                continue
+            products.append(product)
+            images.append(product_images)
+
+        with transaction.atomic():
+            self.slugs.bulk_create(products)
+            if products and products[0].pk is None:
+                # Bancos sem RETURNING (MySQL) não preenchem as chaves.
+                ids = dict(
+                    Product.objects.filter(
+                        slug__in=[product.slug for product in products]
+                    ).values_list("slug", "pk")
+                )
+                for product in products:
+                    product.pk = ids[product.slug]
+            product_images = ProductImage.objects.bulk_create(
+                [
+                    ProductImage(
+                        product_id=product.pk,
+                        image=self.store_image(name),
+                        is_primary=order == 0,
+                        order=order,
+                    )
+                    for product, names in zip(products, images)
+                    for order, name in enumerate(names)
+                ],
+                batch_size=500,
+            )
+            count_image_references([image.image.name for image in product_images], 1)
+            self.state["records"] = batch[-1][0]
+            self.state["imported"] += len(products)
+            transaction.on_commit(self.save_checkpoint)
+
+        search_index.update_many(
+            (product.pk, product.title, product.description)
+            for product in products
+            if product.is_active
+        )
+        self.imported_now += len(products)
+        elapsed = time.perf_counter() - self.started
+        rate = self.imported_now / elapsed * 60 if elapsed else 0
+        self.stdout.write(
+            f"{self.state['records']} registros lidos, "
+            f"{self.state['imported']} importados ({rate:,.0f}/min)"
+        )
+
+    def store_image(self, name):
+        if not self.images_dir:
+            return name
+        source = os.path.join(self.images_dir, name)
+        storage = ProductImage._meta.get_field("image").storage
+        with open(source, "rb") as handle:
+            return storage.save(
+                f"products/images/{os.path.basename(name)}", File(handle)
+            )
+
+    def save_checkpoint(self):
+        temporary = self.checkpoint_path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.state))
+        os.replace(temporary, self.checkpoint_path)
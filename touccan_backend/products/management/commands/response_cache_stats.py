@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from touccan_backend.response_cache import response_cache
+
+
+class Command(BaseCommand):
+    help = "Mostra os acertos e falhas do cache de respostas do catálogo."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Zera os contadores depois de exibir."
+        )
+
+    def handle(self, *args, **options):
+        stats = response_cache.stats()
+        total = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / total if total else 0.0
+        self.stdout.write(
+            f"Acertos: {stats['hits']}  Falhas: {stats['misses']}  "
+            f"Taxa de acerto: {ratio:.1%}"
+        )
+        if options["reset"]:
+            response_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Contadores zerados."))
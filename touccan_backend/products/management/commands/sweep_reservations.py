@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.inventory import sweep_expired
+
+
+class Command(BaseCommand):
+    help = "Devolve ao estoque as reservas vencidas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--loop",
+            type=float,
+            metavar="SEGUNDOS",
+            help="Repete a varredura a cada SEGUNDOS em vez de sair.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = sweep_expired(batch_size=options["batch_size"])
+            if expired or not options["loop"]:
+                self.stdout.write(f"{expired} reservas expiradas.")
+            if not options["loop"]:
+                return
+            time.sleep(options["loop"])
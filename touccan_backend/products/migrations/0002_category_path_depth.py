@@ -0,0 +1,56 @@
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    categories = {category.pk: category for category in Category.objects.all()}
+
+    def resolve(category):
+        if category.path:
+            return category.path, category.depth
+        parent = categories.get(category.parent_id)
+        if parent is None:
+            category.path, category.depth = f"{category.pk}/", 0
+        else:
+            parent_path, parent_depth = resolve(parent)
+            category.path = f"{parent_path}{category.pk}/"
+            category.depth = parent_depth + 1
+        return category.path, category.depth
+
+    for category in categories.values():
+        resolve(category)
+    Category.objects.bulk_update(categories.values(), ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="IDs dos ancestrais e da própria categoria, separados por barra",
+                max_length=255,
+                verbose_name="Caminho Materializado",
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="depth",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Nível da categoria na hierarquia (raiz = 0)",
+                verbose_name="Profundidade",
+            ),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_category_path_depth"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_active", "created_at", "id"],
+                name="products_pr_is_acti_eec6ac_idx",
+            ),
+        ),
+    ]
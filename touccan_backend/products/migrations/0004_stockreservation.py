@@ -0,0 +1,110 @@
+import uuid
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_product_keyset_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "token",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        help_text="Identificador público da reserva",
+                        unique=True,
+                        verbose_name="Token",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(
+                        help_text="Unidades retiradas do estoque",
+                        validators=[django.core.validators.MinValueValidator(1)],
+                        verbose_name="Quantidade",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("held", "Reservado"),
+                            ("committed", "Confirmado"),
+                            ("released", "Liberado"),
+                            ("expired", "Expirado"),
+                        ],
+                        default="held",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "reference",
+                    models.CharField(
+                        blank=True,
+                        db_index=True,
+                        help_text="Pedido ou transação que confirma ou libera a reserva",
+                        max_length=100,
+                        verbose_name="Referência",
+                    ),
+                ),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        help_text="Fim do prazo da reserva", verbose_name="Expira em"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Data de Criação"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Data de Atualização"
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        help_text="Produto reservado",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="products.product",
+                        verbose_name="Produto",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Reserva de Estoque",
+                "verbose_name_plural": "Reservas de Estoque",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "expires_at"],
+                        name="products_st_status_657db7_idx",
+                    )
+                ],
+            },
+        ),
+    ]
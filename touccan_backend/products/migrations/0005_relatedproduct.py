@@ -0,0 +1,69 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_stockreservation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RelatedProduct",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField(verbose_name="Posição")),
+                (
+                    "score",
+                    models.FloatField(
+                        help_text="Similaridade de cosseno entre os dois",
+                        verbose_name="Similaridade",
+                    ),
+                ),
+                (
+                    "shared_orders",
+                    models.PositiveIntegerField(
+                        help_text="Pedidos que contêm os dois produtos",
+                        verbose_name="Pedidos em comum",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="related_links",
+                        to="products.product",
+                        verbose_name="Produto",
+                    ),
+                ),
+                (
+                    "related",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recommended_in",
+                        to="products.product",
+                        verbose_name="Produto relacionado",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Produto Relacionado",
+                "verbose_name_plural": "Produtos Relacionados",
+                "ordering": ["product", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "rank"), name="products_related_rank_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0005_relatedproduct"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductActivity",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="activity",
+                        serialize=False,
+                        to="products.product",
+                        verbose_name="Produto",
+                    ),
+                ),
+                (
+                    "views",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Visualizações"
+                    ),
+                ),
+                (
+                    "cart_adds",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Adições ao carrinho"
+                    ),
+                ),
+                (
+                    "score",
+                    models.FloatField(
+                        default=0,
+                        help_text="Pontuação de tendência no instante score_at",
+                        verbose_name="Pontuação",
+                    ),
+                ),
+                (
+                    "score_at",
+                    models.FloatField(
+                        default=0,
+                        help_text="Instante (epoch, segundos) em que a pontuação foi gravada",
+                        verbose_name="Calculada em",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Atividade do Produto",
+                "verbose_name_plural": "Atividade dos Produtos",
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+import products.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_productactivity"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="productimage",
+            name="image",
+            field=models.ImageField(
+                help_text="Arquivo de imagem do produto",
+                storage=products.storage.get_product_image_storage,
+                upload_to="products/images/",
+                verbose_name="Imagem",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ImageBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=255, unique=True, verbose_name="Nome no storage"
+                    ),
+                ),
+                (
+                    "digest",
+                    models.CharField(
+                        db_index=True, max_length=64, verbose_name="SHA-256"
+                    ),
+                ),
+                (
+                    "size",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Tamanho (bytes)"
+                    ),
+                ),
+                (
+                    "ref_count",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Imagens de produto que apontam para este arquivo",
+                        verbose_name="Referências",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Data de Criação"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Arquivo de Imagem",
+                "verbose_name_plural": "Arquivos de Imagem",
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_imageblob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="renditions",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Versões reduzidas (WebP e formato de reserva) por tamanho",
+                verbose_name="Versões",
+            ),
+        ),
+    ]
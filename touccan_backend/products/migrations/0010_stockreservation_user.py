@@ -0,0 +1,27 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("products", "0009_product_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stockreservation",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Quem reservou pela API (vazio nas reservas do checkout)",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="stock_reservations",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Usuário",
+            ),
+        ),
+    ]
@@ -1,8 +1,14 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+import uuid
+
+from .storage import get_product_image_storage
 
 
 class Category(models.Model):
@@ -34,6 +40,21 @@ class Category(models.Model):
     is_active = models.BooleanField(
         default=True, verbose_name="Ativo", help_text="Define se a categoria está ativa"
     )
+    path = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        editable=False,
+        db_index=True,
+        verbose_name="Caminho Materializado",
+        help_text="IDs dos ancestrais e da própria categoria, separados por barra",
+    )
+    depth = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Profundidade",
+        help_text="Nível da categoria na hierarquia (raiz = 0)",
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Data de Atualização")
 
@@ -49,10 +70,75 @@ class Category(models.Model):
 
         if not self.slug:
             self.slug = slugify(self.name)
+        old_path, old_depth = self.path, self.depth
+        if self.pk is not None:
+            self.check_parent()
+            self.path, self.depth = self.build_path()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "path", "depth"}
         super().save(*args, **kwargs)
 
+        if not self.path:
+            # Novas categorias só recebem o id depois do INSERT.
+            self.path, self.depth = self.build_path()
+            Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+        elif old_path and self.path != old_path:
+            # Ao trocar de pai, reescreve o prefixo de todos os descendentes
+            # em um único UPDATE.
+            Category.objects.filter(path__startswith=old_path).exclude(
+                pk=self.pk
+            ).update(
+                path=Concat(Value(self.path), Substr("path", len(old_path) + 1)),
+                depth=F("depth") + (self.depth - old_depth),
+            )
+
+    def clean(self):
+
+        super().clean()
+        self.check_parent()
+
+    def check_parent(self):
+        """Impede pôr a categoria abaixo dela mesma: o caminho viraria um ciclo."""
+        if self.pk is None or self.parent_id is None:
+            return
+        path = (
+            Category.objects.filter(pk=self.pk).values_list("path", flat=True).first()
+            or self.path
+        )
+        parent_path = (
+            Category.objects.filter(pk=self.parent_id)
+            .values_list("path", flat=True)
+            .first()
+        )
+        if self.parent_id == self.pk or (
+            path and parent_path and parent_path.startswith(path)
+        ):
+            raise ValidationError(
+                {
+                    "parent": "A categoria pai não pode ser a própria categoria "
+                    "nem uma de suas subcategorias."
+                }
+            )
+
+    def build_path(self):
+
+        if self.parent_id is None:
+            return f"{self.pk}/", 0
+        parent = self.parent
+        return f"{parent.path}{self.pk}/", parent.depth + 1
+
+    def get_path_ids(self):
+
+        return [int(pk) for pk in self.path.split("/") if pk]
+
     def get_full_path(self):
 
+        from .tree import category_tree
+
+        full_path = category_tree().full_path(self)
+        if full_path is not None:
+            return full_path
+
         path = [self.name]
         parent = self.parent
         while parent:
@@ -130,6 +216,8 @@ class Product(models.Model):
             models.Index(fields=["seller", "is_active"]),
             models.Index(fields=["featured", "is_active"]),
             models.Index(fields=["price"]),
+            models.Index(fields=["is_active", "created_at", "id"]),
+            models.Index(fields=["updated_at"]),
         ]
 
     def __str__(self):
@@ -149,6 +237,10 @@ class Product(models.Model):
     @property
     def primary_image(self):
 
+        if "images" in getattr(self, "_prefetched_objects_cache", {}):
+            return next(
+                (image for image in self.images.all() if image.is_primary), None
+            )
         return self.images.filter(is_primary=True).first()
 
     def get_all_images(self):
@@ -167,6 +259,7 @@ class ProductImage(models.Model):
     )
     image = models.ImageField(
         upload_to="products/images/",
+        storage=get_product_image_storage,
         verbose_name="Imagem",
         help_text="Arquivo de imagem do produto",
     )
@@ -184,6 +277,13 @@ class ProductImage(models.Model):
     order = models.PositiveIntegerField(
         default=0, verbose_name="Ordem", help_text="Ordem de exibição da imagem"
     )
+    renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Versões",
+        help_text="Versões reduzidas (WebP e formato de reserva) por tamanho",
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de Upload")
 
     class Meta:
@@ -202,3 +302,167 @@ class ProductImage(models.Model):
                 id=self.id
             ).update(is_primary=False)
         super().save(*args, **kwargs)
+
+
+class StockReservation(models.Model):
+
+    HELD = "held"
+    COMMITTED = "committed"
+    RELEASED = "released"
+    EXPIRED = "expired"
+    STATUS_CHOICES = [
+        (HELD, "Reservado"),
+        (COMMITTED, "Confirmado"),
+        (RELEASED, "Liberado"),
+        (EXPIRED, "Expirado"),
+    ]
+
+    token = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        verbose_name="Token",
+        help_text="Identificador público da reserva",
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="reservations",
+        verbose_name="Produto",
+        help_text="Produto reservado",
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="stock_reservations",
+        verbose_name="Usuário",
+        help_text="Quem reservou pela API (vazio nas reservas do checkout)",
+    )
+    quantity = models.PositiveIntegerField(
+        validators=[MinValueValidator(1)],
+        verbose_name="Quantidade",
+        help_text="Unidades retiradas do estoque",
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=HELD,
+        verbose_name="Status",
+    )
+    reference = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        verbose_name="Referência",
+        help_text="Pedido ou transação que confirma ou libera a reserva",
+    )
+    expires_at = models.DateTimeField(
+        verbose_name="Expira em", help_text="Fim do prazo da reserva"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Data de Atualização")
+
+    class Meta:
+        verbose_name = "Reserva de Estoque"
+        verbose_name_plural = "Reservas de Estoque"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} ({self.status})"
+
+
+class RelatedProduct(models.Model):
+    """Vizinho pré-calculado de um produto ("quem comprou também comprou")."""
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="related_links",
+        verbose_name="Produto",
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="recommended_in",
+        verbose_name="Produto relacionado",
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name="Posição")
+    score = models.FloatField(
+        verbose_name="Similaridade", help_text="Similaridade de cosseno entre os dois"
+    )
+    shared_orders = models.PositiveIntegerField(
+        verbose_name="Pedidos em comum",
+        help_text="Pedidos que contêm os dois produtos",
+    )
+
+    class Meta:
+        verbose_name = "Produto Relacionado"
+        verbose_name_plural = "Produtos Relacionados"
+        ordering = ["product", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "rank"], name="products_related_rank_uniq"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.product} -> {self.related} ({self.score:.3f})"
+
+
+class ProductActivity(models.Model):
+    """Contadores de visualização/carrinho e a pontuação de tendência."""
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="activity",
+        verbose_name="Produto",
+    )
+    views = models.PositiveBigIntegerField(default=0, verbose_name="Visualizações")
+    cart_adds = models.PositiveBigIntegerField(
+        default=0, verbose_name="Adições ao carrinho"
+    )
+    score = models.FloatField(
+        default=0,
+        verbose_name="Pontuação",
+        help_text="Pontuação de tendência no instante score_at",
+    )
+    score_at = models.FloatField(
+        default=0,
+        verbose_name="Calculada em",
+        help_text="Instante (epoch, segundos) em que a pontuação foi gravada",
+    )
+
+    class Meta:
+        verbose_name = "Atividade do Produto"
+        verbose_name_plural = "Atividade dos Produtos"
+
+    def __str__(self):
+        return f"{self.product}: {self.views} visualizações"
+
+
+class ImageBlob(models.Model):
+    """Arquivo de imagem guardado por conteúdo e quantas imagens o usam."""
+
+    name = models.CharField(max_length=255, unique=True, verbose_name="Nome no storage")
+    digest = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="Tamanho (bytes)")
+    ref_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Referências",
+        help_text="Imagens de produto que apontam para este arquivo",
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
+
+    class Meta:
+        verbose_name = "Arquivo de Imagem"
+        verbose_name_plural = "Arquivos de Imagem"
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
@@ -0,0 +1,278 @@
+import datetime
+import itertools
+import os
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from scipy import sparse
+from touccan_backend.response_cache import response_cache
+
+from .models import Product, RelatedProduct
+
+
+def recommendation_options():
+    options = {
+        "TOP_K": 12,
+        "MIN_SHARED_ORDERS": 2,
+        "STATE_PATH": settings.BASE_DIR / "recommendations.npz",
+        "BATCH_SIZE": 2000,
+        "LAG": 300,
+        "FULL_REBUILD_INTERVAL": 24 * 3600,
+    }
+    options.update(getattr(settings, "PRODUCT_RECOMMENDATIONS", {}))
+    return options
+
+
+class CoPurchaseMatrix:
+    """Pedidos em comum entre cada par de produtos, em uma matriz esparsa.
+
+    A matriz é ``P x P`` (P = maior id de produto + 1) e a diagonal guarda em
+    quantos pedidos cada produto aparece. Entre execuções ela fica em um
+    ``.npz`` junto com os pares ``(pedido, produto)`` já somados e o instante
+    da última leitura. Cada rodada relê só os pedidos alterados desde então
+    e troca a cesta antiga de cada um pela atual:
+    ``C += B_novaᵀ·B_nova - B_antigaᵀ·B_antiga``, com ``B`` a matriz binária
+    pedido x produto. Um pedido cancelado ou apagado volta com a cesta vazia
+    e sai da matriz.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.counts = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self.baskets = np.empty((0, 2), dtype=np.int64)
+        self.synced_at = 0.0
+        self.built_at = 0.0
+
+    def load(self):
+        if self.path.exists():
+            with np.load(self.path) as state:
+                if "baskets" not in state.files:
+                    # Formato antigo, sem as cestas: a rodada refaz tudo.
+                    return self
+                self.counts = sparse.csr_matrix(
+                    (state["data"], state["indices"], state["indptr"]),
+                    shape=tuple(state["shape"]),
+                )
+                self.baskets = state["baskets"]
+                self.synced_at = float(state["synced_at"])
+                self.built_at = float(state["built_at"])
+        return self
+
+    def save(self):
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary, "wb") as handle:
+            np.savez(
+                handle,
+                data=self.counts.data,
+                indices=self.counts.indices,
+                indptr=self.counts.indptr,
+                shape=np.array(self.counts.shape),
+                baskets=self.baskets,
+                synced_at=np.array(self.synced_at),
+                built_at=np.array(self.built_at),
+            )
+        os.replace(temporary, self.path)
+
+    @staticmethod
+    def cooccurrences(pairs, size):
+        orders, rows = np.unique(pairs[:, 0], return_inverse=True)
+        baskets = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, pairs[:, 1])),
+            shape=(len(orders), size),
+        )
+        return baskets.T @ baskets
+
+    def replace_orders(self, order_ids, pairs):
+        """Troca as cestas de ``order_ids`` pelas de ``pairs``.
+
+        Só entram na conta os pedidos cuja cesta mudou de fato (um pedido
+        relido sem alteração não custa nada). Devolve os pedidos alterados e
+        os produtos das cestas antigas e novas deles.
+        """
+        # O mesmo produto em duas linhas de um pedido conta uma vez.
+        pairs = np.unique(pairs.reshape(-1, 2), axis=0)
+        current = np.isin(self.baskets[:, 0], order_ids)
+        old = self.baskets[current]
+        old_keys, new_keys = basket_keys(old), basket_keys(pairs)
+        changed = np.union1d(
+            old[~np.isin(old_keys, new_keys), 0],
+            pairs[~np.isin(new_keys, old_keys), 0],
+        )
+        removed = old[np.isin(old[:, 0], changed)]
+        added = pairs[np.isin(pairs[:, 0], changed)]
+
+        size = max(self.counts.shape[0], int(added[:, 1].max(initial=-1)) + 1)
+        self.counts.resize((size, size))
+        self.counts = (
+            self.counts
+            + self.cooccurrences(added, size)
+            - self.cooccurrences(removed, size)
+        ).tocsr()
+        self.counts.eliminate_zeros()
+        self.baskets = np.concatenate(
+            [self.baskets[~np.isin(self.baskets[:, 0], changed)], added]
+        )
+        return changed, np.union1d(removed[:, 1], added[:, 1])
+
+    def affected(self, touched):
+        """Produtos cuja lista de vizinhos muda com os pedidos novos.
+
+        Além dos tocados, entram os que compartilham pedidos com eles: o
+        cosseno depende do total de pedidos dos dois lados do par.
+        """
+        return np.union1d(touched, self.counts[touched].indices)
+
+    def neighbours(self, rows, top_k, min_shared):
+        """Os ``top_k`` vizinhos de cada produto de ``rows`` por cosseno.
+
+        Devolve arrays paralelos ``(produto, vizinho, pedidos_em_comum,
+        similaridade, posição)``; o ranking é feito com ``lexsort`` sobre todos
+        os pares do bloco, sem laço em Python.
+        """
+        occurrences = self.counts.diagonal().astype(np.float64)
+        block = self.counts[rows].tocoo()
+        product, related, shared = rows[block.row], block.col, block.data
+        keep = (product != related) & (shared >= min_shared)
+        product, related, shared = product[keep], related[keep], shared[keep]
+        score = shared / np.sqrt(occurrences[product] * occurrences[related])
+
+        order = np.lexsort((related, -score, product))
+        product, related, shared, score = (
+            product[order],
+            related[order],
+            shared[order],
+            score[order],
+        )
+        starts = np.flatnonzero(np.r_[True, product[1:] != product[:-1]])
+        lengths = np.diff(np.r_[starts, len(product)])
+        rank = np.arange(len(product)) - np.repeat(starts, lengths)
+        keep = rank < top_k
+        return product[keep], related[keep], shared[keep], score[keep], rank[keep]
+
+
+def basket_keys(pairs):
+    """Um inteiro por par ``(pedido, produto)``, para comparar cestas."""
+    return (pairs[:, 0] << 32) | pairs[:, 1]
+
+
+def changed_orders(since):
+    """Pedidos com o pedido ou algum item alterado a partir de ``since``."""
+    orders = Order.objects.filter(atualizado_em__gte=since).values_list("pk", flat=True)
+    items = OrderItem.objects.filter(atualizado_em__gte=since).values_list(
+        "pedido_id", flat=True
+    )
+    return np.union1d(
+        np.fromiter(orders.iterator(chunk_size=5000), dtype=np.int64),
+        np.fromiter(items.iterator(chunk_size=5000), dtype=np.int64),
+    )
+
+
+def read_baskets(order_ids=None, batch_size=2000):
+    """Pares ``(pedido, produto)`` válidos de ``order_ids`` (ou de todos)."""
+    items = (
+        OrderItem.objects.filter(
+            deletado_em__isnull=True,
+            pedido__deletado_em__isnull=True,
+        )
+        .exclude(pedido__status=Order.CANCELADO)
+        .order_by()
+        .values_list("pedido_id", "produto_id")
+    )
+    if order_ids is None:
+        chunks = [items]
+    else:
+        chunks = [
+            items.filter(pedido_id__in=order_ids[start : start + batch_size].tolist())
+            for start in range(0, len(order_ids), batch_size)
+        ]
+    pairs = np.fromiter(
+        itertools.chain.from_iterable(
+            itertools.chain.from_iterable(
+                chunk.iterator(chunk_size=5000) for chunk in chunks
+            )
+        ),
+        dtype=np.int64,
+    )
+    return pairs.reshape(-1, 2)
+
+
+def write_neighbours(matrix, rows, options):
+    written = 0
+    batch_size = options["BATCH_SIZE"]
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start : start + batch_size]
+        product, related, shared, score, rank = matrix.neighbours(
+            chunk, options["TOP_K"], options["MIN_SHARED_ORDERS"]
+        )
+        # Produtos apagados depois do pedido ficam de fora.
+        existing = np.fromiter(
+            Product.objects.filter(
+                pk__in=np.union1d(chunk, related).tolist()
+            ).values_list("pk", flat=True),
+            dtype=np.int64,
+        )
+        keep = np.isin(product, existing) & np.isin(related, existing)
+        links = [
+            RelatedProduct(
+                product_id=int(product_id),
+                related_id=int(related_id),
+                shared_orders=int(count),
+                score=float(value),
+                rank=int(position),
+            )
+            for product_id, related_id, count, value, position in zip(
+                product[keep], related[keep], shared[keep], score[keep], rank[keep]
+            )
+        ]
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=chunk.tolist()).delete()
+            RelatedProduct.objects.bulk_create(links, batch_size=1000)
+        written += len(links)
+    return written
+
+
+def build_recommendations(full=False):
+    """Atualiza os vizinhos guardados com os pedidos alterados (ou todos, ``full``).
+
+    Só os produtos afetados pelas cestas que mudaram são recalculados; as
+    requisições apenas leem ``RelatedProduct``. A releitura começa ``LAG``
+    segundos antes da rodada anterior, para pegar transações confirmadas
+    depois dela. Escritas que não tocam ``atualizado_em`` (exclusão física,
+    ``update()`` sem o campo) só entram na reconstrução completa, feita a
+    cada ``FULL_REBUILD_INTERVAL`` segundos.
+    """
+    options = recommendation_options()
+    started = timezone.now().timestamp()
+    matrix = CoPurchaseMatrix(options["STATE_PATH"])
+    if not full:
+        matrix.load()
+        full = started - matrix.built_at >= options["FULL_REBUILD_INTERVAL"]
+    if full:
+        matrix = CoPurchaseMatrix(options["STATE_PATH"])
+        matrix.built_at = started
+        pairs = read_baskets(batch_size=options["BATCH_SIZE"])
+        order_ids = np.unique(pairs[:, 0])
+    else:
+        since = datetime.datetime.fromtimestamp(
+            matrix.synced_at - options["LAG"], tz=datetime.timezone.utc
+        )
+        order_ids = changed_orders(since)
+        pairs = read_baskets(order_ids, batch_size=options["BATCH_SIZE"])
+    matrix.synced_at = started
+
+    changed, touched = matrix.replace_orders(order_ids, pairs)
+    stats = {"orders": len(changed), "products": 0, "links": 0}
+    if full:
+        RelatedProduct.objects.all().delete()
+    if len(touched):
+        rows = touched if full else matrix.affected(touched)
+        stats["products"] = len(rows)
+        stats["links"] = write_neighbours(matrix, rows, options)
+    matrix.save()
+    if full or len(touched):
+        response_cache.invalidate("related")
+    return stats
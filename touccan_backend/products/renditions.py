@@ -0,0 +1,186 @@
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from touccan_backend.response_cache import response_cache
+
+from .models import Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = "products/renditions"
+
+
+def rendition_options():
+    options = {
+        "SIZES": {"thumb": 160, "card": 480, "zoom": 1600},
+        "WEBP_QUALITY": 80,
+        "FALLBACK_QUALITY": 85,
+        "WORKERS": 2,
+        "ASYNC": True,
+    }
+    options.update(getattr(settings, "PRODUCT_IMAGE_RENDITIONS", {}))
+    return options
+
+
+def image_storage():
+    return ProductImage._meta.get_field("image").storage
+
+
+def encode(image, fmt, quality):
+    buffer = io.BytesIO()
+    if fmt == "WEBP":
+        image.save(buffer, "WEBP", quality=quality, method=4)
+    elif fmt == "PNG":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render(name, options=None):
+    """Gera as versões reduzidas de ``name`` para ``ProductImage.renditions``.
+
+    Cada tamanho sai em WebP e em um formato de reserva (JPEG, ou PNG quando
+    a imagem tem transparência). Nunca amplia: se o original for menor que o
+    tamanho pedido, a versão fica com a largura do original.
+    """
+    # O Pillow só é importado aqui: as views usam este módulo apenas para
+    # montar URLs, e o import pesa no boot de cada worker.
+    from PIL import Image, ImageOps
+
+    options = options or rendition_options()
+    storage = image_storage()
+    with storage.open(name, "rb") as handle:
+        source = Image.open(handle)
+        source.load()
+    source = ImageOps.exif_transpose(source)
+    has_alpha = source.mode in ("RGBA", "LA", "PA") or (
+        source.mode == "P" and "transparency" in source.info
+    )
+    source = source.convert("RGBA" if has_alpha else "RGB")
+    fallback = "PNG" if has_alpha else "JPEG"
+    extension = ".png" if has_alpha else ".jpg"
+
+    renditions = {}
+    for label, width in sorted(options["SIZES"].items(), key=lambda item: item[1]):
+        width = min(width, source.width)
+        height = max(round(source.height * width / source.width), 1)
+        resized = (
+            source
+            if width == source.width
+            else source.resize((width, height), Image.Resampling.LANCZOS)
+        )
+        # O storage por conteúdo só aproveita a pasta e a extensão do nome.
+        stem = posixpath.join(RENDITIONS_DIR, label)
+        renditions[label] = {
+            "width": width,
+            "height": height,
+            "webp": storage.save(
+                stem + ".webp",
+                ContentFile(encode(resized, "WEBP", options["WEBP_QUALITY"])),
+            ),
+            "fallback": storage.save(
+                stem + extension,
+                ContentFile(encode(resized, fallback, options["FALLBACK_QUALITY"])),
+            ),
+        }
+    return renditions
+
+
+def save_renditions(image_ids, name, renditions):
+    """Grava as versões nas imagens que ainda apontam para ``name``."""
+    images = ProductImage.objects.filter(pk__in=image_ids, image=name)
+    product_ids = list(images.values_list("product_id", flat=True).distinct())
+    images.update(renditions=renditions)
+    if product_ids:
+        # Como em ``touch_product``: as URLs fazem parte da representação.
+        Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+        response_cache.invalidate(*(f"product:{pk}" for pk in product_ids))
+    return product_ids
+
+
+def build_for_image(image_id):
+    image = ProductImage.objects.filter(pk=image_id).values("image").first()
+    if image is None or not image["image"]:
+        return
+    name = image["image"]
+    # Com o storage por conteúdo, o mesmo arquivo em outro produto já pode
+    # ter as versões prontas.
+    renditions = (
+        ProductImage.objects.filter(image=name)
+        .exclude(renditions={})
+        .values_list("renditions", flat=True)
+        .first()
+    )
+    if renditions is None:
+        renditions = render(name)
+    save_renditions([image_id], name, renditions)
+
+
+class RenditionQueue:
+    """Gera versões fora do ciclo da requisição, em threads do processo.
+
+    Se o processo cair antes, as imagens continuam sem versões (e os
+    serializers usam o original) até ``manage.py build_renditions``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=rendition_options()["WORKERS"],
+                    thread_name_prefix="renditions",
+                )
+            return self._executor
+
+    def run(self, image_id):
+        try:
+            build_for_image(image_id)
+        except Exception:
+            logger.exception("Falha ao gerar as versões da imagem %s", image_id)
+        finally:
+            close_old_connections()
+
+    def submit(self, image_id):
+        """Agenda a imagem para depois do commit da transação atual."""
+
+        def enqueue():
+            if rendition_options()["ASYNC"]:
+                self.executor().submit(self.run, image_id)
+            else:
+                build_for_image(image_id)
+
+        transaction.on_commit(enqueue)
+
+
+rendition_queue = RenditionQueue()
+
+
+def srcset(renditions, url, variant="webp"):
+    return ", ".join(
+        f"{url(rendition[variant])} {rendition['width']}w"
+        for rendition in sorted(renditions.values(), key=lambda item: item["width"])
+    )
+
+
+def rendition_urls(renditions, url):
+    return {
+        label: {
+            "width": rendition["width"],
+            "height": rendition["height"],
+            "webp": url(rendition["webp"]),
+            "fallback": url(rendition["fallback"]),
+        }
+        for label, rendition in renditions.items()
+    }
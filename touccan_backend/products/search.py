@@ -0,0 +1,285 @@
+import datetime
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Product
+
+STOPWORDS = frozenset("""
+    a ao aos as ate com como da das de dela dele deles do dos e ela elas ele
+    eles em entre era essa esse esta este eu foi ha isso isto ja la lhe mais
+    mas me mesmo meu minha muito na nas nem no nos nossa nosso num numa o os
+    ou para pela pelas pelo pelos por qual quando que quem se sem ser seu sua
+    so tambem te tem tu um uma umas uns voce
+    """.split())
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+PLURAL_RULES = (
+    ("oes", "ao"),
+    ("aes", "ao"),
+    ("ais", "al"),
+    ("eis", "el"),
+    ("ois", "ol"),
+    ("ns", "m"),
+    ("res", "r"),
+    ("les", "l"),
+    ("zes", "z"),
+)
+
+DEGREE_SUFFIXES = ("zinho", "zinha", "inho", "inha", "issimo", "issima")
+
+
+def fold(text):
+    """Remove acentos e coloca em minúsculas ("Calçado" -> "calcado")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def stem(token):
+    """Stemmer leve para português: plural, grau e gênero."""
+    if len(token) < 4 or token.isdigit():
+        return token
+    for suffix, replacement in PLURAL_RULES:
+        if token.endswith(suffix):
+            token = token[: -len(suffix)] + replacement
+            break
+    else:
+        if token.endswith("s") and token[-2] in "aeo":
+            token = token[:-1]
+    for suffix in DEGREE_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[: -len(suffix)]
+            break
+    if len(token) > 4 and token[-1] in "aeo" and not token.endswith("ao"):
+        token = token[:-1]
+    return token
+
+
+def analyze(text):
+    return [
+        stem(token)
+        for token in TOKEN_RE.findall(fold(text or ""))
+        if token not in STOPWORDS
+    ]
+
+
+class ProductSearchIndex:
+    """Índice invertido de produtos em SQLite FTS5 com ranking BM25.
+
+    O texto é analisado em Python (minúsculas, sem acentos, sem stopwords,
+    com stemming) e gravado já normalizado; o FTS5 guarda as listas de
+    postings e calcula o BM25 com peso maior para o título.
+
+    O arquivo é local a cada máquina e só recebe, pelos signals, as escritas
+    feitas nela. Para pegar as das outras, o índice guarda até quando está
+    sincronizado e, passado ``SYNC_INTERVAL``, reindexa em segundo plano os
+    produtos alterados desde então. Sem índice (deploy novo) ou com ele
+    atrasado além de ``STALE_AFTER``, ``search`` devolve ``None`` e a view
+    usa a busca por ``icontains`` enquanto o índice é montado.
+    """
+
+    table = "product_fts"
+    meta_table = "product_fts_meta"
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    @property
+    def options(self):
+        options = {
+            "PATH": settings.BASE_DIR / "search_index.sqlite3",
+            "TITLE_BOOST": 5.0,
+            "MAX_RESULTS": 1000,
+            "SYNC_INTERVAL": 60,
+            "STALE_AFTER": 900,
+            # Folga para relógios diferentes entre as máquinas.
+            "CLOCK_SKEW": 5,
+        }
+        options.update(getattr(settings, "PRODUCT_SEARCH", {}))
+        return options
+
+    def connect(self):
+        path = str(self.options["PATH"])
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.path != path:
+            if connection is not None:
+                connection.close()
+            connection = sqlite3.connect(path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.create_table(connection, self.table)
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.meta_table} "
+                "(key TEXT PRIMARY KEY, value REAL)"
+            )
+            self._local.connection, self._local.path = connection, path
+        return connection
+
+    def create_table(self, connection, table):
+        connection.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} "
+            "USING fts5(title, description, tokenize='unicode61')"
+        )
+
+    def synced_at(self):
+        """Instante (epoch) até o qual o índice tem todas as escritas."""
+        row = (
+            self.connect()
+            .execute(f"SELECT value FROM {self.meta_table} WHERE key = 'synced_at'")
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def set_synced_at(self, connection, value):
+        connection.execute(
+            f"INSERT OR REPLACE INTO {self.meta_table}(key, value) "
+            "VALUES ('synced_at', ?)",
+            [value],
+        )
+
+    def document(self, product_id, title, description):
+        return (product_id, " ".join(analyze(title)), " ".join(analyze(description)))
+
+    def update(self, product):
+        if not product.is_active:
+            return self.delete(product.pk)
+        with self.connect() as connection:
+            connection.execute(
+                f"DELETE FROM {self.table} WHERE rowid = ?", [product.pk]
+            )
+            connection.execute(
+                f"INSERT INTO {self.table}(rowid, title, description) VALUES (?, ?, ?)",
+                self.document(product.pk, product.title, product.description),
+            )
+
+    def delete(self, product_id):
+        with self.connect() as connection:
+            connection.execute(
+                f"DELETE FROM {self.table} WHERE rowid = ?", [product_id]
+            )
+
+    def update_many(self, rows):
+        """Indexa um lote de ``(id, título, descrição)`` em uma transação."""
+        documents = [self.document(*row) for row in rows]
+        with self.connect() as connection:
+            connection.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = ?",
+                [[document[0]] for document in documents],
+            )
+            connection.executemany(
+                f"INSERT INTO {self.table}(rowid, title, description) VALUES (?, ?, ?)",
+                documents,
+            )
+
+    def rebuild(self, rows, batch_size=2000, progress=None):
+        """Reconstrói o índice em uma tabela nova e troca no final."""
+        started = time.time()
+        connection = self.connect()
+        staging = f"{self.table}_rebuild"
+        connection.execute(f"DROP TABLE IF EXISTS {staging}")
+        self.create_table(connection, staging)
+        insert = f"INSERT INTO {staging}(rowid, title, description) VALUES (?, ?, ?)"
+
+        total, batch = 0, []
+        for row in rows:
+            batch.append(self.document(*row))
+            if len(batch) >= batch_size:
+                connection.executemany(insert, batch)
+                connection.commit()
+                total += len(batch)
+                batch = []
+                if progress:
+                    progress(total)
+        connection.executemany(insert, batch)
+        total += len(batch)
+        connection.execute(f"INSERT INTO {staging}({staging}) VALUES ('optimize')")
+        with connection:
+            connection.execute(f"DROP TABLE IF EXISTS {self.table}")
+            connection.execute(f"ALTER TABLE {staging} RENAME TO {self.table}")
+            self.set_synced_at(connection, started)
+        return total
+
+    def sync(self):
+        """Reindexa os produtos alterados desde a última sincronização."""
+        synced_at = self.synced_at()
+        if synced_at is None:
+            return self.rebuild(self.active_rows())
+        started = time.time()
+        since = datetime.datetime.fromtimestamp(
+            synced_at - self.options["CLOCK_SKEW"], tz=datetime.timezone.utc
+        )
+        changed = Product.objects.filter(updated_at__gte=since).values_list(
+            "id", "title", "description", "is_active"
+        )
+        active, inactive = [], []
+        for product_id, title, description, is_active in changed.iterator():
+            if is_active:
+                active.append((product_id, title, description))
+            else:
+                inactive.append([product_id])
+        self.update_many(active)
+        with self.connect() as connection:
+            connection.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = ?", inactive
+            )
+            self.set_synced_at(connection, started)
+        return len(active) + len(inactive)
+
+    def active_rows(self):
+        return (
+            Product.objects.filter(is_active=True)
+            .order_by()
+            .values_list("id", "title", "description")
+            .iterator(chunk_size=2000)
+        )
+
+    def refresh(self):
+        """Monta ou atualiza o índice em segundo plano (uma vez por processo)."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.sync()
+            finally:
+                self._refreshing = False
+                close_old_connections()
+
+        threading.Thread(target=run, name="search-index", daemon=True).start()
+
+    def usable(self):
+        """Agenda a sincronização se preciso; diz se o índice pode responder."""
+        options = self.options
+        synced_at = self.synced_at()
+        age = None if synced_at is None else time.time() - synced_at
+        if age is None or age >= options["SYNC_INTERVAL"]:
+            self.refresh()
+        return age is not None and age < options["STALE_AFTER"]
+
+    def search(self, query, limit=None):
+        """Ids dos produtos em ordem de relevância, ou ``None`` sem índice."""
+        if not self.usable():
+            return None
+        terms = analyze(query)
+        if not terms:
+            return []
+        options = self.options
+        match = " ".join(f'"{term}"' for term in dict.fromkeys(terms))
+        rows = self.connect().execute(
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH ? "
+            f"ORDER BY bm25({self.table}, ?, 1.0) LIMIT ?",
+            [match, options["TITLE_BOOST"], limit or options["MAX_RESULTS"]],
+        )
+        return [row[0] for row in rows]
+
+
+search_index = ProductSearchIndex()
@@ -1,11 +1,28 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
-from .models import Category, Product, ProductImage
+from touccan_backend.compiled import CompiledSerializer
+from .models import Category, Product, ProductImage, StockReservation
+from .renditions import rendition_urls, srcset
+from .tree import category_tree
+
+
+def media_url(name, request=None):
+    url = ProductImage._meta.get_field("image").storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def listing_image(name, renditions):
+    """Nas listagens, a versão "card" no formato de reserva; sem versões, o original."""
+    return renditions.get("card", {}).get("fallback", name)
 
 
 class CategorySerializer(serializers.ModelSerializer):
     subcategories = serializers.SerializerMethodField()
     full_path = serializers.SerializerMethodField()
     products_count = serializers.SerializerMethodField()
+    subtree_products_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
@@ -21,23 +38,47 @@ class CategorySerializer(serializers.ModelSerializer):
             "subcategories",
             "full_path",
             "products_count",
+            "subtree_products_count",
         ]
         read_only_fields = ["slug", "created_at", "updated_at"]
+        source_hints = {
+            "subcategories": ["path"],
+            "full_path": ["path", "parent", "name"],
+            "products_count": [],
+            "subtree_products_count": ["path"],
+        }
 
     def get_subcategories(self, obj):
-        subcategories = obj.get_children()
+        subcategories = category_tree().get_children(obj)
         return CategorySerializer(subcategories, many=True, context=self.context).data
 
     def get_full_path(self, obj):
         return obj.get_full_path()
 
     def get_products_count(self, obj):
-        return obj.products.filter(is_active=True).count()
+        return category_tree().products_count(obj)
+
+    def get_subtree_products_count(self, obj):
+        return category_tree().subtree_products_count(obj)
+
+    def validate_parent(self, parent):
+        instance = self.instance
+        if (
+            instance is not None
+            and parent is not None
+            and (parent.pk == instance.pk or parent.path.startswith(instance.path))
+        ):
+            raise serializers.ValidationError(
+                "A categoria pai não pode ser a própria categoria nem uma de suas "
+                "subcategorias."
+            )
+        return parent
 
 
 class CategoryListSerializer(serializers.ModelSerializer):
     full_path = serializers.SerializerMethodField()
     products_count = serializers.SerializerMethodField()
+    subtree_products_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
@@ -49,17 +90,28 @@ class CategoryListSerializer(serializers.ModelSerializer):
             "is_active",
             "full_path",
             "products_count",
+            "subtree_products_count",
         ]
+        source_hints = {
+            "full_path": ["path", "parent", "name"],
+            "products_count": [],
+            "subtree_products_count": ["path"],
+        }
 
     def get_full_path(self, obj):
         return obj.get_full_path()
 
     def get_products_count(self, obj):
-        return obj.products.filter(is_active=True).count()
+        return category_tree().products_count(obj)
+
+    def get_subtree_products_count(self, obj):
+        return category_tree().subtree_products_count(obj)
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
@@ -67,12 +119,19 @@ class ProductImageSerializer(serializers.ModelSerializer):
             "id",
             "image",
             "image_url",
+            "renditions",
+            "srcset",
             "alt_text",
             "is_primary",
             "order",
             "created_at",
         ]
         read_only_fields = ["created_at"]
+        source_hints = {
+            "image_url": ["image"],
+            "renditions": ["renditions"],
+            "srcset": ["renditions"],
+        }
 
     def get_image_url(self, obj):
         if obj.image:
@@ -82,6 +141,14 @@ class ProductImageSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
 
+    def get_renditions(self, obj):
+        request = self.context.get("request")
+        return rendition_urls(obj.renditions, lambda name: media_url(name, request))
+
+    def get_srcset(self, obj):
+        request = self.context.get("request")
+        return srcset(obj.renditions, lambda name: media_url(name, request)) or None
+
 
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
@@ -114,6 +181,11 @@ class ProductSerializer(serializers.ModelSerializer):
             "is_in_stock",
         ]
         read_only_fields = ["slug", "created_at", "updated_at", "seller"]
+        source_hints = {
+            "category_path": ["category.path", "category.parent", "category.name"],
+            "primary_image": ["images"],
+            "is_in_stock": ["stock_quantity"],
+        }
 
     def get_category_path(self, obj):
         return obj.category.get_full_path()
@@ -133,6 +205,7 @@ class ProductListSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source="category.name", read_only=True)
     seller_username = serializers.CharField(source="seller.username", read_only=True)
     primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -148,18 +221,118 @@ class ProductListSerializer(serializers.ModelSerializer):
             "featured",
             "created_at",
             "primary_image",
+            "primary_image_srcset",
         ]
+        source_hints = {
+            "primary_image": [
+                "images.image",
+                "images.is_primary",
+                "images.order",
+                "images.renditions",
+            ],
+            "primary_image_srcset": [
+                "images.is_primary",
+                "images.order",
+                "images.renditions",
+            ],
+        }
 
     def get_primary_image(self, obj):
         primary_image = obj.primary_image
         if primary_image and primary_image.image:
+            return media_url(
+                listing_image(primary_image.image.name, primary_image.renditions),
+                self.context.get("request"),
+            )
+        return None
+
+    def get_primary_image_srcset(self, obj):
+        primary_image = obj.primary_image
+        if primary_image and primary_image.renditions:
             request = self.context.get("request")
-            if request:
-                return request.build_absolute_uri(primary_image.image.url)
-            return primary_image.image.url
+            return srcset(
+                primary_image.renditions, lambda name: media_url(name, request)
+            )
         return None
 
 
+class CompiledProductListSerializer(CompiledSerializer):
+    serializer_class = ProductListSerializer
+    batch_size = 500
+
+    def compile_primary_image(self):
+        def read(row, context):
+            return context["primary_images"].get(row["id"])
+
+        return ["id"], read
+
+    def compile_primary_image_srcset(self):
+        def read(row, context):
+            return context["primary_srcsets"].get(row["id"])
+
+        return ["id"], read
+
+    def image_queries(self, rows):
+        ids = [row["id"] for row in rows]
+        for start in range(0, len(ids), self.batch_size):
+            yield (
+                ProductImage.objects.filter(
+                    product_id__in=ids[start : start + self.batch_size],
+                    is_primary=True,
+                )
+                .order_by("order", "id")
+                .values_list("product_id", "image", "renditions")
+            )
+
+    def prepare(self, rows, context):
+        names = {}
+        for images in self.image_queries(rows):
+            for product_id, name, renditions in images:
+                names.setdefault(product_id, (name, renditions))
+        return self.image_context(names, context)
+
+    async def aprepare(self, rows, context):
+        names = {}
+        for images in self.image_queries(rows):
+            async for product_id, name, renditions in images:
+                names.setdefault(product_id, (name, renditions))
+        return self.image_context(names, context)
+
+    def image_context(self, names, context):
+        storage = ProductImage._meta.get_field("image").storage
+        request = context.get("request")
+        if isinstance(storage, FileSystemStorage):
+            prefix = storage.base_url
+            if request:
+                prefix = request.build_absolute_uri(prefix)
+
+            def url(name):
+                return prefix + filepath_to_uri(name).lstrip("/")
+
+        elif request:
+
+            def url(name):
+                return request.build_absolute_uri(storage.url(name))
+
+        else:
+            url = storage.url
+
+        context["primary_images"] = {
+            product_id: url(listing_image(name, renditions))
+            for product_id, (name, renditions) in names.items()
+            if name
+        }
+        context["primary_srcsets"] = {
+            product_id: srcset(renditions, url)
+            for product_id, (name, renditions) in names.items()
+            if name and renditions
+        }
+        return context
+
+
+compiled_product_list = CompiledProductListSerializer()
+
+
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
@@ -188,3 +361,50 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
                 "A quantidade em estoque não pode ser negativa."
             )
         return value
+
+
+class PreloadedCategoryField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        categories = self.context.get("categories")
+        if categories is None:
+            return super().to_internal_value(data)
+        try:
+            return categories[int(data)]
+        except (KeyError, TypeError, ValueError):
+            self.fail("does_not_exist", pk_value=data)
+
+
+class BulkProductSerializer(ProductCreateUpdateSerializer):
+    category = PreloadedCategoryField(queryset=Category.objects.all())
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    product_slug = serializers.CharField(source="product.slug", read_only=True)
+
+    class Meta:
+        model = StockReservation
+        fields = [
+            "token",
+            "product",
+            "product_slug",
+            "quantity",
+            "status",
+            "reference",
+            "expires_at",
+            "created_at",
+        ]
+        read_only_fields = fields
+
+
+class StockReservationCreateSerializer(serializers.Serializer):
+    # Sem ``reference``: só o checkout liga reservas a um pedido, e é o
+    # pagamento desse pedido que as confirma.
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+    def validate_quantity(self, value):
+        limit = getattr(settings, "STOCK_RESERVATION_MAX_QUANTITY", 10)
+        if value > limit:
+            raise serializers.ValidationError(
+                f"Reserve no máximo {limit} unidades por vez."
+            )
+        return value
@@ -0,0 +1,236 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from touccan_backend.response_cache import response_cache
+
+from .facets import catalog_index
+from .models import Category, ImageBlob, Product, ProductImage
+from .renditions import rendition_queue
+from .search import search_index
+from .storage import blob_digest
+from .suggest import suggest_index
+from .tree import invalidate_category_tree
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_category_tree(sender, **kwargs):
+    invalidate_category_tree()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    transaction.on_commit(lambda: search_index.update(instance))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: search_index.delete(product_id))
+
+
+@receiver(post_save, sender=Product)
+def suggest_product(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggest_index.update_product(instance))
+
+
+@receiver(post_save, sender=Category)
+def suggest_category(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggest_index.update_category(instance))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def unsuggest(sender, instance, **kwargs):
+    kind, pk = sender._meta.model_name, instance.pk
+    transaction.on_commit(lambda: suggest_index.remove(kind, pk))
+
+
+@receiver(post_save, sender=Product)
+def refresh_catalog_index(sender, instance, **kwargs):
+    def run():
+        catalog_index.update(instance)
+        catalog_index.touch()
+
+    transaction.on_commit(run)
+
+
+@receiver(post_delete, sender=Product)
+def drop_from_catalog_index(sender, instance, **kwargs):
+    product_id = instance.pk
+
+    def run():
+        catalog_index.remove(product_id)
+        catalog_index.touch()
+
+    transaction.on_commit(run)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, **kwargs):
+    # As imagens fazem parte da representação do produto.
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+def listing_state(product):
+    """Campos que decidem em quais listagens (e em que ordem) o produto entra."""
+    return (
+        product.is_active,
+        product.featured,
+        product.category_id,
+        Decimal(str(product.price)),
+        product.title,
+        product.stock_quantity > 0,
+    )
+
+
+@receiver(pre_save, sender=Product)
+def remember_listing_state(sender, instance, **kwargs):
+    previous = None
+    if instance.pk is not None:
+        previous = (
+            Product.objects.filter(pk=instance.pk)
+            .only(
+                "is_active", "featured", "category", "price", "title", "stock_quantity"
+            )
+            .first()
+        )
+    instance._listing_state = listing_state(previous) if previous else None
+
+
+@receiver(post_save, sender=Product)
+def expire_product_responses(sender, instance, created, **kwargs):
+    tags = [f"product:{instance.pk}"]
+    if created or instance._listing_state != listing_state(instance):
+        tags.append("products")
+    transaction.on_commit(lambda: response_cache.invalidate(*tags))
+
+
+@receiver(post_delete, sender=Product)
+def expire_deleted_product_responses(sender, instance, **kwargs):
+    tags = [f"product:{instance.pk}", "products"]
+    transaction.on_commit(lambda: response_cache.invalidate(*tags))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def expire_category_responses(sender, instance, **kwargs):
+    # O caminho completo das subcategorias inclui o nome desta categoria.
+    tags = ["categories", f"category:{instance.pk}"]
+    if instance.path:
+        subtree = Category.objects.filter(path__startswith=instance.path)
+        tags += [f"category:{pk}" for pk in subtree.values_list("pk", flat=True)]
+    transaction.on_commit(lambda: response_cache.invalidate(*tags))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def expire_image_responses(sender, instance, **kwargs):
+    tags = [f"product:{instance.product_id}"]
+    transaction.on_commit(lambda: response_cache.invalidate(*tags))
+
+
+def sync_bulk_products(products):
+    """Aplica aos índices e caches o que os receivers fazem por ``save()``.
+
+    ``bulk_create``/``bulk_update`` não disparam sinais; as escritas em lote
+    chamam esta função dentro da transação.
+    """
+    products = list(products)
+
+    def run():
+        invalidate_category_tree()
+        search_index.update_many(
+            (product.pk, product.title, product.description)
+            for product in products
+            if product.is_active
+        )
+        for product in products:
+            if not product.is_active:
+                search_index.delete(product.pk)
+            catalog_index.update(product)
+        catalog_index.touch()
+        suggest_index.update_products(products)
+        response_cache.invalidate(
+            "products", *(f"product:{product.pk}" for product in products)
+        )
+
+    transaction.on_commit(run)
+
+
+def count_image_references(names, delta):
+    """Soma ``delta`` às referências dos blobs em ``names``.
+
+    Nomes antigos, fora do formato de blob, são ignorados.
+    """
+    counts = Counter(name for name in names if blob_digest(name))
+    if not counts:
+        return
+    if delta > 0:
+        storage = ProductImage._meta.get_field("image").storage
+        blobs = []
+        for name in counts:
+            try:
+                size = storage.size(name)
+            except OSError:
+                size = 0
+            blobs.append(ImageBlob(name=name, digest=blob_digest(name), size=size))
+        ImageBlob.objects.bulk_create(blobs, ignore_conflicts=True)
+    by_count = {}
+    for name, count in counts.items():
+        by_count.setdefault(count, []).append(name)
+    for count, group in by_count.items():
+        blobs = ImageBlob.objects.filter(name__in=group)
+        if delta > 0:
+            blobs.update(ref_count=F("ref_count") + count * delta)
+        else:
+            blobs.update(ref_count=Greatest(F("ref_count") + count * delta, 0))
+
+
+@receiver(pre_save, sender=ProductImage)
+def remember_image_name(sender, instance, **kwargs):
+    instance._stored_image = None
+    if instance.pk is not None:
+        instance._stored_image = (
+            ProductImage.objects.filter(pk=instance.pk)
+            .values_list("image", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=ProductImage)
+def retain_image_blob(sender, instance, **kwargs):
+    previous = getattr(instance, "_stored_image", None)
+    if instance.image.name != previous:
+        count_image_references([instance.image.name], 1)
+        if previous:
+            count_image_references([previous], -1)
+
+
+@receiver(post_save, sender=ProductImage)
+def schedule_renditions(sender, instance, **kwargs):
+    previous = getattr(instance, "_stored_image", None)
+    if instance.image.name == previous:
+        return
+    if previous and instance.renditions:
+        # As versões eram do arquivo anterior.
+        ProductImage.objects.filter(pk=instance.pk).update(renditions={})
+        instance.renditions = {}
+    if instance.image.name:
+        rendition_queue.submit(instance.pk)
+
+
+@receiver(post_delete, sender=ProductImage)
+def release_image_blob(sender, instance, **kwargs):
+    # O arquivo fica no disco com zero referências; `manage.py dedupe_images`
+    # apaga os que continuarem sem uso depois do prazo de carência.
+    count_image_references([instance.image.name], -1)
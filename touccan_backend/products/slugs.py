@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+
+from .models import Product
+
+SLUG_MAX_LENGTH = Product._meta.get_field("slug").max_length
+
+
+class SlugAllocator:
+    """Aloca slugs únicos por lote, com poucas consultas ao banco.
+
+    Cada título repetido recebe o próximo sufixo (``-2``, ``-3``...) do
+    contador da sua base e cada rodada confere todos os candidatos em um
+    único ``slug__in``. Quando um candidato já existe no banco, o contador
+    daquela base salta em passos que dobram a cada rodada, então mesmo bases
+    com milhares de slugs gravados resolvem em poucas consultas. Os
+    contadores ficam em um LRU limitado, para que a memória não cresça com o
+    tamanho do catálogo.
+
+    A consulta não reserva nada: outro processo pode gravar o mesmo slug
+    entre ela e o ``INSERT``. Quem decide é a restrição ``unique`` do banco,
+    e ``bulk_create`` realoca o lote quando ela o recusa.
+    """
+
+    def __init__(self, max_bases=50000, attempts=5):
+        self.next_suffix = OrderedDict()
+        self.max_bases = max_bases
+        self.attempts = attempts
+
+    def base(self, title):
+        return slugify(title)[: SLUG_MAX_LENGTH - 10].strip("-") or "produto"
+
+    def candidate(self, base, suffix):
+        return base if suffix == 1 else f"{base}-{suffix}"
+
+    def take_suffix(self, base, step=1):
+        suffix = self.next_suffix.get(base, 1)
+        self.next_suffix[base] = suffix + step
+        self.next_suffix.move_to_end(base)
+        if len(self.next_suffix) > self.max_bases:
+            self.next_suffix.popitem(last=False)
+        return suffix
+
+    def allocate(self, titles):
+        bases = [self.base(title) for title in titles]
+        slugs = [None] * len(bases)
+        pending = list(range(len(bases)))
+        step = 1
+
+        while pending:
+            proposals = {
+                index: self.candidate(bases[index], self.take_suffix(bases[index]))
+                for index in pending
+            }
+            taken = set(
+                Product.objects.filter(slug__in=proposals.values()).values_list(
+                    "slug", flat=True
+                )
+            )
+            still_pending = []
+            for index, slug in proposals.items():
+                if slug in taken:
+                    self.take_suffix(bases[index], step)
+                    still_pending.append(index)
+                else:
+                    slugs[index] = slug
+            pending = still_pending
+            step *= 2
+        return slugs
+
+    def bulk_create(self, products, batch_size=500):
+        """Grava ``products`` com slugs únicos, tentando de novo em conflito."""
+        bases = {self.base(product.title) for product in products}
+        for attempt in range(self.attempts):
+            slugs = self.allocate([product.title for product in products])
+            for product, slug in zip(products, slugs):
+                product.slug = slug
+            try:
+                with transaction.atomic():
+                    return Product.objects.bulk_create(products, batch_size=batch_size)
+            except IntegrityError:
+                if attempt == self.attempts - 1:
+                    raise
+                # O lote inteiro voltou: os contadores destas bases recomeçam
+                # para que a próxima rodada enxergue os slugs do concorrente.
+                for base in bases:
+                    self.next_suffix.pop(base, None)
+                for product in products:
+                    product.pk = None
+                    product._state.adding = True
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+BLOB_NAME_RE = re.compile(r"(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[\w]+)?$")
+
+
+def blob_digest(name):
+    """SHA-256 contido no nome de um blob, ou ``None`` para nomes antigos."""
+    match = BLOB_NAME_RE.search(name or "")
+    return match.group(1) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Guarda cada conteúdo uma única vez, sob o seu SHA-256.
+
+    O upload é copiado em blocos para um temporário no diretório de destino
+    enquanto o hash é calculado; no fim vira ``<pasta>/ab/cd/abcd….ext`` com
+    um ``rename`` atômico, ou é descartado se aquele conteúdo já estava lá.
+    Do nome enviado pelo cliente só a pasta (``upload_to``) e a extensão são
+    aproveitadas, então o mesmo arquivo com nomes diferentes ocupa o disco uma
+    vez e a URL de um blob nunca muda de conteúdo.
+    """
+
+    chunk_size = 64 * 1024
+
+    def blob_name(self, directory, digest, extension):
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension.lower()
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # O nome definitivo sai do hash em ``_save``; nomes repetidos não
+        # precisam de sufixo.
+        return name
+
+    def _save(self, name, content):
+        directory, basename = posixpath.split(name)
+        target_dir = self.path(directory)
+        os.makedirs(target_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        handle, temporary = tempfile.mkstemp(prefix=".upload-", dir=target_dir)
+        try:
+            with os.fdopen(handle, "wb") as output:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks(self.chunk_size):
+                    digest.update(chunk)
+                    output.write(chunk)
+            name = self.blob_name(
+                directory, digest.hexdigest(), os.path.splitext(basename)[1]
+            )
+            self.store(temporary, name)
+        finally:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+        return name
+
+    def store(self, source, name):
+        """Move ``source`` para o blob ``name``, a menos que ele já exista."""
+        path = self.path(name)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_move_safe(source, path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        return True
+
+    def adopt(self, name):
+        """Converte um arquivo já gravado com nome livre em blob.
+
+        Devolve ``(novo_nome, duplicado)``; o arquivo antigo deixa de existir
+        em qualquer caso (movido, ou apagado se o conteúdo já estava
+        guardado).
+        """
+        if blob_digest(name):
+            return name, False
+        digest = hashlib.sha256()
+        with self.open(name, "rb") as source:
+            for chunk in source.chunks(self.chunk_size):
+                digest.update(chunk)
+        directory, basename = posixpath.split(name)
+        blob = self.blob_name(
+            directory, digest.hexdigest(), os.path.splitext(basename)[1]
+        )
+        stored = self.store(self.path(name), blob)
+        if not stored:
+            self.delete(name)
+        return blob, not stored
+
+
+product_image_storage = ContentAddressedStorage()
+
+
+def get_product_image_storage():
+    return product_image_storage
@@ -0,0 +1,259 @@
+import heapq
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .counters import product_counters
+from .models import Category, Product, ProductActivity
+from .search import fold
+from .tree import category_tree
+
+
+class SuggestIndex:
+    """Índice de prefixos em memória para o autocomplete da busca.
+
+    Cada título de produto e nome de categoria gera uma chave por palavra
+    (o texto normalizado a partir daquela palavra), guardada em uma lista
+    ordenada. Uma consulta é um ``bisect`` até o início do prefixo seguido
+    da leitura do intervalo. O top-K de cada prefixo consultado fica
+    memorizado (os de até ``precomputed_prefix`` letras já saem prontos da
+    carga) e uma escrita só mexe nos prefixos das chaves que ela altera.
+
+    A ordem vem da popularidade (visualizações e adições ao carrinho de
+    ``ProductActivity``), do destaque e do estoque. A recarga periódica roda
+    em segundo plano; até ela terminar, as consultas usam o índice anterior.
+    """
+
+    precomputed_prefix = 2
+    max_limit = 20
+    max_memo = 20000
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._keys = []
+        self._entries = {}
+        self._top_cache = {}
+        self._loaded_at = None
+        self._loading = False
+
+    @property
+    def ttl(self):
+        return getattr(settings, "SUGGEST_INDEX_TTL", 300)
+
+    def popularity(self, product_ids):
+        weights = product_counters.options["WEIGHTS"]
+        activity = ProductActivity.objects.filter(product_id__in=product_ids)
+        return {
+            product_id: views * weights["views"] + cart_adds * weights["cart_adds"]
+            for product_id, views, cart_adds in activity.values_list(
+                "product_id", "views", "cart_adds"
+            )
+        }
+
+    def product_weight(self, product, popularity=0.0):
+        weight = 1.0 + math.log1p(popularity)
+        if product.featured:
+            weight += 2.0
+        if product.stock_quantity > 0:
+            weight += 1.0
+        return weight
+
+    def category_weight(self, category):
+        return 1.0 + category_tree().subtree_products_count(category)
+
+    def make_entries(self, kind, pk, text, slug, weight):
+        words = fold(text).split()
+        suggestion = (kind, text, slug)
+        return [
+            (" ".join(words[start:]), -weight, kind, pk, suggestion)
+            for start in range(len(words))
+        ]
+
+    def product_entries(self, product, popularity=0.0):
+        if not product.is_active:
+            return []
+        return self.make_entries(
+            "product",
+            product.pk,
+            product.title,
+            product.slug,
+            self.product_weight(product, popularity),
+        )
+
+    def category_entries(self, category):
+        if not category.is_active:
+            return []
+        return self.make_entries(
+            "category",
+            category.pk,
+            category.name,
+            category.slug,
+            self.category_weight(category),
+        )
+
+    def load(self):
+        entries = {}
+        weights = product_counters.options["WEIGHTS"]
+        products = Product.objects.filter(is_active=True).values_list(
+            "pk",
+            "title",
+            "slug",
+            "featured",
+            "stock_quantity",
+            "activity__views",
+            "activity__cart_adds",
+        )
+        for pk, title, slug, featured, stock, views, cart_adds in products.iterator(
+            chunk_size=2000
+        ):
+            product = Product(
+                pk=pk,
+                title=title,
+                slug=slug,
+                featured=featured,
+                stock_quantity=stock,
+                is_active=True,
+            )
+            popularity = (views or 0) * weights["views"] + (cart_adds or 0) * weights[
+                "cart_adds"
+            ]
+            entries[("product", pk)] = self.product_entries(product, popularity)
+        for category in category_tree().by_id.values():
+            if category.is_active:
+                entries[("category", category.pk)] = self.category_entries(category)
+        keys = sorted(key for group in entries.values() for key in group)
+        top_cache = {}
+        for key in keys:
+            for length in range(1, self.precomputed_prefix + 1):
+                prefix = key[0][:length]
+                if len(prefix) == length and prefix not in top_cache:
+                    top_cache[prefix] = self.rank(keys, prefix)
+        with self._lock:
+            self._entries, self._keys = entries, keys
+            self._top_cache = top_cache
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        if self._loaded_at is None:
+            # Primeira carga: as requisições esperam uma única montagem.
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self.load()
+        elif time.monotonic() - self._loaded_at >= self.ttl:
+            self.reload()
+
+    def reload(self):
+        """Recarrega em segundo plano, servindo o índice atual enquanto isso."""
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                with self._load_lock:
+                    self.load()
+            finally:
+                self._loading = False
+                close_old_connections()
+
+        threading.Thread(target=run, name="suggest-index", daemon=True).start()
+
+    def replace(self, kind, pk, new_entries):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            old_entries = self._entries.pop((kind, pk), [])
+            for key in old_entries:
+                index = bisect_left(self._keys, key)
+                if index < len(self._keys) and self._keys[index] == key:
+                    del self._keys[index]
+            for key in new_entries:
+                insort(self._keys, key)
+            if new_entries:
+                self._entries[(kind, pk)] = new_entries
+            self.update_memo((kind, pk), old_entries, new_entries)
+
+    def update_memo(self, identity, old_entries, new_entries):
+        """Ajusta o top-K memorizado só nos prefixos das chaves alteradas."""
+        prefixes = {
+            key[0][:length]
+            for key in (*old_entries, *new_entries)
+            for length in range(1, len(key[0]) + 1)
+        }
+        for prefix in prefixes & self._top_cache.keys():
+            ranked = self._top_cache[prefix]
+            kept = [key for key in ranked if (key[2], key[3]) != identity]
+            matching = [key for key in new_entries if key[0].startswith(prefix)]
+            best = min(matching, key=self.rank_key) if matching else None
+            if len(kept) < len(ranked) and len(ranked) == self.max_limit:
+                old = next(key for key in ranked if (key[2], key[3]) == identity)
+                if best is None or self.rank_key(best) > self.rank_key(old):
+                    # Caiu no ranking: quem estava fora do top-K pode entrar.
+                    del self._top_cache[prefix]
+                    continue
+            if best is not None:
+                kept.append(best)
+            self._top_cache[prefix] = sorted(kept, key=self.rank_key)[: self.max_limit]
+
+    def update_product(self, product):
+        self.update_products([product])
+
+    def update_products(self, products):
+        products = list(products)
+        popularity = self.popularity([product.pk for product in products])
+        for product in products:
+            self.replace(
+                "product",
+                product.pk,
+                self.product_entries(product, popularity.get(product.pk, 0.0)),
+            )
+
+    def update_category(self, category):
+        self.replace("category", category.pk, self.category_entries(category))
+
+    def remove(self, kind, pk):
+        self.replace(kind, pk, [])
+
+    @staticmethod
+    def rank_key(key):
+        return key[1], key[0]
+
+    def rank(self, keys, prefix):
+        start = bisect_left(keys, (prefix,))
+        best = {}
+        for index in range(start, len(keys)):
+            key = keys[index]
+            if not key[0].startswith(prefix):
+                break
+            identity = (key[2], key[3])
+            if identity not in best or key[1] < best[identity][1]:
+                best[identity] = key
+        return heapq.nsmallest(self.max_limit, best.values(), key=self.rank_key)
+
+    def suggest(self, prefix, limit=8):
+        prefix = " ".join(fold(prefix).split())
+        if not prefix:
+            return []
+        self.ensure_loaded()
+        with self._lock:
+            ranked = self._top_cache.get(prefix)
+            if ranked is None:
+                ranked = self.rank(self._keys, prefix)
+                if len(self._top_cache) >= self.max_memo:
+                    # Descarta o mais antigo; os pré-calculados são os primeiros
+                    # a entrar, mas voltam na próxima carga.
+                    self._top_cache.pop(next(iter(self._top_cache)))
+                self._top_cache[prefix] = ranked
+            return [
+                {"type": kind, "text": text, "slug": slug}
+                for kind, text, slug in (key[4] for key in ranked[:limit])
+            ]
+
+
+suggest_index = SuggestIndex()
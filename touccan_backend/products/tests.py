@@ -1,3 +1,1868 @@
-from django.test import TestCase
+import base64
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models.functions import Lower
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from touccan_backend.pagination import KeysetPagination
+from touccan_backend.planner import get_query_plan, plan_queryset
+from touccan_backend.response_cache import response_cache
+from touccan_backend.testing import QueryBudgetMixin
+from transactions.models import PaymentMethod
+
+from . import inventory, recommendations, renditions
+from .counters import product_counters
+from .facets import Bitsets, catalog_index
+from .management.commands.import_catalog import CategoryResolver
+from .models import (
+    Category,
+    ImageBlob,
+    Product,
+    ProductActivity,
+    ProductImage,
+    RelatedProduct,
+    StockReservation,
+)
+from .recommendations import (
+    CoPurchaseMatrix,
+    build_recommendations,
+    recommendation_options,
+)
+from .search import analyze, search_index
+from .serializers import (
+    ProductListSerializer,
+    ProductSerializer,
+    compiled_product_list,
+)
+from .slugs import SlugAllocator
+from .storage import ContentAddressedStorage, blob_digest
+from .suggest import suggest_index
+from .tree import category_tree, invalidate_category_tree
+from .views import ProductViewSet
+
+# Os orçamentos são as contagens com caches frios (árvore de categorias e
+# cache de respostas); nenhuma consulta pode se repetir por item listado.
+REPEATED = 2
+
+
+class CatalogQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        for index in range(4):
+            category = Category.objects.create(name=f"Categoria {index}")
+            child = Category.objects.create(name=f"Sub {index}", parent=category)
+            for number in range(3):
+                Product.objects.create(
+                    title=f"Produto {index}-{number}",
+                    description="Descrição",
+                    price=Decimal("10.00") + number,
+                    stock_quantity=5,
+                    category=child,
+                    seller=seller,
+                )
+        cls.product = Product.objects.first()
+
+    def setUp(self):
+        cache.clear()
+        # Carregado aqui, e não pela thread de fundo, para as contagens serem
+        # sempre as do caminho com índice.
+        catalog_index.load()
+
+    def test_category_list(self):
+        with self.assertQueryBudget(3, repeated=REPEATED):
+            response = self.client.get(reverse("products:category-list"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_category_tree(self):
+        with self.assertQueryBudget(2, repeated=REPEATED):
+            response = self.client.get(reverse("products:category-tree"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_list(self):
+        with self.assertQueryBudget(2, repeated=REPEATED):
+            response = self.client.get(reverse("products:product-list"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_async_product_list(self):
+        with self.assertQueryBudget(2, repeated=REPEATED):
+            response = self.client.get(reverse("products:async-product-list"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_detail(self):
+        url = reverse("products:product-detail", args=[self.product.slug])
+        with self.assertQueryBudget(2, repeated=REPEATED):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        parent = Category.objects.create(name="Casa")
+        cls.category = Category.objects.create(name="Cozinha", parent=parent)
+        cls.add_products(2)
+
+    @classmethod
+    def add_products(cls, count):
+        start = Product.objects.count()
+        for number in range(start, start + count):
+            product = Product.objects.create(
+                title=f"Panela {number}",
+                price=Decimal("10.00"),
+                stock_quantity=1,
+                category=cls.category,
+                seller=cls.seller,
+            )
+            ProductImage.objects.create(
+                product=product, image="products/images/panela.jpg", is_primary=True
+            )
+
+    def setUp(self):
+        invalidate_category_tree()
+        self.addCleanup(invalidate_category_tree)
+
+    def test_plan_follows_the_serializer_fields(self):
+        plan = get_query_plan(ProductListSerializer)
+        self.assertEqual(plan.select_related, {"category", "seller"})
+        self.assertTrue(plan.project)
+        self.assertLessEqual(
+            {"title", "price", "category__name", "seller__username"}, plan.only
+        )
+        self.assertNotIn("description", plan.only)
+        images = plan.prefetch["images"]
+        self.assertTrue(images.project)
+        self.assertEqual(
+            images.only, {"product", "image", "is_primary", "order", "renditions"}
+        )
+
+    def test_unhinted_method_fields_disable_projection(self):
+        class Unhinted(ProductListSerializer):
+            extra = serializers.SerializerMethodField()
+
+            class Meta(ProductListSerializer.Meta):
+                fields = [*ProductListSerializer.Meta.fields, "extra"]
+
+            def get_extra(self, obj):
+                return obj.description
+
+        plan = get_query_plan(Unhinted)
+        self.assertFalse(plan.project)
+        deferred = plan.apply(Product.objects.all()).query.deferred_loading
+        self.assertEqual(deferred, (frozenset(), True))
+        # Os relacionamentos continuam planejados.
+        self.assertEqual(plan.select_related, {"category", "seller"})
+
+    def serialize(self):
+        category_tree()
+        queryset = plan_queryset(Product.objects.order_by("pk"), ProductSerializer)
+        with CaptureQueriesContext(connection) as queries:
+            data = ProductSerializer(queryset, many=True).data
+        return data, len(queries)
+
+    def test_queries_do_not_grow_with_the_page(self):
+        data, few = self.serialize()
+        self.add_products(5)
+        more_data, many = self.serialize()
+        self.assertEqual((len(data), len(more_data)), (2, 7))
+        self.assertEqual(few, many)
+        self.assertEqual(many, 2)
+        self.assertEqual(more_data[0]["category_path"], "Casa > Cozinha")
+        self.assertEqual(
+            more_data[0]["primary_image"]["image"], data[0]["primary_image"]["image"]
+        )
+
+
+class CompiledProductListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        category = Category.objects.create(name="Cozinha")
+        cls.products = [
+            Product.objects.create(
+                title=title,
+                description="Descrição",
+                price=Decimal("19.90") + index,
+                stock_quantity=index,
+                category=category,
+                seller=seller,
+                featured=index % 2 == 0,
+            )
+            for index, title in enumerate(
+                ("Panela", "Tampa", "Colher de pau", "Frigideira")
+            )
+        ]
+        pan, lid, spoon, _ = cls.products
+        ProductImage.objects.create(
+            product=pan,
+            image="products/images/panela de açaí.jpg",
+            is_primary=True,
+            renditions={
+                "thumb": {
+                    "width": 160,
+                    "height": 120,
+                    "webp": "products/renditions/p-160.webp",
+                    "fallback": "products/renditions/p-160.jpg",
+                },
+                "card": {
+                    "width": 480,
+                    "height": 360,
+                    "webp": "products/renditions/p-480.webp",
+                    "fallback": "products/renditions/p-480.jpg",
+                },
+            },
+        )
+        ProductImage.objects.create(
+            product=lid, image="products/images/tampa.png", is_primary=True
+        )
+        # Só imagens secundárias: nenhuma imagem principal na listagem.
+        ProductImage.objects.create(product=spoon, image="products/images/colher.jpg")
+
+    def render(self, request):
+        queryset = Product.objects.select_related("category", "seller").order_by("pk")
+        context = {"request": request}
+        expected = JSONRenderer().render(
+            ProductListSerializer(
+                queryset.prefetch_related("images"), many=True, context=context
+            ).data
+        )
+        compiled = JSONRenderer().render(
+            compiled_product_list.serialize(
+                compiled_product_list.values(queryset), context
+            )
+        )
+        return expected, compiled
+
+    def test_output_is_byte_identical_to_the_serializer(self):
+        for request in (None, Request(RequestFactory().get("/api/products/"))):
+            with self.subTest(request=request):
+                expected, compiled = self.render(request)
+                self.assertEqual(compiled, expected)
+
+    def test_covers_every_case_of_the_fixture(self):
+        _, compiled = self.render(None)
+        rows = json.loads(compiled)
+        self.assertEqual(len(rows), 4)
+        self.assertIn("p-480.jpg", rows[0]["primary_image"])
+        self.assertIn("480w", rows[0]["primary_image_srcset"])
+        self.assertIsNone(rows[1]["primary_image_srcset"])
+        self.assertEqual([row["primary_image"] for row in rows[2:]], [None, None])
+
+
+class AsyncCatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        cls.sport = Category.objects.create(name="Esporte")
+        ball = Category.objects.create(name="Bolas", parent=cls.sport)
+        cls.ball = Product.objects.create(
+            title="Bola",
+            description="Oficial",
+            price=Decimal("90.00"),
+            stock_quantity=3,
+            category=ball,
+            seller=seller,
+        )
+        cls.seller = seller
+
+    def setUp(self):
+        catalog_index.load()
+        # Árvore fria: a view assíncrona não pode carregá-la de forma síncrona.
+        invalidate_category_tree()
+        self.addCleanup(invalidate_category_tree)
+        self.url = reverse("products:async-product-list")
+
+    async def titles(self, **params):
+        response = await self.async_client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [row["title"] for row in response.json()["results"]]
+
+    async def test_category_slug_with_a_cold_tree(self):
+        self.assertEqual(await self.titles(category_slug=self.sport.slug), ["Bola"])
+        self.assertEqual(
+            await self.titles(category_slug=self.sport.slug, price_max="50"), []
+        )
+
+    async def test_unknown_category_slug(self):
+        self.assertEqual(await self.titles(category_slug="nao-existe"), [])
+
+    async def test_category_slug_missing_from_the_tree_snapshot(self):
+        games = await Category.objects.acreate(name="Jogos")
+        await Product.objects.acreate(
+            title="Xadrez",
+            description="Tabuleiro",
+            price=Decimal("40.00"),
+            stock_quantity=1,
+            category=games,
+            seller=self.seller,
+        )
+        # Sem ``on_commit`` no ``TestCase``: o índice é recarregado à mão.
+        await sync_to_async(catalog_index.load)()
+        await self.titles(category_slug=self.sport.slug)
+        # ``update`` não dispara sinais: o snapshot fica com o slug antigo.
+        await Category.objects.filter(pk=games.pk).aupdate(slug="jogos-de-mesa")
+        self.assertEqual(await self.titles(category_slug="jogos-de-mesa"), ["Xadrez"])
+
+    async def test_filters_match_the_viewset(self):
+        sync_url = reverse("products:product-list")
+        cases = [
+            ({"category": "999999"}, 400),
+            ({"seller": "x"}, 400),
+            ({"ordering": "-price", "search": "bola"}, 200),
+        ]
+        for params, status_code in cases:
+            with self.subTest(params=params):
+                expected = await self.async_client.get(sync_url, params)
+                response = await self.async_client.get(self.url, params)
+                self.assertEqual(expected.status_code, status_code)
+                self.assertEqual(response.status_code, status_code)
+                if status_code == 200:
+                    self.assertEqual(
+                        response.json()["results"], expected.json()["results"]
+                    )
+                else:
+                    self.assertEqual(response.json(), expected.json())
+
+    async def test_cached_with_etag(self):
+        await sync_to_async(cache.clear)()
+        await sync_to_async(catalog_index.load)()
+        urls = [
+            self.url,
+            reverse("products:async-product-detail", args=[self.ball.slug]),
+            reverse("products:async-category-tree"),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                first = await self.async_client.get(url)
+                self.assertEqual(first["X-Cache"], "MISS")
+                second = await self.async_client.get(url)
+                self.assertEqual(second["X-Cache"], "HIT")
+                self.assertEqual(second.content, first.content)
+                not_modified = await self.async_client.get(
+                    url, headers={"if-none-match": first["ETag"]}
+                )
+                self.assertEqual(not_modified.status_code, 304)
+
+        await sync_to_async(response_cache.invalidate)(f"product:{self.ball.pk}")
+        response = await self.async_client.get(urls[1])
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    async def assertSameResponse(self, sync_url, async_url, params=None):
+        expected = await self.async_client.get(sync_url, params)
+        response = await self.async_client.get(async_url, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+
+    async def test_detail_and_tree_match_the_sync_views(self):
+        for slug in (self.ball.slug, "nao-existe"):
+            with self.subTest(slug=slug):
+                await self.assertSameResponse(
+                    reverse("products:product-detail", args=[slug]),
+                    reverse("products:async-product-detail", args=[slug]),
+                )
+        await self.assertSameResponse(
+            reverse("products:category-tree"), reverse("products:async-category-tree")
+        )
+
+    async def test_search_matches_the_sync_view(self):
+        net = await Product.objects.acreate(
+            title="Rede de vôlei",
+            description="Acompanha bola",
+            price=Decimal("120.00"),
+            stock_quantity=2,
+            category=self.ball.category,
+            seller=self.seller,
+        )
+        await sync_to_async(catalog_index.load)()
+        sync_url = reverse("products:product-search")
+        # Sem índice (busca por ``icontains``) e com o ranking do índice.
+        for ranked_ids in (None, [net.pk, self.ball.pk]):
+            for params in ({"q": "bola"}, {"q": "bola", "ordering": "-price"}, {}):
+                with self.subTest(ranked_ids=ranked_ids, params=params):
+                    with mock.patch.object(
+                        search_index, "search", return_value=ranked_ids
+                    ):
+                        await self.assertSameResponse(
+                            sync_url, reverse("products:async-product-search"), params
+                        )
+
+
+class CatalogIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        sellers = [
+            User.objects.create_user(f"vendedor{number}", password="senha-de-teste")
+            for number in range(2)
+        ]
+        cls.sport = Category.objects.create(name="Esporte")
+        balls = Category.objects.create(name="Bolas", parent=cls.sport)
+        books = Category.objects.create(name="Livros")
+        prices = ["9.90", "50.00", "99.99", "120.00", "480.00", "1500.00", "7000.00"]
+        cls.products = [
+            Product.objects.create(
+                title=f"Produto {number}",
+                description="Descrição",
+                price=Decimal(price),
+                stock_quantity=number % 3,
+                featured=number % 2 == 0,
+                category=(balls, books, cls.sport)[number % 3],
+                seller=sellers[number % 2],
+            )
+            for number, price in enumerate(prices * 2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        catalog_index.load()
+        self.facets_url = reverse("products:product-facets")
+        self.list_url = reverse("products:product-list")
+
+    def test_facets_match_sql(self):
+        cases = [
+            {},
+            {"in_stock": "true"},
+            {"featured": "false"},
+            {"category_slug": self.sport.slug},
+            {"price_min": "50", "price_max": "480"},
+            {"price_min": "99.99", "in_stock": "true", "featured": "true"},
+        ]
+        for params in cases:
+            with self.subTest(params=params):
+                indexed = self.client.get(self.facets_url, params).json()
+                cache.clear()
+                catalog_index.load()
+                with mock.patch.object(catalog_index, "is_warm", return_value=False):
+                    from_sql = self.client.get(self.facets_url, params).json()
+                self.assertEqual(indexed, from_sql)
+                self.assertGreater(indexed["count"], 0)
+
+    def test_update_without_signals_never_leaks_into_results(self):
+        product = self.products[1]
+        response = self.client.get(self.list_url, {"in_stock": "true"})
+        self.assertIn(
+            product.title, [row["title"] for row in response.json()["results"]]
+        )
+
+        # ``update`` não passa pelo índice nem pela versão: o índice ainda
+        # aponta o produto como disponível, mas o filtro vale no SQL.
+        Product.objects.filter(pk=product.pk).update(stock_quantity=0)
+        self.assertIn(product.pk, catalog_index.lookup({"in_stock": "true"}))
+        response = self.client.get(self.list_url, {"in_stock": "true", "page": 1})
+        titles = [row["title"] for row in response.json()["results"]]
+        self.assertNotIn(product.title, titles)
+
+    def test_write_in_another_process_falls_back_to_sql(self):
+        self.assertIsNotNone(catalog_index.lookup({"in_stock": "true"}))
+        # Outro processo confirmou uma escrita e avançou a versão.
+        cache.incr(catalog_index.version_key)
+        with mock.patch.object(catalog_index, "warm_up") as warm_up:
+            self.assertIsNone(catalog_index.lookup({"in_stock": "true"}))
+        warm_up.assert_called_once_with(force=True)
+
+        catalog_index.load()
+        self.assertIsNotNone(catalog_index.lookup({"in_stock": "true"}))
+
+    def test_local_write_keeps_the_index_current(self):
+        product = self.products[0]
+        product.stock_quantity = 4
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        with mock.patch.object(catalog_index, "warm_up") as warm_up:
+            ids = catalog_index.lookup({"in_stock": "true"})
+        warm_up.assert_not_called()
+        self.assertIn(product.pk, ids)
+
+    def test_bitsets_update_one_bit(self):
+        bitsets = Bitsets([("a", [0, 2]), ("b", [1])])
+        self.assertEqual(bitsets.get("a"), 0b101)
+        bitsets.set("a", 9, True)
+        bitsets.set("a", 0, False)
+        bitsets.set("c", 3, True)
+        self.assertEqual(
+            dict(bitsets.items()), {"a": 0b1000000100, "b": 0b10, "c": 0b1000}
+        )
+        self.assertEqual(bitsets.get("ausente", 0), 0)
+
+
+class CategoryPathTests(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name="Raiz")
+        self.child = Category.objects.create(name="Filha", parent=self.root)
+        self.grandchild = Category.objects.create(name="Neta", parent=self.child)
+        self.other = Category.objects.create(name="Outra")
+
+    def test_reparent_rewrites_subtree(self):
+        self.child.parent = self.other
+        self.child.save()
+        self.grandchild.refresh_from_db()
+        self.assertEqual(
+            self.grandchild.path,
+            f"{self.other.pk}/{self.child.pk}/{self.grandchild.pk}/",
+        )
+        self.assertEqual(self.grandchild.depth, 2)
+
+    def test_parent_cannot_be_a_descendant(self):
+        self.root.parent = self.grandchild
+        with self.assertRaises(ValidationError):
+            self.root.save()
+        self.root.parent = self.root
+        with self.assertRaises(ValidationError):
+            self.root.save()
+        self.grandchild.refresh_from_db()
+        self.assertEqual(
+            self.grandchild.path,
+            f"{self.root.pk}/{self.child.pk}/{self.grandchild.pk}/",
+        )
+
+    def test_api_rejects_cycle(self):
+        url = reverse("products:category-detail", args=[self.root.slug])
+        response = self.client.patch(
+            url, {"parent": self.grandchild.pk}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("parent", response.json())
+
+
+class CategorySubtreeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        cls.home = Category.objects.create(name="Casa")
+        cls.kitchen = Category.objects.create(name="Cozinha", parent=cls.home)
+        cls.pans = Category.objects.create(name="Panelas", parent=cls.kitchen)
+        cls.hidden = Category.objects.create(
+            name="Oculta", parent=cls.home, is_active=False
+        )
+        cls.garden = Category.objects.create(name="Jardim")
+        for title, category, active in (
+            ("Vaso", cls.home, True),
+            ("Faca", cls.kitchen, True),
+            ("Panela", cls.pans, True),
+            ("Frigideira", cls.pans, True),
+            ("Caçarola", cls.pans, False),
+            ("Mangueira", cls.garden, True),
+        ):
+            Product.objects.create(
+                title=title,
+                price=Decimal("10.00"),
+                stock_quantity=1,
+                category=category,
+                seller=seller,
+                is_active=active,
+            )
+
+    def setUp(self):
+        cache.clear()
+        invalidate_category_tree()
+        self.addCleanup(invalidate_category_tree)
+        catalog_index.load()
+
+    def titles(self, **params):
+        response = self.client.get(reverse("products:product-list"), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(item["title"] for item in response.json()["results"])
+
+    def test_filter_by_category_includes_descendants(self):
+        self.assertEqual(
+            self.titles(category_slug=self.home.slug),
+            ["Faca", "Frigideira", "Panela", "Vaso"],
+        )
+        self.assertEqual(
+            self.titles(category_slug=self.kitchen.slug),
+            ["Faca", "Frigideira", "Panela"],
+        )
+        self.assertEqual(self.titles(category_slug=self.garden.slug), ["Mangueira"])
+
+    def test_tree_counts_active_products_per_subtree(self):
+        response = self.client.get(reverse("products:category-tree"))
+        roots = {node["name"]: node for node in response.json()}
+        home = roots["Casa"]
+        self.assertEqual(
+            (home["products_count"], home["subtree_products_count"]), (1, 4)
+        )
+        # Categorias inativas ficam fora da árvore.
+        (kitchen,) = home["subcategories"]
+        self.assertEqual(
+            (kitchen["products_count"], kitchen["subtree_products_count"]), (1, 3)
+        )
+        (pans,) = kitchen["subcategories"]
+        self.assertEqual(pans["full_path"], "Casa > Cozinha > Panelas")
+        self.assertEqual(pans["subtree_products_count"], 2)
+
+    def test_tree_is_served_from_the_snapshot(self):
+        category_tree()
+        with self.assertNumQueries(0):
+            tree = category_tree()
+            self.assertEqual(tree.subtree_products_count(self.home), 4)
+            self.assertEqual(tree.get_path_for_slug(self.pans.slug), self.pans.path)
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        category = Category.objects.create(name="Calçados")
+        cls.products = [
+            Product.objects.create(
+                title=title,
+                description="Confortável para o dia a dia",
+                price=Decimal("99.90"),
+                stock_quantity=3,
+                category=category,
+                seller=seller,
+            )
+            for title in ("Tênis de corrida", "Sandália de couro", "Bota de couro")
+        ]
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(
+            PRODUCT_SEARCH={"PATH": os.path.join(directory.name, "search.sqlite3")}
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        # A montagem em segundo plano é exercitada chamando ``sync`` direto.
+        patcher = mock.patch.object(search_index, "refresh")
+        self.refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse("products:product-search")
+
+    def titles(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [row["title"] for row in response.json()["results"]]
+
+    def test_missing_index_falls_back_to_icontains(self):
+        response = self.client.get(self.url, {"q": "couro"})
+        self.assertEqual(
+            sorted(self.titles(response)), ["Bota de couro", "Sandália de couro"]
+        )
+        self.refresh.assert_called()
+
+    def test_built_index_ranks_results(self):
+        search_index.sync()
+        self.assertEqual(
+            self.titles(self.client.get(self.url, {"q": "tenis"})), ["Tênis de corrida"]
+        )
+        self.refresh.assert_not_called()
+
+    def test_sync_picks_up_writes_from_other_hosts(self):
+        search_index.sync()
+        # Escrita feita em outra máquina: não passa pelos signals daqui.
+        Product.objects.filter(pk=self.products[0].pk).update(
+            title="Chinelo de borracha", updated_at=timezone.now()
+        )
+        Product.objects.filter(pk=self.products[1].pk).update(
+            is_active=False, updated_at=timezone.now()
+        )
+        search_index.sync()
+        self.assertEqual(search_index.search("chinelo"), [self.products[0].pk])
+        self.assertEqual(search_index.search("sandalia"), [])
+
+    def test_analysis_folds_accents_plurals_and_diminutives(self):
+        for variants in (
+            ("Calçados de Couro", "calcado couro", "CALÇADO COUROS"),
+            ("botões", "botão", "BOTAO"),
+            ("sapatinhos", "sapato", "Sapatos"),
+            ("Lençóis", "lençol"),
+            ("Camisetas Vermelhas", "camiseta vermelha"),
+        ):
+            with self.subTest(variants=variants):
+                self.assertEqual(len({tuple(analyze(text)) for text in variants}), 1)
+        self.assertEqual(analyze("de para com uma"), [])
+        self.assertEqual(analyze("Tênis 42"), ["tenis", "42"])
+
+    def test_title_matches_rank_above_description_matches(self):
+        belt = Product.objects.create(
+            title="Cinto marrom",
+            description="Feito de couro legítimo",
+            price=Decimal("49.90"),
+            stock_quantity=1,
+            category=self.products[0].category,
+            seller=self.products[0].seller,
+        )
+        search_index.sync()
+        ranked = search_index.search("couros")
+        self.assertEqual(ranked[-1], belt.pk)
+        self.assertEqual(set(ranked[:-1]), {self.products[1].pk, self.products[2].pk})
+        # Todos os termos precisam aparecer.
+        self.assertEqual(search_index.search("bota de couro"), [self.products[2].pk])
+        self.assertEqual(search_index.search("de"), [])
+
+    def test_stale_index_falls_back(self):
+        search_index.sync()
+        with search_index.connect() as connection:
+            search_index.set_synced_at(connection, time.time() - 3600)
+        self.assertIsNone(search_index.search("couro"))
+        self.refresh.assert_called()
+
+
+class SuggestIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        category = Category.objects.create(name="Roupas")
+        cls.blue, cls.green = (
+            Product.objects.create(
+                title=title,
+                description="Algodão",
+                price=Decimal("49.90"),
+                stock_quantity=3,
+                category=category,
+                seller=seller,
+            )
+            for title in ("Camisa azul", "Camisa verde")
+        )
+        ProductActivity.objects.create(product=cls.green, views=40, cart_adds=8)
+
+    def setUp(self):
+        suggest_index.load()
+
+    def texts(self, prefix):
+        return [row["text"] for row in suggest_index.suggest(prefix)]
+
+    def test_ranks_by_popularity(self):
+        self.assertEqual(self.texts("cam"), ["Camisa verde", "Camisa azul"])
+        self.assertEqual(self.texts("ca"), ["Camisa verde", "Camisa azul"])
+
+    def test_expired_index_is_served_while_rebuilding(self):
+        suggest_index._loaded_at -= suggest_index.ttl
+        # Escrita sem signals: só aparece depois da recarga.
+        Product.objects.filter(pk=self.blue.pk).update(title="Calça azul")
+        with mock.patch.object(suggest_index, "reload") as reload:
+            self.assertEqual(self.texts("camisa"), ["Camisa verde", "Camisa azul"])
+        reload.assert_called_once()
+
+    def test_write_updates_memoized_prefixes(self):
+        self.assertEqual(self.texts("camisa"), ["Camisa verde", "Camisa azul"])
+        self.blue.title = "Calça azul"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blue.save()
+        self.assertEqual(self.texts("camisa"), ["Camisa verde"])
+        self.assertEqual(self.texts("cal"), ["Calça azul"])
+        self.assertEqual(self.texts("azul"), ["Calça azul"])
+
+    def test_matches_any_word_ignoring_accents_and_case(self):
+        Product.objects.create(
+            title="Calção de banho",
+            price=Decimal("39.90"),
+            stock_quantity=0,
+            category=self.blue.category,
+            seller=self.blue.seller,
+        )
+        Product.objects.create(
+            title="Camisa retirada",
+            price=Decimal("39.90"),
+            stock_quantity=3,
+            category=self.blue.category,
+            seller=self.blue.seller,
+            is_active=False,
+        )
+        suggest_index.load()
+        self.assertEqual(self.texts("CALCAO"), ["Calção de banho"])
+        self.assertEqual(self.texts("banh"), ["Calção de banho"])
+        self.assertEqual(self.texts("  camisa   VER "), ["Camisa verde"])
+        self.assertEqual(
+            suggest_index.suggest("roup"),
+            [{"type": "category", "text": "Roupas", "slug": "roupas"}],
+        )
+        self.assertNotIn("Camisa retirada", self.texts("camisa"))
+        self.assertEqual(self.texts(" "), [])
+
+    def test_endpoint_caps_the_limit_and_needs_no_queries(self):
+        url = reverse("products:product-suggest")
+        for number in range(25):
+            Product.objects.create(
+                title=f"Caneca {number}",
+                price=Decimal("9.90"),
+                stock_quantity=1,
+                category=self.blue.category,
+                seller=self.blue.seller,
+            )
+        suggest_index.load()
+        with self.assertNumQueries(0):
+            capped = self.client.get(url, {"q": "can", "limit": 100}).json()
+            default = self.client.get(url, {"q": "can", "limit": "x"}).json()
+            single = self.client.get(url, {"q": "can", "limit": 0}).json()
+        self.assertEqual((len(capped), len(default), len(single)), (20, 8, 1))
+
+
+class KeysetCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        category = Category.objects.create(name="Livros")
+        # Preços repetidos: o desempate pela chave primária é que separa as páginas.
+        for index in range(5):
+            Product.objects.create(
+                title=f"Livro {index}",
+                description="Capa dura",
+                price=Decimal("30.00") + index % 2,
+                stock_quantity=1,
+                category=category,
+                seller=seller,
+            )
+        cls.url = reverse("products:product-list")
+
+    def setUp(self):
+        cache.clear()
+        catalog_index.load()
+
+    def cursor(self, data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+    def test_pages_cover_every_row_once(self):
+        seen = []
+        url = f"{self.url}?ordering=price&page_size=2"
+        while url:
+            body = self.client.get(url).json()
+            seen += [row["id"] for row in body["results"]]
+            last, url = body, body["next"]
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        previous = self.client.get(last["previous"]).json()
+        self.assertEqual([row["id"] for row in previous["results"]], seen[2:4])
+
+    def test_tampered_cursors_are_not_found(self):
+        for cursor in (
+            "não é base64",
+            self.cursor([1, 2]),
+            self.cursor({"p": [1]}),
+            self.cursor({"p": "2024-01-01"}),
+            self.cursor({"p": [{"$gt": 1}, 1]}),
+            self.cursor({"p": ["ontem", 1]}),
+            self.cursor({"p": [None, 1]}),
+            self.cursor({"p": [True, 1]}),
+            self.cursor({"o": 2}),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {"detail": "Cursor inválido."})
+
+    def test_counts_on_request(self):
+        self.assertNotIn("count", self.client.get(self.url).json())
+        exact = self.client.get(self.url, {"count": "exact"}).json()
+        self.assertEqual((exact["count"], exact["count_is_estimate"]), (5, False))
+        with mock.patch.object(KeysetPagination, "estimate_cap", 3):
+            estimate = self.client.get(self.url, {"count": "estimate"}).json()
+        self.assertEqual((estimate["count"], estimate["count_is_estimate"]), (3, True))
+
+    def test_later_pages_seek_instead_of_skipping(self):
+        first = self.client.get(self.url, {"ordering": "-price", "page_size": 2})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.json()["next"])
+        page_sql = [
+            query["sql"] for query in queries if "products_product" in query["sql"]
+        ]
+        self.assertTrue(page_sql)
+        self.assertFalse(any("OFFSET" in sql for sql in page_sql))
+
+    def test_expression_ordering_pages_by_offset(self):
+        paginator = KeysetPagination()
+        request = Request(RequestFactory().get("/api/products/", {"page_size": 2}))
+        queryset = Product.objects.order_by(Lower("title").desc())
+        rows = paginator.paginate_queryset(queryset, request)
+        self.assertEqual([row.title for row in rows], ["Livro 4", "Livro 3"])
+        cursor = parse_qs(urlsplit(paginator.next_url).query)["cursor"][0]
+        self.assertEqual(json.loads(base64.urlsafe_b64decode(cursor)), {"o": 2})
+        request = Request(
+            RequestFactory().get("/api/products/", {"page_size": 2, "cursor": cursor})
+        )
+        rows = paginator.paginate_queryset(queryset, request)
+        self.assertEqual([row.title for row in rows], ["Livro 2", "Livro 1"])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        cls.category = Category.objects.create(name="Jogos")
+        cls.product = Product.objects.create(
+            title="Tabuleiro",
+            description="Para a família",
+            price=Decimal("120.00"),
+            stock_quantity=2,
+            category=cls.category,
+            seller=seller,
+        )
+
+    def setUp(self):
+        cache.clear()
+        catalog_index.load()
+        self.list_url = reverse("products:product-list")
+        self.detail_url = reverse("products:product-detail", args=[self.product.slug])
+
+    def test_matching_etag_answers_304_without_queries(self):
+        etag = self.client.get(self.list_url)["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        # Sem a entrada do cache de respostas: o 304 vem só das versões.
+        with mock.patch.object(response_cache, "get", return_value=None):
+            with self.assertNumQueries(0):
+                response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(
+            self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+    def test_product_write_changes_etag(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        self.product.description = "Para a família toda"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["description"], "Para a família toda")
+
+    def test_stock_update_changes_etag(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=1)
+        response_cache.invalidate(f"product:{self.product.pk}")
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["stock_quantity"], 1)
+
+    def test_category_rename_changes_tree_etag(self):
+        url = reverse("products:category-tree")
+        etag = self.client.get(url)["ETag"]
+        self.category.name = "Jogos de tabuleiro"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["name"], "Jogos de tabuleiro")
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        category = Category.objects.create(name="Cozinha")
+        cls.product = Product.objects.create(
+            title="Panela de barro",
+            description="Capixaba",
+            price=Decimal("89.00"),
+            stock_quantity=4,
+            category=category,
+            seller=seller,
+        )
+
+    def setUp(self):
+        cache.clear()
+        catalog_index.load()
+        self.url = reverse("products:product-detail", args=[self.product.slug])
+
+    def test_hit_until_the_product_tag_is_invalidated(self):
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+        self.product.price = Decimal("79.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["price"], "79.00")
+        self.assertEqual(response_cache.stats(), {"hits": 1, "misses": 2})
+
+    def test_invalidation_while_building_is_not_cached(self):
+        tags = ProductViewSet.get_cache_tags
+
+        def write_during_build(view, data):
+            # A escrita chega depois da leitura do banco e antes do ``set``.
+            response_cache.invalidate(f"product:{self.product.pk}")
+            return tags(view, data)
+
+        with mock.patch.object(ProductViewSet, "get_cache_tags", write_during_build):
+            self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+
+    def test_invalidate_advances_family_and_generation(self):
+        before = response_cache.versions(["product:*", "category:*"])
+        generation = response_cache.generation()
+        response_cache.invalidate(f"product:{self.product.pk}")
+        after = response_cache.versions(["product:*", "category:*"])
+        self.assertNotEqual(after["product:*"], before["product:*"])
+        self.assertEqual(after["category:*"], before["category:*"])
+        self.assertNotEqual(response_cache.generation(), generation)
+
+
+class ImportCatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("fornecedor", password="senha-de-teste")
+        clothes = Category.objects.create(name="Roupas")
+        Category.objects.create(name="Camisetas", parent=clothes)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(content)
+        return path
+
+    def checkpoint(self, path):
+        with open(f"{path}.checkpoint", encoding="utf-8") as handle:
+            return json.load(handle)
+
+    def run_import(self, path, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "import_catalog",
+                path,
+                "--seller",
+                "fornecedor",
+                *args,
+                stdout=StringIO(),
+            )
+
+    def test_csv(self):
+        path = self.write(
+            "catalogo.csv",
+            "title,price,stock_quantity,category,featured\n"
+            'Camiseta Azul,"39,90",4,Roupas > Camisetas,sim\n'
+            "Camiseta Azul,39.90,0,roupas/camisetas,\n",
+        )
+        self.run_import(path)
+        products = Product.objects.order_by("id")
+        self.assertEqual(
+            [(p.slug, p.price, p.stock_quantity, p.featured) for p in products],
+            [
+                ("camiseta-azul", Decimal("39.90"), 4, True),
+                ("camiseta-azul-2", Decimal("39.90"), 0, False),
+            ],
+        )
+        self.assertEqual({p.category.slug for p in products}, {"camisetas"})
+
+    def test_malformed_records_are_rejected_one_by_one(self):
+        errors = os.path.join(self.directory, "erros.jsonl")
+        path = self.write(
+            "catalogo.jsonl",
+            "\n".join(
+                [
+                    '{"title": "Boné", "price": "25.00", "category": "camisetas"}',
+                    '{"title": "Quebrado", "price": ',
+                    '["não", "é", "objeto"]',
+                    '{"title": "Sem preço", "price": "NaN", "category": "camisetas"}',
+                    '{"title": "Infinito", "price": "Infinity", "category": "camisetas"}',
+                    '{"title": "Caro", "price": "1e12", "category": "camisetas"}',
+                    '{"title": "Estoque", "price": "5", "stock_quantity": [1],'
+                    ' "category": "camisetas"}',
+                    '{"title": "Meia", "price": "12.5", "category": "camisetas"}',
+                ]
+            ),
+        )
+        self.run_import(path, "--errors", errors)
+        self.assertEqual(
+            sorted(Product.objects.values_list("title", flat=True)), ["Boné", "Meia"]
+        )
+        with open(errors, encoding="utf-8") as handle:
+            rejected = [json.loads(line) for line in handle]
+        self.assertEqual([row["line"] for row in rejected], [2, 3, 4, 5, 6, 7])
+        self.assertEqual(rejected[0]["record"], '{"title": "Quebrado", "price":')
+        checkpoint = self.checkpoint(path)
+        self.assertEqual(checkpoint, {"records": 8, "imported": 2, "rejected": 6})
+
+    def test_resume_after_a_failed_batch(self):
+        path = self.write(
+            "catalogo.jsonl",
+            "".join(
+                json.dumps(
+                    {"title": f"Item {number}", "price": "10", "category": "camisetas"}
+                )
+                + "\n"
+                for number in range(1, 6)
+            ),
+        )
+        references = mock.patch(
+            "products.management.commands.import_catalog.count_image_references",
+            side_effect=[None, RuntimeError("conexão perdida")],
+        )
+        with references, self.assertRaises(RuntimeError):
+            self.run_import(path, "--batch-size", "2")
+        self.assertEqual(Product.objects.count(), 2)
+        checkpoint = self.checkpoint(path)
+        self.assertEqual(checkpoint["records"], 2)
+
+        self.run_import(path, "--batch-size", "2", "--resume")
+        self.assertEqual(
+            list(Product.objects.order_by("id").values_list("title", flat=True)),
+            [f"Item {number}" for number in range(1, 6)],
+        )
+
+    def test_slugs_are_reallocated_after_losing_a_race(self):
+        category = Category.objects.get(slug="camisetas")
+        allocator = SlugAllocator()
+        allocate = allocator.allocate
+
+        def allocate_then_lose_the_race(titles):
+            slugs = allocate(titles)
+            if not Product.objects.filter(slug="bola").exists():
+                # Outro processo grava o mesmo slug entre a consulta e o INSERT.
+                Product.objects.create(
+                    title="Bola",
+                    description="",
+                    price=Decimal("30.00"),
+                    category=category,
+                    seller=self.seller,
+                )
+            return slugs
+
+        products = [
+            Product(
+                title=title,
+                description="",
+                price=Decimal("30.00"),
+                category=category,
+                seller=self.seller,
+            )
+            for title in ("Bola", "Rede")
+        ]
+        with mock.patch.object(allocator, "allocate", allocate_then_lose_the_race):
+            allocator.bulk_create(products)
+        slugs = [product.slug for product in products]
+        self.assertNotEqual(slugs[0], "bola")
+        self.assertTrue(slugs[0].startswith("bola-"))
+        self.assertEqual(slugs[1], "rede")
+        self.assertEqual(Product.objects.filter(slug__in=slugs).count(), 2)
+
+    def test_new_categories_take_free_slugs_in_one_query(self):
+        Category.objects.create(name="Acessórios", slug="acessorios-2")
+        Category.objects.create(name="Acessórios", slug="acessorios")
+        resolver = CategoryResolver()
+        with self.assertNumQueries(1):
+            self.assertEqual(resolver.free_slug("Acessórios"), "acessorios-3")
+
+
+class BulkProductTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        cls.other = User.objects.create_user("outro", password="senha-de-teste")
+        cls.category = Category.objects.create(name="Papelaria")
+        cls.mine, cls.theirs = (
+            Product.objects.create(
+                title=title,
+                description="A4",
+                price=Decimal("15.00"),
+                stock_quantity=10,
+                category=cls.category,
+                seller=seller,
+            )
+            for title, seller in (("Caderno", cls.seller), ("Agenda", cls.other))
+        )
+
+    def setUp(self):
+        self.client.force_login(self.seller)
+        self.url = reverse("products:product-bulk")
+
+    def send(self, method, items):
+        return getattr(self.client, method)(
+            self.url, items, content_type="application/json"
+        )
+
+    def item(self, **fields):
+        return {
+            "title": "Lápis",
+            "description": "HB",
+            "price": "2.50",
+            "stock_quantity": 100,
+            "category": self.category.pk,
+            **fields,
+        }
+
+    def test_create_reports_errors_per_item(self):
+        response = self.send(
+            "post", [self.item(), self.item(price="0"), self.item(category=999)]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [
+                (error["index"], list(error["errors"]))
+                for error in response.json()["errors"]
+            ],
+            [(1, ["price"]), (2, ["category"])],
+        )
+        self.assertFalse(Product.objects.filter(title="Lápis").exists())
+
+    def test_create(self):
+        response = self.send("post", [self.item(), self.item(title="Borracha")])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 2)
+        self.assertEqual(
+            Product.objects.filter(seller=self.seller, title="Borracha").count(), 1
+        )
+
+    def test_update_checks_every_slug(self):
+        response = self.send(
+            "patch",
+            [
+                {"slug": self.mine.slug, "price": "12.00"},
+                {"slug": self.theirs.slug, "price": "1.00"},
+                {"slug": self.mine.slug, "price": "11.00"},
+                {"slug": "nao-existe"},
+                {"price": "1.00"},
+            ],
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [error["index"] for error in response.json()["errors"]], [1, 2, 3, 4]
+        )
+        self.mine.refresh_from_db()
+        self.assertEqual(self.mine.price, Decimal("15.00"))
+
+    def test_update_writes_only_sent_fields(self):
+        response = self.send("patch", [{"slug": self.mine.slug, "price": "12.00"}])
+        self.assertEqual(response.json(), {"updated": 1})
+        self.mine.refresh_from_db()
+        self.assertEqual(self.mine.price, Decimal("12.00"))
+        self.assertEqual(self.mine.title, "Caderno")
+
+    def test_deleted_product_is_not_recreated(self):
+        slug = self.mine.slug
+        Product.objects.filter(pk=self.mine.pk).delete()
+        response = self.send("patch", [{"slug": slug, "price": "12.00"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Product.objects.filter(slug=slug).exists())
+
+
+class StockReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create_user("comprador", password="senha-de-teste")
+        cls.other = User.objects.create_user("outro", password="senha-de-teste")
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        category = Category.objects.create(name="Eletrônicos")
+        cls.product, cls.spare = (
+            Product.objects.create(
+                title=title,
+                description="Bivolt",
+                price=Decimal("250.00"),
+                stock_quantity=5,
+                category=category,
+                seller=seller,
+            )
+            for title in ("Liquidificador", "Batedeira")
+        )
+
+    def setUp(self):
+        self.url = reverse("products:product-reserve", args=[self.product.slug])
+
+    def stock(self, product=None):
+        return Product.objects.get(pk=(product or self.product).pk).stock_quantity
+
+    def reserve(self, quantity, user=None):
+        self.client.force_login(user or self.buyer)
+        return self.client.post(
+            self.url, {"quantity": quantity}, content_type="application/json"
+        )
+
+    def test_requires_authentication(self):
+        response = self.client.post(self.url, {"quantity": 1})
+        self.assertIn(response.status_code, (401, 403))
+        self.assertEqual(self.stock(), 5)
+
+    def test_reserve_holds_stock_for_the_user(self):
+        before = Product.objects.get(pk=self.product.pk).updated_at
+        response = self.reserve(2)
+        self.assertEqual(response.status_code, 201)
+        reservation = StockReservation.objects.get(token=response.json()["token"])
+        self.assertEqual(reservation.user, self.buyer)
+        self.assertEqual(reservation.reference, "")
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.stock_quantity, 3)
+        self.assertGreater(product.updated_at, before)
+
+    def test_never_sells_beyond_stock(self):
+        self.assertEqual(self.reserve(4).status_code, 201)
+        self.assertEqual(self.reserve(2, user=self.other).status_code, 409)
+        self.assertEqual(self.stock(), 1)
+        with self.assertRaises(inventory.InsufficientStock) as raised:
+            inventory.reserve_many({self.product.pk: 2, self.spare.pk: 1})
+        self.assertEqual(raised.exception.product_ids, [self.product.pk])
+        # Tudo ou nada: o produto que tinha estoque também não foi baixado.
+        self.assertEqual(self.stock(self.spare), 5)
+
+    @override_settings(STOCK_RESERVATION_MAX_QUANTITY=3, STOCK_RESERVATION_MAX_HELD=4)
+    def test_quantity_is_capped_per_call_and_per_user(self):
+        self.assertEqual(self.reserve(4).status_code, 400)
+        self.assertEqual(self.reserve(3).status_code, 201)
+        self.assertEqual(self.reserve(2).status_code, 409)
+        self.assertEqual(self.reserve(1).status_code, 201)
+        self.assertEqual(self.reserve(1, user=self.other).status_code, 201)
+        self.assertEqual(self.stock(), 0)
+
+    def test_only_the_owner_releases(self):
+        token = self.reserve(2).json()["token"]
+        url = reverse("products:reservation-release", args=[token])
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.client.force_login(self.buyer)
+        response = self.client.post(url)
+        self.assertEqual(response.json()["status"], StockReservation.RELEASED)
+        self.assertEqual(self.stock(), 5)
+        self.assertEqual(self.client.post(url).status_code, 409)
+        self.assertEqual(self.stock(), 5)
+
+    def test_commit_is_not_exposed(self):
+        token = self.reserve(1).json()["token"]
+        url = reverse("products:reservation-detail", args=[token])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(f"{url}commit/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_sweep_returns_expired_holds(self):
+        inventory.reserve(self.product.pk, 2, ttl=datetime.timedelta(seconds=-1))
+        self.assertEqual(inventory.sweep_expired(), 1)
+        self.assertEqual(self.stock(), 5)
+
+    def test_settled_reservations_cannot_change_again(self):
+        reservation = inventory.reserve(self.product.pk, 2)
+        inventory.commit(reservation.token)
+        for settle in (inventory.commit, inventory.release):
+            with self.assertRaises(inventory.ReservationNotActive):
+                settle(reservation.token)
+        future = timezone.now() + datetime.timedelta(days=1)
+        self.assertEqual(inventory.sweep_expired(now=future), 0)
+        self.assertEqual(self.stock(), 3)
+
+    def test_sweep_works_in_batches(self):
+        expired = datetime.timedelta(seconds=-1)
+        for product in (self.product, self.product, self.spare):
+            inventory.reserve(product.pk, 1, ttl=expired)
+        kept = inventory.reserve(self.spare.pk, 1)
+        self.assertEqual(inventory.sweep_expired(batch_size=2), 3)
+        self.assertEqual((self.stock(), self.stock(self.spare)), (5, 4))
+        self.assertEqual(
+            StockReservation.objects.get(pk=kept.pk).status, StockReservation.HELD
+        )
+        self.assertEqual(
+            StockReservation.objects.filter(status=StockReservation.EXPIRED).count(),
+            3,
+        )
+
+    def test_settle_reference_handles_every_hold_of_an_order(self):
+        inventory.reserve_many(
+            {self.product.pk: 2, self.spare.pk: 1}, reference="pedido-7"
+        )
+        inventory.reserve(self.product.pk, 1, reference="pedido-8")
+        self.assertEqual(inventory.settle_reference("pedido-7", approved=False), 2)
+        self.assertEqual(inventory.settle_reference("pedido-7", approved=True), 0)
+        self.assertEqual((self.stock(), self.stock(self.spare)), (4, 5))
+        self.assertEqual(inventory.settle_reference("pedido-8", approved=True), 1)
+        self.assertEqual(self.stock(), 4)
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create_user("comprador", password="senha-de-teste")
+        cls.method = PaymentMethod.objects.create(name="Pix")
+        category = Category.objects.create(name="Cozinha")
+        cls.pan, cls.lid, cls.spoon, cls.cup = (
+            Product.objects.create(
+                title=title,
+                description="Inox",
+                price=Decimal("20.00"),
+                stock_quantity=10,
+                category=category,
+                seller=cls.buyer,
+            )
+            for title in ("Panela", "Tampa", "Colher", "Caneca")
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(
+            PRODUCT_RECOMMENDATIONS={
+                "TOP_K": 3,
+                "MIN_SHARED_ORDERS": 1,
+                "STATE_PATH": os.path.join(directory.name, "matriz.npz"),
+            }
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.first = self.order(self.pan, self.lid)
+        self.second = self.order(self.pan, self.lid, self.spoon)
+        self.third = self.order(self.pan, self.spoon)
+
+    def order(self, *products):
+        order = Order.objects.create(
+            usuario=self.buyer, forma_pagamento=self.method, id_endereco=1
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                pedido=order,
+                produto=product,
+                quantidade=1,
+                preco_unitario=product.price,
+            )
+            for product in products
+        )
+        return order
+
+    def related(self, product):
+        return list(
+            RelatedProduct.objects.filter(product=product)
+            .order_by("rank")
+            .values_list("related__title", "shared_orders")
+        )
+
+    def assert_matches_full_rebuild(self, matrix):
+        options = recommendation_options()
+        incremental = matrix.load().counts
+        build_recommendations(full=True)
+        rebuilt = CoPurchaseMatrix(options["STATE_PATH"]).load().counts
+        self.assertEqual((incremental != rebuilt).nnz, 0)
+
+    def test_full_build(self):
+        stats = build_recommendations(full=True)
+        self.assertEqual(stats, {"orders": 3, "products": 3, "links": 6})
+        # Tampa e Colher empatam com a Panela (2 pedidos, cosseno 2/√6).
+        self.assertEqual(self.related(self.pan), [("Tampa", 2), ("Colher", 2)])
+        self.assertEqual(self.related(self.lid), [("Panela", 2), ("Colher", 1)])
+
+    def test_incremental_runs_apply_changes_and_removals(self):
+        build_recommendations(full=True)
+        matrix = CoPurchaseMatrix(recommendation_options()["STATE_PATH"])
+
+        # Rodada sem mudanças: a releitura da janela ``LAG`` não conta nada.
+        self.assertEqual(build_recommendations()["orders"], 0)
+
+        self.order(self.lid, self.cup)
+        self.second.status = Order.CANCELADO
+        self.second.save()
+        OrderItem.objects.filter(pedido=self.third, produto=self.spoon).update(
+            deletado_em=timezone.now(), atualizado_em=timezone.now()
+        )
+        stats = build_recommendations()
+        self.assertEqual(stats["orders"], 3)
+        self.assertEqual(self.related(self.pan), [("Tampa", 1)])
+        self.assertEqual(self.related(self.lid), [("Caneca", 1), ("Panela", 1)])
+        self.assertEqual(self.related(self.spoon), [])
+        self.assert_matches_full_rebuild(matrix)
+
+    def test_orders_committed_late_are_counted(self):
+        late = self.order(self.spoon, self.cup)
+        read_baskets = recommendations.read_baskets
+
+        def uncommitted(*args, **kwargs):
+            # A transação do pedido ainda não terminou quando a rodada lê.
+            pairs = read_baskets(*args, **kwargs)
+            return pairs[pairs[:, 0] != late.pk]
+
+        with mock.patch.object(recommendations, "read_baskets", uncommitted):
+            build_recommendations(full=True)
+        self.assertEqual(self.related(self.cup), [])
+        matrix = CoPurchaseMatrix(recommendation_options()["STATE_PATH"])
+
+        # Gravado antes da rodada anterior, confirmado depois dela.
+        written_at = timezone.now() - datetime.timedelta(seconds=30)
+        Order.objects.filter(pk=late.pk).update(atualizado_em=written_at)
+        OrderItem.objects.filter(pedido=late).update(atualizado_em=written_at)
+        self.assertEqual(build_recommendations()["orders"], 1)
+        self.assertEqual(self.related(self.cup), [("Colher", 1)])
+        self.assert_matches_full_rebuild(matrix)
+
+    def test_periodic_full_rebuild(self):
+        build_recommendations(full=True)
+        # Exclusão física não passa por ``atualizado_em``.
+        self.first.delete()
+        with override_settings(
+            PRODUCT_RECOMMENDATIONS={
+                **recommendation_options(),
+                "FULL_REBUILD_INTERVAL": 0,
+            }
+        ):
+            build_recommendations()
+        self.assertEqual(self.related(self.lid), [("Panela", 1), ("Colher", 1)])
+
+
+@override_settings(PRODUCT_COUNTERS={"BACKGROUND_FLUSH": False})
+class ProductCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        cls.product = Product.objects.create(
+            title="Garrafa térmica",
+            description="1 litro",
+            price=Decimal("60.00"),
+            stock_quantity=8,
+            category=Category.objects.create(name="Camping"),
+            seller=seller,
+        )
+
+    def setUp(self):
+        cache.clear()
+        catalog_index.load()
+        # Sem gravação em segundo plano: o buffer é lido direto.
+        patcher = mock.patch.object(
+            product_counters, "_pending", product_counters._empty()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def views(self):
+        return dict(product_counters._pending["views"])
+
+    def test_only_existing_products_are_counted(self):
+        for name in ("products:product-detail", "products:async-product-detail"):
+            with self.subTest(name=name):
+                missing = reverse(name, args=["nao-existe"])
+                self.assertEqual(self.client.get(missing).status_code, 404)
+                url = reverse(name, args=[self.product.slug])
+                self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.views(), {self.product.slug: 2})
+
+    def test_flush_writes_counts_and_trending(self):
+        product_counters.incr(self.product.slug, "views", 3)
+        product_counters.incr(self.product.slug, "cart_adds")
+        product_counters.incr("nao-existe", "views")
+        self.assertEqual(product_counters.flush(), 1)
+        activity = ProductActivity.objects.get(product=self.product)
+        self.assertEqual((activity.views, activity.cart_adds), (3, 1))
+        self.assertAlmostEqual(activity.score, 8.0)
+        self.assertEqual(product_counters.trending(), [self.product.pk])
+        self.assertEqual(product_counters.flush(), 0)
+
+    @override_settings(PRODUCT_COUNTERS={"FLUSH_INTERVAL": 3600})
+    def test_idle_worker_flushes_on_a_timer(self):
+        with mock.patch("products.counters.threading.Timer") as timer:
+            product_counters.incr(self.product.slug, "views")
+            product_counters.incr(self.product.slug, "views")
+        timer.assert_called_once()
+        self.assertEqual(timer.call_args.args[1], product_counters.flush_in_background)
+        self.assertEqual(product_counters.flush(), 1)
+        timer.return_value.cancel.assert_called_once()
+        self.assertIsNone(product_counters._timer)
+
+
+class ImageStorageTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        override = override_settings(MEDIA_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.storage = ContentAddressedStorage()
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(folder, name), self.root)
+            for folder, _, names in os.walk(self.root)
+            for name in names
+        )
+
+    def legacy(self, name, content):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as handle:
+            handle.write(content)
+        return name
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save("products/images/foto.JPG", ContentFile(b"abc"))
+        second = self.storage.save("products/images/outra.jpg", ContentFile(b"abc"))
+        other = self.storage.save("products/images/foto.jpg", ContentFile(b"xyz"))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        digest = hashlib.sha256(b"abc").hexdigest()
+        self.assertEqual(
+            first, f"products/images/{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+        )
+        self.assertEqual(blob_digest(first), digest)
+        # Nenhum temporário fica para trás.
+        self.assertEqual(self.files(), sorted([first, other]))
+
+    def test_adopt_moves_or_drops_legacy_files(self):
+        self.legacy("products/images/a.png", b"mesmo")
+        self.legacy("products/images/b.png", b"mesmo")
+        blob, duplicate = self.storage.adopt("products/images/a.png")
+        self.assertFalse(duplicate)
+        self.assertEqual(blob_digest(blob), hashlib.sha256(b"mesmo").hexdigest())
+        self.assertEqual(self.storage.adopt("products/images/b.png"), (blob, True))
+        self.assertEqual(self.storage.adopt(blob), (blob, False))
+        self.assertEqual(self.files(), [blob])
+        with self.storage.open(blob, "rb") as handle:
+            self.assertEqual(handle.read(), b"mesmo")
+
+    def test_image_references_are_counted(self):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        product = Product.objects.create(
+            title="Caneca",
+            price=Decimal("12.00"),
+            stock_quantity=1,
+            category=Category.objects.create(name="Casa"),
+            seller=seller,
+        )
+        name = self.storage.save("products/images/caneca.jpg", ContentFile(b"c"))
+        first = ProductImage.objects.create(product=product, image=name)
+        second = ProductImage.objects.create(product=product, image=name)
+        blob = ImageBlob.objects.get(name=name)
+        self.assertEqual((blob.ref_count, blob.size), (2, 1))
+        first.delete()
+        second.image = self.storage.save(
+            "products/images/caneca.jpg", ContentFile(b"outra")
+        )
+        second.save()
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 0)
+        self.assertEqual(ImageBlob.objects.get(name=second.image.name).ref_count, 1)
+
+    def test_dedupe_images_converts_recounts_and_prunes(self):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        category = Category.objects.create(name="Casa")
+        products = [
+            Product.objects.create(
+                title=title,
+                price=Decimal("12.00"),
+                stock_quantity=1,
+                category=category,
+                seller=seller,
+            )
+            for title in ("Caneca", "Xícara")
+        ]
+        for product, name in zip(products, ("caneca.jpg", "xicara.jpg")):
+            ProductImage.objects.create(
+                product=product,
+                image=self.legacy(f"products/images/{name}", b"mesma foto"),
+            )
+        orphan = self.storage.save("products/images/velha.jpg", ContentFile(b"v"))
+        ImageBlob.objects.create(name=orphan, digest=blob_digest(orphan), size=1)
+        ImageBlob.objects.filter(name=orphan).update(
+            created_at=timezone.now() - datetime.timedelta(hours=2)
+        )
+
+        output = StringIO()
+        call_command("dedupe_images", "--dry-run", stdout=output)
+        self.assertIn("2 arquivos a converter", output.getvalue())
+        self.assertIn("1 arquivos sem uso a apagar", output.getvalue())
+        self.assertEqual(len(self.files()), 3)
+
+        output = StringIO()
+        call_command("dedupe_images", stdout=output)
+        self.assertIn(
+            "2 arquivos convertidos, 1 duplicados removidos", output.getvalue()
+        )
+        names = set(ProductImage.objects.values_list("image", flat=True))
+        self.assertEqual(len(names), 1)
+        (blob,) = names
+        self.assertEqual(self.files(), [blob])
+        self.assertEqual(
+            list(ImageBlob.objects.values_list("name", "ref_count")), [(blob, 2)]
+        )
+
+
+class RenditionTests(TestCase):
+    options = {
+        "SIZES": {"thumb": 40, "card": 400},
+        "WEBP_QUALITY": 80,
+        "FALLBACK_QUALITY": 85,
+        "WORKERS": 1,
+        "ASYNC": False,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("vendedor", password="senha-de-teste")
+        category = Category.objects.create(name="Casa")
+        cls.mug, cls.cup = (
+            Product.objects.create(
+                title=title,
+                price=Decimal("12.00"),
+                stock_quantity=1,
+                category=category,
+                seller=seller,
+            )
+            for title in ("Caneca", "Xícara")
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(
+            MEDIA_ROOT=directory.name, PRODUCT_IMAGE_RENDITIONS=self.options
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.storage = renditions.image_storage()
+
+    def upload(self, mode, size, fmt):
+        buffer = BytesIO()
+        Image.new(mode, size, "red" if mode == "RGB" else (255, 0, 0, 128)).save(
+            buffer, fmt
+        )
+        return self.storage.save(
+            f"products/images/foto.{fmt.lower()}", ContentFile(buffer.getvalue())
+        )
+
+    def describe(self, name):
+        with self.storage.open(name, "rb") as handle, Image.open(handle) as image:
+            return image.format, image.mode, image.size
+
+    def test_opaque_images_fall_back_to_jpeg(self):
+        result = renditions.render(self.upload("RGB", (100, 50), "PNG"))
+        self.assertEqual(
+            {label: (item["width"], item["height"]) for label, item in result.items()},
+            {"thumb": (40, 20), "card": (100, 50)},
+        )
+        self.assertEqual(
+            self.describe(result["thumb"]["webp"]), ("WEBP", "RGB", (40, 20))
+        )
+        self.assertEqual(
+            self.describe(result["thumb"]["fallback"]), ("JPEG", "RGB", (40, 20))
+        )
+
+    def test_transparent_images_fall_back_to_png(self):
+        result = renditions.render(self.upload("RGBA", (100, 50), "PNG"))
+        self.assertTrue(result["card"]["fallback"].endswith(".png"))
+        self.assertEqual(
+            self.describe(result["card"]["fallback"]), ("PNG", "RGBA", (100, 50))
+        )
+
+    def test_never_upscales(self):
+        result = renditions.render(self.upload("RGB", (30, 30), "JPEG"))
+        self.assertEqual(
+            {label: (item["width"], item["height"]) for label, item in result.items()},
+            {"thumb": (30, 30), "card": (30, 30)},
+        )
+        # Sem redução, as duas versões têm o mesmo conteúdo e o mesmo blob.
+        self.assertEqual(result["thumb"], result["card"])
+
+    def test_images_of_the_same_file_share_renditions(self):
+        name = self.upload("RGB", (100, 50), "PNG")
+        # Sem o on_commit, nada foi gerado ainda.
+        first = ProductImage.objects.create(product=self.mug, image=name)
+        second = ProductImage.objects.create(product=self.cup, image=name)
+        with mock.patch.object(renditions, "render", wraps=renditions.render) as render:
+            renditions.build_for_image(first.pk)
+            renditions.build_for_image(second.pk)
+        render.assert_called_once_with(name)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(set(first.renditions), {"thumb", "card"})
+        self.assertEqual(second.renditions, first.renditions)
+
+    def test_new_file_drops_stale_renditions(self):
+        image = ProductImage.objects.create(
+            product=self.mug, image=self.upload("RGB", (100, 50), "PNG")
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = self.upload("RGB", (60, 60), "JPEG")
+            image.save()
+        image.refresh_from_db()
+        self.assertEqual(image.renditions["card"]["width"], 60)
+
+
+class BuildStorefrontTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.source = os.path.join(directory.name, "site")
+        self.output = os.path.join(directory.name, "dist")
+        self.write(
+            "index.html",
+            '<html>\r\n<link href="css/app.css" rel="stylesheet">\r\n'
+            '<img class="logo" src="img/logo.png">\r\n'
+            '<a href="https://example.com/x.css">x</a>\r\n</html>\r\n',
+        )
+        self.write(
+            "css/app.css",
+            "".join(f".c{index} {{ color: red; }}\n" for index in range(200))
+            + ".logo { background: url('../img/logo.png'); }\n",
+        )
+        gradient = Image.linear_gradient("L").resize((128, 128)).convert("RGB")
+        buffer = BytesIO()
+        gradient.save(buffer, "PNG")
+        self.write("img/logo.png", buffer.getvalue())
+
+    def write(self, name, content):
+        path = os.path.join(self.source, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        with open(path, "wb") as handle:
+            handle.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.output, name), "rb") as handle:
+            return handle.read()
+
+    def build(self):
+        call_command(
+            "build_storefront",
+            source=self.source,
+            output=self.output,
+            workers=2,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        return json.loads(self.read("manifest.json"))["files"]
+
+    def test_assets_are_fingerprinted_and_references_rewritten(self):
+        files = self.build()
+        self.assertEqual(set(files), {"index.html", "css/app.css", "img/logo.png"})
+        css, logo = files["css/app.css"], files["img/logo.png"]
+        self.assertRegex(css["path"], r"^css/app\.[0-9a-f]{12}\.css$")
+        self.assertEqual(css["cache_control"], "public, max-age=31536000, immutable")
+        self.assertEqual(files["index.html"]["cache_control"], "no-cache")
+
+        stylesheet = self.read(css["path"]).decode()
+        self.assertIn(f"url('../{logo['path']}')", stylesheet)
+        page = self.read("index.html").decode()
+        self.assertIn(f'href="{css["path"]}"', page)
+        self.assertIn(f'src="{logo["path"]}"', page)
+        self.assertIn('<source type="image/webp"', page)
+        self.assertIn('href="https://example.com/x.css"', page)
+        # As quebras de linha do original ficam como estavam.
+        self.assertEqual(page.count("\r\n"), page.count("\n"))
+
+    def test_precompressed_and_converted_variants(self):
+        files = self.build()
+        css = files["css/app.css"]
+        packed = self.read(css["encodings"]["gzip"]["path"])
+        self.assertEqual(gzip.decompress(packed), self.read(css["path"]))
+        webp = files["img/logo.png"]["variants"]["webp"]
+        self.assertLess(webp["size"], files["img/logo.png"]["size"])
+        with Image.open(BytesIO(self.read(webp["path"]))) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (128, 128)))
+
+    def test_same_input_builds_the_same_names(self):
+        first = self.build()
+        self.assertEqual(self.build(), first)
+
+    def test_refuses_to_replace_a_foreign_directory(self):
+        os.makedirs(self.output)
+        with self.assertRaisesMessage(CommandError, "não é uma saída"):
+            self.build()
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Category, Product
+
+
+class CategoryTree:
+    """Snapshot em memória da árvore de categorias.
+
+    Carrega todas as categorias e as contagens de produtos ativos em duas
+    consultas e responde ``tree``, ``full_path`` e contagens acumuladas sem
+    voltar ao banco.
+    """
+
+    def __init__(self, categories, counts):
+        self.by_id = {category.pk: category for category in categories}
+        self.by_slug = {category.slug: category for category in categories}
+        self.children = defaultdict(list)
+        self.roots = []
+        self.counts = counts
+        self.subtree_counts = dict(counts)
+
+        for category in categories:
+            parent = self.by_id.get(category.parent_id)
+            if parent is not None:
+                category.parent = parent
+            if not category.is_active:
+                continue
+            if category.parent_id is None:
+                self.roots.append(category)
+            else:
+                self.children[category.parent_id].append(category)
+
+        for category in sorted(categories, key=lambda c: c.depth, reverse=True):
+            if category.parent_id in self.by_id:
+                self.subtree_counts[category.parent_id] = self.subtree_counts.get(
+                    category.parent_id, 0
+                ) + self.subtree_counts.get(category.pk, 0)
+
+    @classmethod
+    def load(cls):
+        categories = list(Category.objects.all())
+        counts = dict(
+            Product.objects.filter(is_active=True)
+            .values("category_id")
+            .annotate(total=Count("id"))
+            .order_by()
+            .values_list("category_id", "total")
+        )
+        return cls(categories, counts)
+
+    def get_children(self, category):
+        if category.pk not in self.by_id:
+            return category.get_children()
+        return self.children.get(category.pk, [])
+
+    def full_path(self, category):
+        path_ids = category.get_path_ids()
+        if not path_ids or path_ids[-1] != category.pk:
+            return None
+        ancestor_ids = path_ids[:-1]
+        if (ancestor_ids[-1] if ancestor_ids else None) != category.parent_id:
+            return None
+        names = []
+        for pk in ancestor_ids:
+            ancestor = self.by_id.get(pk)
+            if ancestor is None:
+                return None
+            names.append(ancestor.name)
+        names.append(category.name)
+        return " > ".join(names)
+
+    def products_count(self, category):
+        if category.pk not in self.by_id:
+            return category.products.filter(is_active=True).count()
+        return self.counts.get(category.pk, 0)
+
+    def subtree_products_count(self, category):
+        if category.pk not in self.by_id:
+            return Product.objects.filter(
+                is_active=True, category__path__startswith=category.path
+            ).count()
+        return self.subtree_counts.get(category.pk, 0)
+
+    def get_path_for_slug(self, slug):
+        category = self.by_slug.get(slug)
+        if category is None:
+            return (
+                Category.objects.filter(slug=slug)
+                .values_list("path", flat=True)
+                .first()
+            )
+        return category.path
+
+
+_lock = threading.Lock()
+_snapshot = None
+_loaded_at = 0.0
+
+
+def category_tree():
+    global _snapshot, _loaded_at
+
+    ttl = getattr(settings, "CATEGORY_TREE_TTL", 60)
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _loaded_at < ttl:
+        return snapshot
+    with _lock:
+        if _snapshot is None or time.monotonic() - _loaded_at >= ttl:
+            _snapshot = CategoryTree.load()
+            _loaded_at = time.monotonic()
+        return _snapshot
+
+
+async def acategory_tree():
+    """``category_tree`` para views assíncronas; a carga vai para uma thread."""
+    ttl = getattr(settings, "CATEGORY_TREE_TTL", 60)
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _loaded_at < ttl:
+        return snapshot
+    return await sync_to_async(category_tree)()
+
+
+def invalidate_category_tree():
+    global _snapshot
+
+    _snapshot = None
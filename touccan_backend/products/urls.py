@@ -1,14 +1,32 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductViewSet, ProductImageViewSet, api_root
+from .async_views import (
+    category_tree_view,
+    product_detail,
+    product_list,
+    product_search,
+)
+from .views import (
+    CategoryViewSet,
+    ProductViewSet,
+    ProductImageViewSet,
+    StockReservationViewSet,
+    api_root,
+)
 
 router = DefaultRouter()
 router.register(r"categories", CategoryViewSet, basename="category")
 router.register(r"products", ProductViewSet, basename="product")
 router.register(r"product-images", ProductImageViewSet, basename="productimage")
+router.register(r"reservations", StockReservationViewSet, basename="reservation")
 
 urlpatterns = [
     path("", api_root),
+    # Leituras assíncronas (ASGI) com as mesmas respostas das rotas do router.
+    path("v1/async/products/", product_list, name="async-product-list"),
+    path("v1/async/products/search/", product_search, name="async-product-search"),
+    path("v1/async/products/<str:slug>/", product_detail, name="async-product-detail"),
+    path("v1/async/categories/tree/", category_tree_view, name="async-category-tree"),
     path("v1/", include(router.urls)),
 ]
 
@@ -1,10 +1,20 @@
-from rest_framework import viewsets, filters, status
+from functools import partial
+
+from rest_framework import mixins, viewsets, filters, status
 from rest_framework.decorators import action, api_view
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
-from .models import Category, Product, ProductImage
+from django.db import transaction
+from django.db.models import Case, Q, When
+from django.utils import timezone
+from touccan_backend.compiled import CompiledListMixin
+from touccan_backend.conditional import ConditionalGetMixin
+from touccan_backend.db_routing import ReplicaReadMixin
+from touccan_backend.planner import QueryPlanMixin
+from touccan_backend.response_cache import ResponseCacheMixin
+from .models import Category, Product, ProductImage, StockReservation
 from .serializers import (
     CategorySerializer,
     CategoryListSerializer,
@@ -12,7 +22,41 @@ from .serializers import (
     ProductListSerializer,
     ProductCreateUpdateSerializer,
     ProductImageSerializer,
+    BulkProductSerializer,
+    StockReservationSerializer,
+    StockReservationCreateSerializer,
+    compiled_product_list,
 )
+from . import inventory
+from .counters import product_counters
+from .facets import catalog_index, sql_facets
+from .search import search_index
+from .signals import sync_bulk_products
+from .slugs import SlugAllocator
+from .suggest import suggest_index
+from .tree import category_tree
+
+
+def product_tags(data):
+    rows = data["results"] if isinstance(data, dict) else data
+    return [f"product:{row['id']}" for row in rows]
+
+
+def filter_products(queryset, params, category_path=None):
+    """Filtros de preço, estoque e categoria (``category_slug`` já resolvido)."""
+    price_min = params.get("price_min")
+    price_max = params.get("price_max")
+    if price_min:
+        queryset = queryset.filter(price__gte=price_min)
+    if price_max:
+        queryset = queryset.filter(price__lte=price_max)
+    if params.get("in_stock") == "true":
+        queryset = queryset.filter(stock_quantity__gt=0)
+    if params.get("category_slug"):
+        if category_path is None:
+            return queryset.none()
+        queryset = queryset.filter(category__path__startswith=category_path)
+    return queryset
 
 
 @api_view(["GET"])
@@ -32,7 +76,14 @@ def api_root(request, format=None):
     )
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(
+    ReplicaReadMixin,
+    ResponseCacheMixin,
+    ConditionalGetMixin,
+    QueryPlanMixin,
+    CompiledListMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     lookup_field = "slug"
@@ -55,46 +106,78 @@ class CategoryViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         if self.request.query_params.get("root_only") == "true":
             queryset = queryset.filter(parent__isnull=True)
-        return queryset.select_related("parent").prefetch_related("subcategories")
+        return self.plan_queryset(queryset)
+
+    def get_conditional_tags(self):
+        if self.action == "products":
+            return ["categories", "category:*", "products", "product:*"]
+        # As contagens de produtos só mudam com a coleção ``products``.
+        return ["categories", "category:*", "products"]
+
+    def get_cache_collections(self):
+        return ["categories", "products"]
+
+    def get_cache_tags(self, data):
+        if self.action == "products":
+            return product_tags(data)
+        return []
 
     @action(detail=True, methods=["get"])
     def products(self, request, slug=None):
+        return self.cached_response(request, partial(self.products_response, request))
+
+    def products_response(self, request):
         category = self.get_object()
-        products = (
-            Product.objects.filter(category=category, is_active=True)
-            .select_related("category", "seller")
-            .prefetch_related("images")
-        )
+        products = Product.objects.filter(category=category, is_active=True)
 
         price_min = request.query_params.get("price_min")
         price_max = request.query_params.get("price_max")
+        # O índice só recorta os candidatos; os filtros valem sempre no SQL.
         if price_min:
             products = products.filter(price__gte=price_min)
         if price_max:
             products = products.filter(price__lte=price_max)
+        indexed_ids = catalog_index.lookup(
+            {
+                "category": str(category.pk),
+                "price_min": price_min,
+                "price_max": price_max,
+            }
+        )
+        if indexed_ids is not None:
+            products = products.filter(pk__in=indexed_ids)
 
-        page = self.paginate_queryset(products)
-        if page is not None:
-            serializer = ProductListSerializer(
-                page, many=True, context={"request": request}
-            )
-            return self.get_paginated_response(serializer.data)
-        serializer = ProductListSerializer(
-            products, many=True, context={"request": request}
+        return self.conditional_response(
+            request, partial(self.compiled_response, products, compiled_product_list)
         )
-        return Response(serializer.data)
 
     @action(detail=False, methods=["get"])
     def tree(self, request):
-        root_categories = self.get_queryset().filter(parent__isnull=True)
+        return self.cached_response(
+            request,
+            partial(
+                self.conditional_response, request, partial(self.tree_response, request)
+            ),
+        )
+
+    def tree_response(self, request):
+        root_categories = category_tree().roots
         serializer = CategorySerializer(
             root_categories, many=True, context={"request": request}
         )
         return Response(serializer.data)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(
+    ReplicaReadMixin,
+    ResponseCacheMixin,
+    ConditionalGetMixin,
+    QueryPlanMixin,
+    CompiledListMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Product.objects.filter(is_active=True)
+    compiled_serializer = compiled_product_list
     filter_backends = [
         DjangoFilterBackend,
         filters.SearchFilter,
@@ -105,9 +188,27 @@ class ProductViewSet(viewsets.ModelViewSet):
     ordering_fields = ["title", "price", "created_at", "stock_quantity"]
     ordering = ["-created_at"]
     lookup_field = "slug"
+    bulk_max_items = 20000
+
+    def get_conditional_tags(self):
+        return ["categories", "category:*", "products", "product:*"]
+
+    def get_cache_collections(self):
+        if self.action == "retrieve":
+            return []
+        if self.action == "related":
+            return ["related"]
+        return ["categories", "products"]
+
+    def get_cache_tags(self, data):
+        if self.action == "retrieve":
+            return [f"product:{data['id']}", f"category:{data['category']}"]
+        if self.action == "related":
+            return [f"product:{self.related_to}", *product_tags(data)]
+        return product_tags(data)
 
     def get_serializer_class(self):
-        if self.action == "list":
+        if self.action in ["list", "search", "featured", "trending"]:
             return ProductListSerializer
         elif self.action in ["create", "update", "partial_update"]:
             return ProductCreateUpdateSerializer
@@ -115,21 +216,24 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        price_min = self.request.query_params.get("price_min")
-        price_max = self.request.query_params.get("price_max")
-        in_stock = self.request.query_params.get("in_stock")
         category_slug = self.request.query_params.get("category_slug")
+        category_path = (
+            category_tree().get_path_for_slug(category_slug) if category_slug else None
+        )
+        queryset = filter_products(queryset, self.request.query_params, category_path)
+        if self.action == "list":
+            # O índice só recorta os candidatos; os filtros valem sempre no SQL.
+            indexed_ids = catalog_index.lookup(self.request.query_params)
+            if indexed_ids is not None:
+                queryset = queryset.filter(pk__in=indexed_ids)
+        return self.plan_queryset(queryset)
 
-        if price_min:
-            queryset = queryset.filter(price__gte=price_min)
-        if price_max:
-            queryset = queryset.filter(price__lte=price_max)
-        if in_stock == "true":
-            queryset = queryset.filter(stock_quantity__gt=0)
-        if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
-
-        return queryset.select_related("category", "seller").prefetch_related("images")
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        # Só slugs que existem entram no buffer (um 304 também é uma visita).
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            product_counters.incr(kwargs["slug"], "views")
+        return response
 
     @action(detail=False, methods=["get"])
     def search(self, request):
@@ -140,40 +244,83 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        products = self.get_queryset().filter(
-            Q(title__icontains=query) | Q(description__icontains=query)
-        )
-        products = self.filter_queryset(products)
-
-        page = self.paginate_queryset(products)
-        if page is not None:
-            serializer = ProductListSerializer(
-                page, many=True, context={"request": request}
+        ranked_ids = search_index.search(query)
+        if ranked_ids is None:
+            # Índice ainda não montado nesta máquina: a busca antiga.
+            products = self.filter_queryset(
+                self.get_queryset().filter(
+                    Q(title__icontains=query) | Q(description__icontains=query)
+                )
+            )
+            return self.compiled_response(products, compiled_product_list)
+        products = self.filter_queryset(self.get_queryset().filter(pk__in=ranked_ids))
+        if not request.query_params.get(filters.OrderingFilter.ordering_param):
+            products = products.order_by(
+                Case(*[When(pk=pk, then=rank) for rank, pk in enumerate(ranked_ids)])
             )
-            return self.get_paginated_response(serializer.data)
-        serializer = ProductListSerializer(
-            products, many=True, context={"request": request}
-        )
-        return Response(serializer.data)
+
+        return self.compiled_response(products, compiled_product_list)
+
+    @action(detail=False, methods=["get"])
+    def suggest(self, request):
+        query = request.query_params.get("q", "")
+        try:
+            limit = min(int(request.query_params.get("limit", 8)), 20)
+        except ValueError:
+            limit = 8
+        return Response(suggest_index.suggest(query, max(limit, 1)))
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        params = {name: value for name, value in request.query_params.items() if value}
+        if catalog_index.supports(params) and catalog_index.is_warm():
+            result = catalog_index.filter(params)
+            if result is not None:
+                count, facets = catalog_index.facets(result)
+                return Response({"count": count, "facets": facets})
+        queryset = self.filter_queryset(self.get_queryset())
+        count, facets = sql_facets(queryset, catalog_index.bounds)
+        return Response({"count": count, "facets": facets})
 
     @action(detail=False, methods=["get"])
     def featured(self, request):
         products = self.get_queryset().filter(featured=True)
-        page = self.paginate_queryset(products)
-        if page is not None:
-            serializer = ProductListSerializer(
-                page, many=True, context={"request": request}
+        return self.cached_response(
+            request, partial(self.compiled_response, products, compiled_product_list)
+        )
+
+    @action(detail=False, methods=["get"])
+    def trending(self, request):
+        ranked_ids = product_counters.trending()
+        products = self.filter_queryset(self.get_queryset().filter(pk__in=ranked_ids))
+        if ranked_ids and not request.query_params.get(
+            filters.OrderingFilter.ordering_param
+        ):
+            products = products.order_by(
+                Case(*[When(pk=pk, then=rank) for rank, pk in enumerate(ranked_ids)])
             )
-            return self.get_paginated_response(serializer.data)
-        serializer = ProductListSerializer(
-            products, many=True, context={"request": request}
+        return self.compiled_response(products, compiled_product_list)
+
+    @action(detail=True, methods=["get"])
+    def related(self, request, slug=None):
+        return self.cached_response(request, partial(self.related_response, request))
+
+    def related_response(self, request):
+        """Vizinhos gravados por ``build_recommendations``; nada é calculado aqui."""
+        product = self.get_object()
+        self.related_to = product.pk
+        related = Product.objects.filter(
+            is_active=True, recommended_in__product=product
+        ).order_by("recommended_in__rank")
+        rows = compiled_product_list.values(related)
+        return Response(
+            compiled_product_list.serialize(rows, self.get_serializer_context())
         )
-        return Response(serializer.data)
 
     @action(detail=True, methods=["post"])
     def add_image(self, request, slug=None):
         product = self.get_object()
-        if product.seller != request.user:
+        if product.seller_id != request.user.id:
             return Response(
                 {"detail": "Você não tem permissão para editar este produto."},
                 status=status.HTTP_403_FORBIDDEN,
@@ -187,8 +334,179 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
+    def reserve(self, request, slug=None):
+        product = self.get_object()
+        serializer = StockReservationCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            reservation = inventory.reserve(
+                product.pk, user=request.user, **serializer.validated_data
+            )
+        except (inventory.InsufficientStock, inventory.ReservationLimit) as error:
+            return Response({"detail": str(error)}, status=status.HTTP_409_CONFLICT)
+        return Response(
+            StockReservationSerializer(reservation).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(
+        detail=False,
+        methods=["post", "put", "patch"],
+        url_path="bulk",
+        permission_classes=[IsAuthenticated],
+    )
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"detail": "Envie uma lista de produtos."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {"detail": f"Máximo de {self.bulk_max_items} produtos por requisição."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if request.method == "POST":
+            return self.bulk_create_products(request, items)
+        return self.bulk_update_products(
+            request, items, partial=request.method == "PATCH"
+        )
+
+    def validate_bulk(self, items, partial):
+        """Valida todos os itens em uma passada; categorias em uma consulta."""
+        category_ids = set()
+        for item in items:
+            if isinstance(item, dict):
+                try:
+                    category_ids.add(int(item.get("category")))
+                except (TypeError, ValueError):
+                    pass
+        context = self.get_serializer_context()
+        context["categories"] = Category.objects.in_bulk(category_ids)
+
+        serializer = BulkProductSerializer(
+            data=items, many=True, partial=partial, context=context
+        )
+        if serializer.is_valid():
+            return serializer.validated_data, []
+        errors = serializer.errors
+        # Conforme a versão do DRF, os erros vêm em lista ou indexados.
+        if not isinstance(errors, dict):
+            errors = dict(enumerate(errors))
+        return [], [
+            {"index": int(index) if str(index).isdigit() else None, "errors": error}
+            for index, error in errors.items()
+            if error
+        ]
+
+    def bulk_create_products(self, request, items):
+        validated, errors = self.validate_bulk(items, partial=False)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = [Product(seller=request.user, **data) for data in validated]
+        with transaction.atomic():
+            SlugAllocator().bulk_create(products)
+            if products[0].pk is None:
+                ids = dict(
+                    Product.objects.filter(
+                        slug__in=[product.slug for product in products]
+                    ).values_list("slug", "pk")
+                )
+                for product in products:
+                    product.pk = ids[product.slug]
+            sync_bulk_products(products)
+
+        return Response(
+            {
+                "created": len(products),
+                "results": [
+                    {"id": product.pk, "slug": product.slug} for product in products
+                ],
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+    def bulk_update_products(self, request, items, partial):
+        slugs = [item.get("slug") if isinstance(item, dict) else None for item in items]
+        slugs = [slug if isinstance(slug, str) else None for slug in slugs]
+
+        with transaction.atomic():
+            # Travadas até o fim da gravação: a posse é conferida nas linhas
+            # que serão escritas, e um produto excluído no meio não volta.
+            existing = (
+                Product.objects.select_for_update()
+                .order_by("pk")
+                .in_bulk([slug for slug in slugs if slug], field_name="slug")
+            )
+            instances, errors, seen = [], [], set()
+            for index, slug in enumerate(slugs):
+                product = existing.get(slug)
+                if not slug:
+                    error = {"slug": ["Este campo é obrigatório."]}
+                elif slug in seen:
+                    error = {"slug": ["Produto repetido na requisição."]}
+                elif product is None:
+                    error = {"slug": ["Produto não encontrado."]}
+                elif product.seller_id != request.user.id:
+                    error = {
+                        "slug": ["Você não tem permissão para editar este produto."]
+                    }
+                else:
+                    error = None
+                if error:
+                    errors.append({"index": index, "errors": error})
+                seen.add(slug)
+                instances.append(product)
+            if errors:
+                return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            validated, errors = self.validate_bulk(items, partial)
+            if errors:
+                return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            fields = {"updated_at"}
+            now = timezone.now()
+            for product, data in zip(instances, validated):
+                for name, value in data.items():
+                    setattr(product, name, value)
+                product.updated_at = now
+                fields.update(data)
+            Product.objects.bulk_update(instances, sorted(fields), batch_size=500)
+            sync_bulk_products(instances)
+
+        return Response({"updated": len(instances)})
+
+
+class StockReservationViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Reservas do próprio usuário: consultar e liberar.
+
+    Não há ``commit`` aqui: a reserva é confirmada pelo resultado do
+    pagamento do pedido (``inventory.settle_reference``).
+    """
+
+    queryset = StockReservation.objects.select_related("product")
+    serializer_class = StockReservationSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = "token"
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+    @action(detail=True, methods=["post"])
+    def release(self, request, token=None):
+        reservation = self.get_object()
+        try:
+            inventory.release(reservation.token)
+        except inventory.ReservationNotActive as error:
+            return Response({"detail": str(error)}, status=status.HTTP_409_CONFLICT)
+        reservation.refresh_from_db()
+        return Response(self.get_serializer(reservation).data)
+
 
-class ProductImageViewSet(viewsets.ModelViewSet):
+class ProductImageViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     queryset = ProductImage.objects.all()
     serializer_class = ProductImageSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -197,4 +515,4 @@ class ProductImageViewSet(viewsets.ModelViewSet):
     ordering = ["order", "id"]
 
     def get_queryset(self):
-        return super().get_queryset().select_related("product")
+        return self.plan_queryset(super().get_queryset())
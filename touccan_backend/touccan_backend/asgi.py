@@ -2,6 +2,9 @@
 ASGI config for touccan_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, e.g. ``uvicorn touccan_backend.asgi:application``;
+the async read endpoints (``products.async_views``, ``transactions.async_views``)
+then run on the event loop instead of a worker thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -14,3 +17,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "touccan_backend.settings")
 
 application = get_asgi_application()
+
+# Build the URL resolvers, DRF settings and serializer fields now rather than
+# on the first request (STARTUP["WARM_UP"]; see touccan_backend.startup).
+from touccan_backend.startup import warm_up  # noqa: E402
+
+warm_up()
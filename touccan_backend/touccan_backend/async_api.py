@@ -0,0 +1,100 @@
+"""
+Apoio às views assíncronas (ASGI) das leituras mais acessadas.
+
+As views ``async def`` não passam pelo DRF (que é síncrono): leem do banco
+com o ORM assíncrono e devolvem o mesmo JSON das views síncronas, renderizado
+pelo ``JSONRenderer`` do DRF. Tudo o que os serializers leem precisa estar
+carregado antes (``aprepare``, ``prefetch_related``, o snapshot da árvore de
+categorias): uma consulta preguiçosa no loop é um erro, não um desvio.
+
+``cached_json`` dá às views o cache de respostas e o GET condicional das
+versões síncronas, com a chave, as tags e o validador do viewset
+correspondente.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .conditional import etag_for
+from .response_cache import response_cache
+
+renderer = JSONRenderer()
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        renderer.render(data), status=status, content_type=renderer.media_type
+    )
+
+
+def not_found(model=None):
+    """404 do DRF; com ``model``, a mensagem do ``get_object_or_404``."""
+    if model is None:
+        detail = str(NotFound.default_detail)
+    else:
+        detail = _("No %s matches the given query.") % model._meta.object_name
+    return json_response({"detail": detail}, status=404)
+
+
+def not_authenticated():
+    # 403, como o DRF responde com autenticação por sessão.
+    return json_response({"detail": str(NotAuthenticated.default_detail)}, status=403)
+
+
+def api_request(request):
+    """``Request`` do DRF só para ``query_params`` e URLs absolutas."""
+    return Request(request)
+
+
+def viewset_for(viewset_class, request, action, **kwargs):
+    """Viewset pronto para filtrar, planejar e dar as tags de ``action``."""
+    return viewset_class(
+        request=request, action=action, format_kwarg=None, args=(), kwargs=kwargs
+    )
+
+
+async def cached_json(request, view, respond):
+    """``ResponseCacheMixin`` + ``ConditionalGetMixin`` para as views assíncronas.
+
+    ``respond`` devolve os dados da resposta (ou um ``HttpResponse`` de
+    erro, que não é guardado). As idas ao cache, síncronas, vão juntas para
+    uma thread antes e depois dele; a consulta e a serialização ficam no
+    loop.
+    """
+
+    def lookup():
+        pending = None
+        if request.method == "GET":
+            key = view.get_cache_key(request)
+            response = response_cache.cached(request, key)
+            if response is not None:
+                return response, None
+            pending = (
+                key,
+                response_cache.generation(),
+                response_cache.versions(view.get_cache_collections()),
+            )
+        etag = etag_for(request, view.get_conditional_tags())
+        not_modified = get_conditional_response(request, etag=etag)
+        return not_modified, (pending, etag)
+
+    response, state = await sync_to_async(lookup)()
+    if response is not None:
+        return response
+    pending, etag = state
+    data = await respond()
+    if isinstance(data, HttpResponse):
+        return data
+    response = json_response(data)
+    response["ETag"] = etag
+    if pending is not None:
+        await sync_to_async(response_cache.store)(
+            *pending, view.get_cache_tags(data), response
+        )
+        response["X-Cache"] = "MISS"
+    return response
@@ -0,0 +1,140 @@
+"""
+Serializers compilados (somente leitura) para endpoints de listagem.
+
+Um ``CompiledSerializer`` lê os campos declarados em um serializer DRF uma
+única vez, traduz cada ``source`` para uma chave de ``QuerySet.values()`` e
+guarda o ``to_representation`` do campo já vinculado. Cada linha vira então
+um ``dict`` simples, sem instanciar modelos nem passar pelo
+``get_attribute`` do DRF, com saída idêntica à do serializer original.
+"""
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils.encoding import force_str
+from rest_framework import serializers
+from rest_framework.relations import RelatedField
+from rest_framework.response import Response
+
+
+class CompiledSerializer:
+    """Versão compilada de ``serializer_class`` que trabalha sobre ``values()``.
+
+    Campos ``SerializerMethodField`` (ou qualquer campo que não mapeie para uma
+    coluna) precisam de um método ``compile_<campo>(self)`` na subclasse, que
+    devolve ``(chaves_de_values, função(linha, contexto))``. ``prepare`` pode
+    ser sobrescrito para carregar dados auxiliares de todas as linhas de uma
+    vez (e ``aprepare``, se isso envolver o banco, para as views assíncronas).
+    """
+
+    serializer_class = None
+
+    def __init__(self):
+        serializer = self.serializer_class(context={})
+        model = serializer.Meta.model
+        self.value_keys = []
+        self.readers = []
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            compile_field = getattr(self, f"compile_{name}", None)
+            if compile_field is not None:
+                keys, reader = compile_field()
+            else:
+                keys, reader = self._compile_field(model, field)
+            for key in keys:
+                if key not in self.value_keys:
+                    self.value_keys.append(key)
+            self.readers.append((name, reader))
+
+    def _compile_field(self, model, field):
+        if isinstance(field, serializers.SerializerMethodField) or field.source == "*":
+            raise ImproperlyConfigured(
+                f"{type(self).__name__} precisa de compile_{field.field_name}()."
+            )
+
+        bits = field.source_attrs
+        if (
+            len(bits) == 1
+            and bits[0].startswith("get_")
+            and bits[0].endswith("_display")
+        ):
+            return self._compile_display(model, field, bits[0][4:-8])
+
+        key = "__".join(bits)
+        try:
+            model._meta.get_field(bits[0])
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(
+                f"{type(self).__name__} precisa de compile_{field.field_name}()."
+            )
+
+        if isinstance(field, RelatedField):
+            # values() já entrega a chave primária do relacionamento.
+            return [key], lambda row, context: row[key]
+
+        to_representation = field.to_representation
+
+        def read(row, context):
+            value = row[key]
+            if value is None:
+                return None
+            return to_representation(value)
+
+        return [key], read
+
+    def _compile_display(self, model, field, field_name):
+        choices = dict(model._meta.get_field(field_name).flatchoices)
+        to_representation = field.to_representation
+
+        def read(row, context):
+            value = row[field_name]
+            label = force_str(choices.get(value, value), strings_only=True)
+            if label is None:
+                return None
+            return to_representation(label)
+
+        return [field_name], read
+
+    def values(self, queryset):
+        return queryset.prefetch_related(None).values(*self.value_keys)
+
+    def prepare(self, rows, context):
+        return context
+
+    async def aprepare(self, rows, context):
+        """``prepare`` para views assíncronas; sobrescreva se ele consultar o banco."""
+        return self.prepare(rows, context)
+
+    def serialize(self, rows, context=None):
+        rows = list(rows)
+        context = self.prepare(rows, dict(context or {}))
+        return self.represent(rows, context)
+
+    async def aserialize(self, rows, context=None):
+        rows = list(rows)
+        context = await self.aprepare(rows, dict(context or {}))
+        return self.represent(rows, context)
+
+    def represent(self, rows, context):
+        readers = self.readers
+        return [{name: read(row, context) for name, read in readers} for row in rows]
+
+
+class CompiledListMixin:
+    """Serve ``list`` (e ações de listagem) com um ``CompiledSerializer``."""
+
+    compiled_serializer = None
+
+    def compiled_response(self, queryset, compiled=None):
+        compiled = compiled or self.compiled_serializer
+        rows = compiled.values(queryset)
+        context = self.get_serializer_context()
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(compiled.serialize(page, context))
+        return Response(compiled.serialize(rows, context))
+
+    def list(self, request, *args, **kwargs):
+        if self.compiled_serializer is None:
+            return super().list(request, *args, **kwargs)
+        return self.compiled_response(self.filter_queryset(self.get_queryset()))
@@ -0,0 +1,68 @@
+"""
+GET condicional (``ETag`` / 304) para viewsets.
+
+O validador de uma resposta sai das versões das tags do cache de respostas
+(``touccan_backend.response_cache``) das quais a representação depende: as
+coleções (``products``, ``categories``) e as famílias (``product:*``,
+``category:*``), que avançam a cada invalidação de qualquer tag da família.
+Ler essas versões é um ``get_many`` no cache, sem consulta ao banco. Se o
+cliente enviar um ``If-None-Match`` que ainda vale, a resposta é um 304 sem
+carregar nem serializar nenhuma linha.
+"""
+
+import hashlib
+from functools import partial
+
+from django.utils.cache import get_conditional_response
+
+from .response_cache import response_cache
+
+
+def etag_for(request, tags):
+    """Validador fraco a partir das versões atuais de ``tags``."""
+    versions = response_cache.versions(tags)
+    accepted = getattr(request, "accepted_media_type", "")
+    digest = hashlib.md5(
+        repr((accepted, sorted(versions.items()))).encode("utf-8"),
+        usedforsecurity=False,
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+class ConditionalGetMixin:
+    """Responde ``list``/``retrieve`` com ``ETag`` e 304 quando possível.
+
+    ``get_conditional_tags`` lista as tags cujas versões compõem o validador;
+    toda escrita que muda a representação precisa invalidar uma delas (os
+    signals de ``products`` invalidam ``product:<id>``, ``category:<id>`` e as
+    coleções).
+    """
+
+    def get_conditional_tags(self):
+        return []
+
+    def conditional_response(self, request, respond):
+        if request.method not in ("GET", "HEAD"):
+            return respond()
+        # Lidas antes de montar a resposta: uma escrita concorrente só pode
+        # deixar o validador mais velho que o conteúdo, nunca o contrário.
+        etag = etag_for(request, self.get_conditional_tags())
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = respond()
+        if response.status_code == 200:
+            response["ETag"] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(super().retrieve, request, *args, **kwargs)
+        )
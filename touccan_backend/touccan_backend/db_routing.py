@@ -0,0 +1,307 @@
+"""
+Leituras em réplicas com "leia o que você escreveu".
+
+Só as views que usam ``ReplicaReadMixin`` leem das réplicas, e só em
+métodos seguros (``GET``/``HEAD``/``OPTIONS``); todo o resto, inclusive
+comandos e threads de fundo, continua no ``default`` (o primário). Cada
+requisição escolhe uma réplica e fica nela, para não ver dados em momentos
+diferentes de réplicas com atrasos diferentes.
+
+Depois de uma requisição com método não seguro, o cliente fica preso ao
+primário por ``STICKY_SECONDS``: um cookie guarda o prazo e, para usuários
+autenticados, uma chave no cache vale em qualquer navegador ou cliente da
+API. Dentro dessa requisição, a primeira escrita já leva as leituras
+seguintes para o primário. Escritas feitas durante métodos seguros (cache
+no banco, sessão, contadores) não prendem o cliente nem mudam as leituras.
+
+O middleware conta as consultas de cada alias e soma os totais no processo;
+a cada ``STATS_FLUSH_INTERVAL`` segundos eles vão para o cache compartilhado
+(``database_routing_stats``). Com ``HEADERS`` (por padrão, só com ``DEBUG``)
+a contagem da requisição vai também em ``X-DB-Queries``.
+"""
+
+import contextvars
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from rest_framework.permissions import SAFE_METHODS
+
+_routing = contextvars.ContextVar("db_routing", default=None)
+
+
+def routing_options():
+    options = {
+        "REPLICAS": [],
+        "STICKY_SECONDS": 5,
+        "COOKIE": "db_primary_until",
+        "CACHE_ALIAS": "default",
+        "KEY_PREFIX": "db-routing",
+        "HEADERS": settings.DEBUG,
+        "STATS_FLUSH_INTERVAL": 10,
+    }
+    options.update(getattr(settings, "DATABASE_ROUTING", {}))
+    return options
+
+
+def replica_aliases():
+    return [
+        alias for alias in routing_options()["REPLICAS"] if alias in settings.DATABASES
+    ]
+
+
+class RoutingState:
+    def __init__(self, pinned=False, safe=True):
+        self.pinned = pinned
+        self.safe = safe
+        self.replica = None
+        self.wrote = False
+        self.queries = Counter()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.wrote or state.pinned:
+            return DEFAULT_DB_ALIAS
+        return state.replica or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None and not state.safe:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas têm os mesmos dados do primário.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # O esquema chega às réplicas pela replicação.
+        return db not in replica_aliases()
+
+
+def pin_key(user_pk):
+    return f"{routing_options()['KEY_PREFIX']}:primary:{user_pk}"
+
+
+def replica_candidates(state):
+    if state is None or state.pinned or state.wrote:
+        return []
+    return replica_aliases()
+
+
+def use_replicas(request):
+    """Libera leituras em réplica no resto da requisição, se o cliente puder."""
+    state = _routing.get()
+    replicas = replica_candidates(state)
+    if not replicas:
+        return
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        cache = caches[routing_options()["CACHE_ALIAS"]]
+        if cache.get(pin_key(user.pk)):
+            state.pinned = True
+            return
+    state.replica = random.choice(replicas)
+
+
+async def ause_replicas(request):
+    """``use_replicas`` para views assíncronas."""
+    state = _routing.get()
+    replicas = replica_candidates(state)
+    if not replicas:
+        return
+    user = await request.auser()
+    if user.is_authenticated:
+        cache = caches[routing_options()["CACHE_ALIAS"]]
+        if await cache.aget(pin_key(user.pk)):
+            state.pinned = True
+            return
+    state.replica = random.choice(replicas)
+
+
+def reading_from_replica():
+    state = _routing.get()
+    return bool(state and state.replica and not state.wrote)
+
+
+def replica_cache_timeout(timeout):
+    """Teto para guardar no cache algo lido de uma réplica.
+
+    Uma réplica atrasada pode devolver dados de antes de uma invalidação;
+    a entrada não deve durar mais que a janela em que o atraso é tolerado.
+    """
+    if not reading_from_replica():
+        return timeout
+    return min(timeout, routing_options()["STICKY_SECONDS"])
+
+
+class ReplicaReadMixin:
+    """Viewsets cujas leituras (métodos seguros) podem ir para uma réplica."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            use_replicas(request)
+
+
+def count_query(execute, sql, params, many, context):
+    state = _routing.get()
+    if state is not None:
+        state.queries[context["connection"].alias] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    """Conta as consultas da conexão na requisição corrente (se houver).
+
+    Fica instalado na conexão de cada thread; a requisição é achada pela
+    ``ContextVar``, que acompanha o código assíncrono até a thread do ORM.
+    """
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+connection_created.connect(install_query_counter)
+
+
+class DatabaseRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def pinned_by_cookie(self, request, options):
+        try:
+            until = float(request.COOKIES.get(options["COOKIE"], 0))
+        except ValueError:
+            return False
+        now = time.time()
+        return now < until <= now + options["STICKY_SECONDS"]
+
+    def begin(self, request, stack):
+        options = routing_options()
+        state = RoutingState(
+            pinned=self.pinned_by_cookie(request, options),
+            safe=request.method in SAFE_METHODS,
+        )
+        stack.callback(_routing.reset, _routing.set(state))
+        for alias in settings.DATABASES:
+            install_query_counter(connections[alias])
+        return state, options
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with ExitStack() as stack:
+            state, options = self.begin(request, stack)
+            response = self.get_response(request)
+        return self.finish(request, response, state, options)
+
+    async def __acall__(self, request):
+        with ExitStack() as stack:
+            state, options = self.begin(request, stack)
+            response = await self.get_response(request)
+        # ``request.user`` e o cache podem consultar o banco: fora do loop.
+        return await sync_to_async(self.finish)(request, response, state, options)
+
+    def finish(self, request, response, state, options):
+        if not state.safe:
+            self.pin(request, response, options)
+        if state.queries:
+            if options["HEADERS"]:
+                response["X-DB-Queries"] = ", ".join(
+                    f"{alias}={total}" for alias, total in sorted(state.queries.items())
+                )
+            query_counts.add(state.queries, options["STATS_FLUSH_INTERVAL"])
+        return response
+
+    def pin(self, request, response, options):
+        window = options["STICKY_SECONDS"]
+        if not window:
+            return
+        # Truncado, não arredondado: o prazo não pode passar da janela, ou o
+        # cookie seria recusado como forjado logo na requisição seguinte.
+        until = int((time.time() + window) * 1000) / 1000
+        response.set_cookie(
+            options["COOKIE"],
+            f"{until:.3f}",
+            max_age=window,
+            httponly=True,
+            samesite="Lax",
+        )
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            caches[options["CACHE_ALIAS"]].set(pin_key(user.pk), 1, timeout=window)
+
+
+def stats_key(alias):
+    return f"{routing_options()['KEY_PREFIX']}:stats:{alias}"
+
+
+class QueryCounts:
+    """Consultas por alias acumuladas no processo até a próxima gravação.
+
+    Gravar no cache a cada requisição custaria escritas por requisição; aqui
+    elas vão em lote, no máximo uma vez por intervalo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._flushed_at = time.monotonic()
+
+    def add(self, queries, interval):
+        with self._lock:
+            self._pending.update(queries)
+            if time.monotonic() - self._flushed_at < interval:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.monotonic()
+        if pending:
+            record_queries(pending)
+
+
+def record_queries(queries):
+    cache = caches[routing_options()["CACHE_ALIAS"]]
+    for alias, total in queries.items():
+        key = stats_key(alias)
+        if not cache.add(key, total, timeout=None):
+            try:
+                cache.incr(key, total)
+            except ValueError:
+                cache.set(key, total, timeout=None)
+
+
+query_counts = QueryCounts()
+
+
+def query_stats():
+    """Consultas por alias acumuladas no cache (todos os processos).
+
+    O que cada processo somou desde a última gravação ainda não aparece.
+    """
+    cache = caches[routing_options()["CACHE_ALIAS"]]
+    keys = {stats_key(alias): alias for alias in settings.DATABASES}
+    found = cache.get_many(list(keys))
+    return {alias: found.get(key, 0) for key, alias in keys.items()}
+
+
+def reset_query_stats():
+    cache = caches[routing_options()["CACHE_ALIAS"]]
+    cache.delete_many([stats_key(alias) for alias in settings.DATABASES])
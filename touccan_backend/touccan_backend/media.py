@@ -0,0 +1,190 @@
+"""
+Entrega de arquivos de mídia (``MEDIA_ROOT``) fora do modo ``DEBUG``.
+
+A view responde ``GET``/``HEAD`` com ``ETag`` forte e ``Last-Modified``
+tirados do ``stat`` do arquivo, então revalidações viram 304 sem abrir o
+arquivo. Pedidos com ``Range`` (um intervalo; ``If-Range`` respeitado)
+recebem 206 só com os bytes pedidos. O corpo é um ``FileResponse`` sobre o
+descritor do arquivo: servidores WSGI com ``wsgi.file_wrapper`` (gunicorn,
+uWSGI) o enviam com ``sendfile`` direto do kernel, sem passar por Python.
+Atrás de um nginx/Apache configurado, ``ACCEL`` entrega só os cabeçalhos e
+deixa o envio para o servidor (``X-Accel-Redirect`` ou ``X-Sendfile``).
+"""
+
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def media_options():
+    options = {
+        "ACCEL": None,
+        "ACCEL_PREFIX": "/protected-media/",
+        "CACHE_CONTROL": "public, max-age=3600",
+        # Blobs do armazenamento por conteúdo nunca mudam sob o mesmo nome.
+        "IMMUTABLE_RE": r"(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:\.\w+)?$",
+        "IMMUTABLE_CACHE_CONTROL": "public, max-age=31536000, immutable",
+    }
+    options.update(getattr(settings, "MEDIA_SERVING", {}))
+    return options
+
+
+def file_etag(stats):
+    return f'"{stats.st_mtime_ns:x}-{stats.st_size:x}"'
+
+
+def parse_range(header, size):
+    """``(início, fim)`` inclusivos do intervalo pedido.
+
+    ``None`` quando o cabeçalho deve ser ignorado (sintaxe desconhecida ou
+    vários intervalos: a resposta é o arquivo inteiro); ``ValueError`` quando
+    o intervalo não cabe no arquivo (416).
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if not length or not size:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError(header)
+    return start, end
+
+
+def range_applies(request, etag, modified):
+    """``If-Range``: só atende o intervalo se a cópia do cliente ainda vale."""
+    validator = request.headers.get("If-Range")
+    if not validator:
+        return True
+    if validator.startswith(('"', "W/")):
+        return validator == etag
+    return parse_http_date_safe(validator) == modified
+
+
+class FileRange:
+    """Janela de ``length`` bytes de um arquivo já posicionado no início.
+
+    Sem ``seek``/``tell``, o ``FileResponse`` não recalcula o tamanho a partir
+    do fim do arquivo; ``fileno`` mantém o caminho do ``sendfile``, que envia
+    exatamente o ``Content-Length`` a partir da posição atual.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+@require_safe
+def serve(request, path):
+    options = media_options()
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        stats = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404("Arquivo não encontrado.")
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404("Arquivo não encontrado.")
+
+    etag = file_etag(stats)
+    modified = int(stats.st_mtime)
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(modified),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": (
+            options["IMMUTABLE_CACHE_CONTROL"]
+            if re.search(options["IMMUTABLE_RE"], path)
+            else options["CACHE_CONTROL"]
+        ),
+    }
+    not_modified = get_conditional_response(request, etag=etag, last_modified=modified)
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified.setdefault(name, value)
+        return not_modified
+
+    content_type = content_type or "application/octet-stream"
+    if options["ACCEL"]:
+        # O servidor web entrega o arquivo e trata ``Range`` sozinho.
+        response = HttpResponse(content_type=content_type)
+        if options["ACCEL"] == "x-sendfile":
+            response["X-Sendfile"] = fullpath
+        else:
+            response["X-Accel-Redirect"] = options["ACCEL_PREFIX"] + quote(
+                path.lstrip("/")
+            )
+        del response["Content-Length"]
+        headers.pop("Accept-Ranges")
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    size = stats.st_size
+    span = None
+    if "Range" in request.headers and range_applies(request, etag, modified):
+        try:
+            span = parse_range(request.headers["Range"], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            response["Accept-Ranges"] = "bytes"
+            return response
+
+    file = open(fullpath, "rb")
+    if span is None:
+        response = FileResponse(file, content_type=content_type)
+        response["Content-Length"] = size
+    else:
+        start, end = span
+        file.seek(start)
+        response = FileResponse(FileRange(file, end - start + 1), status=206)
+        response["Content-Type"] = content_type
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if encoding:
+        response["Content-Encoding"] = encoding
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def media_urlpatterns():
+    """Rota da mídia sob ``MEDIA_URL``; vazia se a mídia estiver em outro host."""
+    prefix = settings.MEDIA_URL
+    if not prefix or "//" in prefix:
+        return []
+    return [
+        re_path(rf"^{re.escape(prefix.lstrip('/'))}(?P<path>.+)$", serve, name="media")
+    ]
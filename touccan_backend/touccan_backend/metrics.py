@@ -0,0 +1,439 @@
+"""
+Métricas HTTP por rota, no formato de exposição do Prometheus.
+
+``RouteMetricsMiddleware`` mede cada requisição pela rota resolvida (o
+``view_name``, como ``products:product-list`` ou ``transaction-stats``; o que
+não casa com nenhuma rota vira ``<unmatched>``): contagem por status,
+histograma de latência, histograma do tamanho da resposta e requisições em
+andamento. Métodos fora do padrão HTTP são contados como ``OTHER``, para que
+um cliente não possa criar séries novas à vontade.
+
+Cada processo acumula em memória e grava um retrato em
+``DIRECTORY/<pid>.json`` a cada ``FLUSH_INTERVAL`` segundos (troca atômica
+do arquivo); um timer cobre o worker que fica ocioso, e nada é gravado na
+saída do processo. O endpoint soma os retratos de todos os workers:
+contadores e histogramas de processos que já morreram continuam valendo
+(são juntados em ``archive.json``), as requisições em andamento deles não.
+Limpe o diretório ao subir o serviço, antes dos workers.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, get_resolver
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem compactação dos arquivos de processos mortos.
+    fcntl = None
+
+UNMATCHED = "<unmatched>"
+OTHER_METHOD = "OTHER"
+METHODS = frozenset(
+    ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE", "CONNECT"]
+)
+ARCHIVE = "archive.json"
+
+METRICS = {
+    "requests": (
+        "touccan_http_requests_total",
+        "counter",
+        "Requisições HTTP por rota, método e status.",
+    ),
+    "latency": (
+        "touccan_http_request_duration_seconds",
+        "histogram",
+        "Tempo de resposta por rota e método, em segundos.",
+    ),
+    "sizes": (
+        "touccan_http_response_size_bytes",
+        "histogram",
+        "Tamanho do corpo da resposta por rota e método, em bytes.",
+    ),
+    "in_flight": (
+        "touccan_http_requests_in_flight",
+        "gauge",
+        "Requisições em andamento por rota e método.",
+    ),
+}
+
+
+def metrics_options():
+    options = {
+        "ENABLED": True,
+        "DIRECTORY": Path(tempfile.gettempdir()) / "touccan-metrics",
+        "FLUSH_INTERVAL": 1.0,
+        "LATENCY_BUCKETS": [
+            0.005,
+            0.01,
+            0.025,
+            0.05,
+            0.1,
+            0.25,
+            0.5,
+            1.0,
+            2.5,
+            5.0,
+            10.0,
+        ],
+        "SIZE_BUCKETS": [256, 1024, 4096, 16384, 65536, 262144, 1048576],
+        "TOKEN": None,
+    }
+    options.update(getattr(settings, "ROUTE_METRICS", {}))
+    return options
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Histogram:
+    """Contagens por faixa (não cumulativas), soma e total."""
+
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size):
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, bounds, value):
+        for index, bound in enumerate(bounds):
+            if value <= bound:
+                self.buckets[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def merge(self, buckets, total, count):
+        if len(buckets) != len(self.buckets):
+            # Faixas mudaram entre deploys: só a soma e o total continuam.
+            buckets = [0] * len(self.buckets)
+        self.buckets = [a + b for a, b in zip(self.buckets, buckets)]
+        self.sum += total
+        self.count += count
+
+
+class RouteMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pid = os.getpid()
+        self.clear()
+
+    def clear(self):
+        self.requests = {}
+        self.latency = {}
+        self.sizes = {}
+        self.in_flight = {}
+        self._flushed_at = 0.0
+        self._timer = None
+
+    def fork_check(self):
+        # Um worker criado por fork (gunicorn --preload) começa do zero.
+        if self.pid != os.getpid():
+            with self._lock:
+                self.pid = os.getpid()
+                self.clear()
+
+    def start(self, route, method):
+        self.fork_check()
+        key = (route, method)
+        with self._lock:
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+
+    def finish(self, route, method, status, duration, size, options):
+        key = (route, method)
+        with self._lock:
+            self.in_flight[key] -= 1
+            counter = (route, method, str(status))
+            self.requests[counter] = self.requests.get(counter, 0) + 1
+            latency = self.latency.get(key)
+            if latency is None:
+                latency = self.latency[key] = Histogram(len(options["LATENCY_BUCKETS"]))
+            latency.observe(options["LATENCY_BUCKETS"], duration)
+            if size is not None:
+                sizes = self.sizes.get(key)
+                if sizes is None:
+                    sizes = self.sizes[key] = Histogram(len(options["SIZE_BUCKETS"]))
+                sizes.observe(options["SIZE_BUCKETS"], size)
+            wait = options["FLUSH_INTERVAL"] - (time.monotonic() - self._flushed_at)
+            if wait > 0 and self._timer is None:
+                # Um worker que fica ocioso ainda grava o que acumulou.
+                self._timer = threading.Timer(wait, self.flush, [options])
+                self._timer.daemon = True
+                self._timer.start()
+        if wait <= 0:
+            self.flush(options)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": self.pid,
+                "requests": [[*key, total] for key, total in self.requests.items()],
+                "latency": [
+                    [*key, h.buckets, h.sum, h.count] for key, h in self.latency.items()
+                ],
+                "sizes": [
+                    [*key, h.buckets, h.sum, h.count] for key, h in self.sizes.items()
+                ],
+                "in_flight": [[*key, total] for key, total in self.in_flight.items()],
+            }
+
+    def flush(self, options=None):
+        options = options or metrics_options()
+        if self.pid != os.getpid():
+            return
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        directory = Path(options["DIRECTORY"])
+        directory.mkdir(parents=True, exist_ok=True)
+        write_json(directory / f"{self.pid}.json", self.snapshot())
+
+
+def write_json(path, data):
+    handle, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(handle, "w") as output:
+        json.dump(data, output)
+    os.replace(temporary, path)
+
+
+def read_json(path):
+    try:
+        with open(path) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return None
+
+
+route_metrics = RouteMetrics()
+
+
+class Aggregate:
+    """Soma de retratos de vários processos."""
+
+    def __init__(self, options):
+        self.options = options
+        self.requests = {}
+        self.latency = {}
+        self.sizes = {}
+        self.in_flight = {}
+
+    def add(self, snapshot, live=True):
+        for *key, total in snapshot.get("requests", []):
+            key = tuple(key)
+            self.requests[key] = self.requests.get(key, 0) + total
+        for name, buckets in (
+            ("latency", self.options["LATENCY_BUCKETS"]),
+            ("sizes", self.options["SIZE_BUCKETS"]),
+        ):
+            histograms = getattr(self, name)
+            for route, method, counts, total, count in snapshot.get(name, []):
+                histogram = histograms.get((route, method))
+                if histogram is None:
+                    histogram = histograms[(route, method)] = Histogram(len(buckets))
+                histogram.merge(counts, total, count)
+        if live:
+            for route, method, total in snapshot.get("in_flight", []):
+                key = (route, method)
+                self.in_flight[key] = self.in_flight.get(key, 0) + total
+
+    def snapshot(self):
+        return {
+            "requests": [[*key, total] for key, total in self.requests.items()],
+            "latency": [
+                [*key, h.buckets, h.sum, h.count] for key, h in self.latency.items()
+            ],
+            "sizes": [
+                [*key, h.buckets, h.sum, h.count] for key, h in self.sizes.items()
+            ],
+        }
+
+
+def compact(directory, options):
+    """Junta os retratos de processos mortos em ``archive.json``."""
+    if fcntl is None:
+        return
+    with open(directory / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = [
+            path
+            for path in directory.glob("*.json")
+            if path.stem.isdigit() and not pid_alive(int(path.stem))
+        ]
+        if not dead:
+            return
+        archive = Aggregate(options)
+        previous = read_json(directory / ARCHIVE)
+        if previous:
+            archive.add(previous, live=False)
+        for path in dead:
+            snapshot = read_json(path)
+            if snapshot:
+                archive.add(snapshot, live=False)
+        write_json(directory / ARCHIVE, archive.snapshot())
+        for path in dead:
+            path.unlink(missing_ok=True)
+
+
+def collect(options=None):
+    """Métricas somadas de todos os processos que gravaram no diretório."""
+    options = options or metrics_options()
+    directory = Path(options["DIRECTORY"])
+    route_metrics.flush(options)
+    compact(directory, options)
+    aggregate = Aggregate(options)
+    for path in directory.glob("*.json"):
+        snapshot = read_json(path)
+        if not snapshot:
+            continue
+        pid = snapshot.get("pid")
+        aggregate.add(snapshot, live=pid is not None and pid_alive(pid))
+    return aggregate
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def labels(route, method, **extra):
+    pairs = {"route": route, "method": method, **extra}
+    return ",".join(f'{name}="{escape(str(value))}"' for name, value in pairs.items())
+
+
+def number(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else f"{value:.1f}"
+    return str(value)
+
+
+def render(aggregate):
+    """Formato de exposição em texto do Prometheus (versão 0.0.4)."""
+    lines = []
+
+    def header(kind):
+        name, metric_type, help_text = METRICS[kind]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        return name
+
+    name = header("requests")
+    for (route, method, status), total in sorted(aggregate.requests.items()):
+        lines.append(f"{name}{{{labels(route, method, status=status)}}} {total}")
+
+    for kind, bounds in (
+        ("latency", aggregate.options["LATENCY_BUCKETS"]),
+        ("sizes", aggregate.options["SIZE_BUCKETS"]),
+    ):
+        name = header(kind)
+        for (route, method), histogram in sorted(getattr(aggregate, kind).items()):
+            cumulative = 0
+            for bound, count in zip(bounds, histogram.buckets):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{{{labels(route, method, le=number(bound))}}} "
+                    f"{cumulative}"
+                )
+            lines.append(
+                f'{name}_bucket{{{labels(route, method, le="+Inf")}}} '
+                f"{histogram.count}"
+            )
+            lines.append(
+                f"{name}_sum{{{labels(route, method)}}} {number(histogram.sum)}"
+            )
+            lines.append(f"{name}_count{{{labels(route, method)}}} {histogram.count}")
+
+    name = header("in_flight")
+    for (route, method), total in sorted(aggregate.in_flight.items()):
+        lines.append(f"{name}{{{labels(route, method)}}} {total}")
+    return "\n".join(lines) + "\n"
+
+
+def route_name(request):
+    try:
+        match = get_resolver(getattr(request, "urlconf", None)).resolve(
+            request.path_info
+        )
+    except Resolver404:
+        return UNMATCHED
+    return match.view_name
+
+
+def method_label(request):
+    return request.method if request.method in METHODS else OTHER_METHOD
+
+
+def response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    length = response.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+class RouteMetricsMiddleware:
+    """Fica no topo de ``MIDDLEWARE`` para medir a requisição inteira."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        options = metrics_options()
+        if not options["ENABLED"]:
+            return self.get_response(request)
+        route, method, start = self.begin(request)
+        status, size = 500, None
+        try:
+            response = self.get_response(request)
+            status, size = response.status_code, response_size(response)
+            return response
+        finally:
+            self.end(route, method, start, status, size, options)
+
+    async def __acall__(self, request):
+        options = metrics_options()
+        if not options["ENABLED"]:
+            return await self.get_response(request)
+        route, method, start = self.begin(request)
+        status, size = 500, None
+        try:
+            response = await self.get_response(request)
+            status, size = response.status_code, response_size(response)
+            return response
+        finally:
+            self.end(route, method, start, status, size, options)
+
+    def begin(self, request):
+        route, method = route_name(request), method_label(request)
+        route_metrics.start(route, method)
+        return route, method, time.perf_counter()
+
+    def end(self, route, method, start, status, size, options):
+        route_metrics.finish(
+            route,
+            method,
+            status,
+            time.perf_counter() - start,
+            size,
+            options,
+        )
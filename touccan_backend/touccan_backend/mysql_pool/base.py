@@ -0,0 +1,15 @@
+"""
+Backend MySQL com pool de conexões.
+
+Use ``"ENGINE": "touccan_backend.mysql_pool"`` com ``CONN_MAX_AGE = 0`` e
+as opções do pool em ``OPTIONS["pool"]`` (ver ``pool.py``); o restante é o
+backend ``django.db.backends.mysql``.
+"""
+
+from django.db.backends.mysql import base
+
+from .pool import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,301 @@
+"""
+Pool de conexões por processo, compartilhado entre as threads.
+
+O Django abre uma conexão por thread e, com ``CONN_MAX_AGE = 0``, a fecha no
+fim de cada requisição. ``PooledConnectionMixin`` troca esse abrir/fechar por
+pegar/devolver uma conexão de um ``ConnectionPool``: o handshake e a
+autenticação acontecem só quando o pool cresce ou recicla uma conexão.
+
+Opções (``OPTIONS["pool"]`` do banco):
+
+- ``min_size``: conexões abertas na criação do pool e mantidas ociosas;
+- ``max_size``: limite de conexões abertas (ociosas + em uso);
+- ``timeout``: segundos esperando uma conexão livre antes de ``PoolTimeout``;
+- ``max_lifetime``: idade máxima de uma conexão antes de ser reciclada;
+- ``max_idle``: tempo ocioso depois do qual conexões acima de ``min_size``
+  são fechadas;
+- ``pre_ping``: testa a conexão antes de entregá-la, se ela estiver ociosa há
+  mais de ``ping_interval`` segundos.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+DEFAULTS = {
+    "min_size": 1,
+    "max_size": 10,
+    "timeout": 10.0,
+    "max_lifetime": 1800.0,
+    "max_idle": 600.0,
+    "pre_ping": True,
+    "ping_interval": 1.0,
+}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class PooledConnection:
+    __slots__ = ("raw", "created_at", "released_at")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = self.released_at = time.monotonic()
+
+
+class ConnectionPool:
+    counters = (
+        "checkouts",
+        "created",
+        "closed",
+        "recycled",
+        "ping_failures",
+        "waits",
+        "timeouts",
+    )
+
+    def __init__(self, connect, ping, options=None):
+        self.connect = connect
+        self.ping = ping
+        self.options = {**DEFAULTS, **(options or {})}
+        self.pid = os.getpid()
+        self.idle = deque()
+        self.in_use = {}
+        self.size = 0
+        self.condition = threading.Condition()
+        self.stats_counters = dict.fromkeys(self.counters, 0)
+        self.wait_time = 0.0
+        for _ in range(self.options["min_size"]):
+            self.idle.append(self.open())
+
+    def open(self):
+        with self.condition:
+            self.size += 1
+        try:
+            connection = PooledConnection(self.connect())
+        except BaseException:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.stats_counters["created"] += 1
+        return connection
+
+    def discard(self, connection, counter="closed"):
+        try:
+            connection.raw.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.size -= 1
+            self.stats_counters[counter] += 1
+            self.condition.notify()
+
+    def expired(self, connection, now):
+        return now - connection.created_at >= self.options["max_lifetime"]
+
+    def healthy(self, connection, now):
+        if not self.options["pre_ping"]:
+            return True
+        if now - connection.released_at < self.options["ping_interval"]:
+            return True
+        try:
+            self.ping(connection.raw)
+        except Exception:
+            return False
+        return True
+
+    def acquire(self):
+        """Devolve ``(conexão, reaproveitada)``; abre uma nova se couber."""
+        deadline = time.monotonic() + self.options["timeout"]
+        waited = None
+        while True:
+            with self.condition:
+                if self.idle:
+                    # A mais recente; as mais antigas ficam no início para ``trim``.
+                    connection = self.idle.pop()
+                elif self.size < self.options["max_size"]:
+                    connection = None
+                else:
+                    if waited is None:
+                        waited = time.monotonic()
+                        self.stats_counters["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self.condition.wait(remaining):
+                        self.stats_counters["timeouts"] += 1
+                        self.wait_time += time.monotonic() - waited
+                        raise PoolTimeout(
+                            f"Nenhuma conexão livre em {self.options['timeout']}s "
+                            f"(max_size={self.options['max_size']})."
+                        )
+                    continue
+            if connection is None:
+                connection, reused = self.open(), False
+            else:
+                now = time.monotonic()
+                if self.expired(connection, now):
+                    self.discard(connection, "recycled")
+                    continue
+                if not self.healthy(connection, now):
+                    self.discard(connection, "ping_failures")
+                    continue
+                reused = True
+            with self.condition:
+                self.in_use[id(connection.raw)] = connection
+                self.stats_counters["checkouts"] += 1
+                if waited is not None:
+                    self.wait_time += time.monotonic() - waited
+            return connection.raw, reused
+
+    def release(self, raw, discard=False):
+        with self.condition:
+            connection = self.in_use.pop(id(raw), None)
+        if connection is None:
+            # Conexão de antes de um fork ou de outro pool: só fecha.
+            try:
+                raw.close()
+            except Exception:
+                pass
+            return
+        now = time.monotonic()
+        if discard:
+            self.discard(connection)
+            return
+        if self.expired(connection, now):
+            self.discard(connection, "recycled")
+            return
+        connection.released_at = now
+        with self.condition:
+            self.idle.append(connection)
+            self.condition.notify()
+        self.trim(now)
+
+    def trim(self, now):
+        """Fecha as ociosas há mais de ``max_idle`` que excedem ``min_size``."""
+        stale = []
+        with self.condition:
+            while (
+                len(self.idle) > self.options["min_size"]
+                and now - self.idle[0].released_at >= self.options["max_idle"]
+            ):
+                stale.append(self.idle.popleft())
+        for connection in stale:
+            self.discard(connection)
+
+    def close(self):
+        with self.condition:
+            idle, self.idle = list(self.idle), deque()
+        for connection in idle:
+            self.discard(connection)
+
+    def stats(self):
+        with self.condition:
+            return {
+                "size": self.size,
+                "idle": len(self.idle),
+                "in_use": len(self.in_use),
+                "min_size": self.options["min_size"],
+                "max_size": self.options["max_size"],
+                **self.stats_counters,
+                "wait_time_ms": round(self.wait_time * 1000, 3),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, connect, ping, options):
+    """Pool do alias neste processo; um processo filho (fork) cria o seu."""
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[alias] = ConnectionPool(connect, ping, options)
+        return pool
+
+
+def pool_stats():
+    with _pools_lock:
+        pools = dict(_pools)
+    return {
+        alias: pool.stats() for alias, pool in pools.items() if pool.pid == os.getpid()
+    }
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        if pool.pid == os.getpid():
+            pool.close()
+
+
+class PooledConnectionMixin:
+    """Liga o ``DatabaseWrapper`` de um backend a um ``ConnectionPool``.
+
+    ``ping_connection`` e ``reset_connection`` usam a API do ``mysqlclient``
+    (``MySQLdb``); outro driver os sobrescreve.
+    """
+
+    pool_reused = False
+
+    def pool_options(self):
+        return self.settings_dict["OPTIONS"].get("pool", {})
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pool", None)
+        return params
+
+    def ping_connection(self, raw):
+        raw.ping()
+
+    def reset_connection(self, raw):
+        raw.rollback()
+
+    def get_pool(self, conn_params):
+        connect = super().get_new_connection
+        return get_pool(
+            self.alias,
+            lambda: connect(conn_params),
+            self.ping_connection,
+            self.pool_options(),
+        )
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection, self.pool_reused = self.pool.acquire()
+        return connection
+
+    def init_connection_state(self):
+        # Variáveis de sessão e a checagem de versão já valem numa conexão
+        # reaproveitada.
+        if not self.pool_reused:
+            super().init_connection_state()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        raw, discard = self.connection, False
+        if self.pool.pid != os.getpid():
+            # Herdada do processo pai (fork): o socket ainda é dele.
+            return
+        if self.in_atomic_block:
+            # O Django mantém a referência até o fim do bloco; a conexão não
+            # pode ir para outra thread.
+            discard = True
+        elif self.errors_occurred and not self.is_usable():
+            discard = True
+        elif not self.get_autocommit():
+            try:
+                self.reset_connection(raw)
+            except Exception:
+                discard = True
+        self.pool.release(raw, discard=discard)
@@ -0,0 +1,252 @@
+"""
+Paginação por cursor (keyset) para todos os endpoints de listagem.
+
+Em vez de ``OFFSET``, cada página guarda no cursor os valores das colunas de
+ordenação da última linha e a próxima consulta filtra a partir deles
+(``(created_at, id) < (c, i)``), o que custa o mesmo na página 1 e na 1000.
+A ordenação é a do próprio queryset, com a chave primária como desempate.
+Com ``?count=exact`` ou ``?count=estimate`` a resposta traz o total; a
+estimativa usa o ``EXPLAIN`` do banco quando disponível.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    estimate_cap = 10000
+    invalid_cursor_message = "Cursor inválido."
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+        except (TypeError, ValueError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(cursor, dict):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, cursor):
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8"))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode("ascii")
+        )
+
+    def clean_position(self, queryset, ordering, values):
+        """Valores do cursor convertidos para os tipos das colunas de ordenação.
+
+        Um cursor adulterado (tipo errado, lista, ``null``) responde como um
+        cursor ilegível, em vez de chegar ao banco.
+        """
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        meta = queryset.query.get_meta()
+        cleaned = []
+        for (name, _), value in zip(ordering, values):
+            if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                field = meta.get_field(name)
+            except FieldDoesNotExist:
+                # Anotação: não há campo para converter.
+                cleaned.append(value)
+                continue
+            try:
+                value = field.to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            cleaned.append(value)
+        return cleaned
+
+    def get_ordering(self, queryset):
+        """Lista de ``(campo, decrescente)`` ou ``None`` se houver expressões."""
+        query = queryset.query
+        order_by = list(query.order_by or (query.get_meta().ordering or []))
+        ordering = []
+        for item in order_by:
+            if not isinstance(item, str) or "__" in item or item == "?":
+                return None
+            name = item.lstrip("-")
+            if name == "pk":
+                name = query.get_meta().pk.attname
+            ordering.append((name, item.startswith("-")))
+        pk_name = query.get_meta().pk.attname
+        if pk_name not in [name for name, _ in ordering]:
+            descending = ordering[-1][1] if ordering else False
+            ordering.append((pk_name, descending))
+        return ordering
+
+    def position(self, row, ordering):
+        values = []
+        for name, _ in ordering:
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            if isinstance(value, (datetime.date, datetime.time)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        return values
+
+    def after(self, ordering, values, reverse):
+        """Filtro lexicográfico "depois da posição" na ordem (ou no inverso)."""
+        condition = Q()
+        for index, (name, descending) in enumerate(ordering):
+            lookup = "lt" if descending != reverse else "gt"
+            step = Q(**{f"{name}__{lookup}": values[index]})
+            for (previous, _), value in zip(ordering[:index], values):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page, finish = self.page_query(queryset, request)
+        self.count = self.get_count(queryset, request)
+        return finish(list(page))
+
+    async def apaginate_queryset(self, queryset, request):
+        """``paginate_queryset`` para views assíncronas (ORM assíncrono)."""
+        page, finish = self.page_query(queryset, request)
+        self.count = await self.aget_count(queryset, request)
+        return finish([row async for row in page])
+
+    def page_query(self, queryset, request):
+        """Fatia a buscar e a função que monta a página com as linhas lidas."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.size = self.get_page_size(request)
+        cursor = self.decode_cursor(request) or {}
+
+        ordering = self.get_ordering(queryset)
+        if ordering is None:
+            # Ordenações por expressão (ex.: relevância) usam deslocamento.
+            return self.offset_query(queryset, cursor)
+        if "o" in cursor:
+            raise NotFound(self.invalid_cursor_message)
+
+        reverse = bool(cursor.get("r"))
+        if reverse:
+            queryset = queryset.order_by(
+                *[name if descending else f"-{name}" for name, descending in ordering]
+            )
+        else:
+            queryset = queryset.order_by(
+                *[f"-{name}" if descending else name for name, descending in ordering]
+            )
+        if "p" in cursor:
+            values = self.clean_position(queryset, ordering, cursor["p"])
+            queryset = queryset.filter(self.after(ordering, values, reverse))
+
+        def finish(rows):
+            has_more = len(rows) > self.size
+            rows = rows[: self.size]
+            if reverse:
+                rows.reverse()
+
+            self.next_url = self.previous_url = None
+            if rows and (has_more or reverse):
+                self.next_url = self.encode_cursor(
+                    {"p": self.position(rows[-1], ordering)}
+                )
+            if rows and (has_more if reverse else "p" in cursor):
+                self.previous_url = self.encode_cursor(
+                    {"p": self.position(rows[0], ordering), "r": 1}
+                )
+            if reverse and not has_more:
+                self.previous_url = None
+            return rows
+
+        return queryset[: self.size + 1], finish
+
+    def offset_query(self, rows, cursor):
+        try:
+            offset = max(int(cursor.get("o", 0)), 0)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        def finish(page):
+            self.next_url = self.previous_url = None
+            if len(page) > self.size:
+                self.next_url = self.encode_cursor({"o": offset + self.size})
+            if offset > 0:
+                previous = max(offset - self.size, 0)
+                self.previous_url = (
+                    self.encode_cursor({"o": previous})
+                    if previous
+                    else remove_query_param(self.base_url, self.cursor_query_param)
+                )
+            return page[: self.size]
+
+        return rows[offset : offset + self.size + 1], finish
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == "exact":
+            return queryset.count(), False
+        if mode == "estimate":
+            return self.estimate_count(queryset)
+        return None
+
+    def estimate_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor in ("mysql", "postgresql"):
+            sql, params = queryset.order_by().query.sql_with_params()
+            with connection.cursor() as cursor:
+                if connection.vendor == "mysql":
+                    cursor.execute(f"EXPLAIN {sql}", params)
+                    columns = [column[0] for column in cursor.description]
+                    return int(cursor.fetchone()[columns.index("rows")] or 0), True
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return int(plan[0]["Plan"]["Plan Rows"]), True
+        count = queryset.order_by()[: self.estimate_cap + 1].count()
+        return min(count, self.estimate_cap), count > self.estimate_cap
+
+    async def aget_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == "exact":
+            return await queryset.acount(), False
+        if mode == "estimate":
+            return await sync_to_async(self.estimate_count)(queryset)
+        return None
+
+    def get_paginated_response(self, data):
+        response = OrderedDict(
+            [("next", self.next_url), ("previous", self.previous_url)]
+        )
+        if self.count is not None:
+            response["count"], response["count_is_estimate"] = self.count
+        response["results"] = data
+        return Response(response)
@@ -0,0 +1,139 @@
+"""
+Planejador de consultas guiado pelos serializers.
+
+Lê os campos declarados de um serializer DRF e os ``source`` de cada um e
+deriva o ``select_related``, os ``Prefetch`` e a projeção ``only()`` que o
+queryset precisa, de modo que uma página seja servida com um número fixo de
+consultas. Campos que não mapeiam para colunas (``SerializerMethodField``,
+propriedades do modelo) declaram o que leem em ``Meta.source_hints``::
+
+    class Meta:
+        source_hints = {"primary_image": ["images.image", "images.is_primary"]}
+
+Sem dica, o plano continua cuidando dos relacionamentos, mas desiste do
+``only()`` para não provocar carregamentos tardios de colunas.
+"""
+
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+class QueryPlan:
+    def __init__(self, model):
+        self.model = model
+        self.only = set()
+        self.select_related = set()
+        self.prefetch = {}
+        self.project = True
+
+    def add_source(self, bits):
+        """Registra um caminho (``source`` separado em partes) a partir do modelo."""
+        model = self.model
+        for index, bit in enumerate(bits):
+            try:
+                field = model._meta.get_field(bit)
+            except FieldDoesNotExist:
+                return False
+            path = "__".join(bits[: index + 1])
+            rest = bits[index + 1 :]
+
+            if field.one_to_many or field.many_to_many:
+                child = self.get_prefetch(path, field)
+                if not rest or not child.add_source(rest):
+                    # Objetos relacionados inteiros (ou caminho desconhecido).
+                    child.project = False
+                return True
+
+            if not field.is_relation or not rest:
+                # Coluna simples ou apenas a chave estrangeira.
+                self.only.add(path)
+                return True
+            self.select_related.add(path)
+            model = field.related_model
+        return True
+
+    def get_prefetch(self, path, field):
+        child = self.prefetch.get(path)
+        if child is None:
+            child = self.prefetch[path] = QueryPlan(field.related_model)
+            if field.one_to_many:
+                child.only.add(field.field.name)
+        return child
+
+    def add_serializer(self, serializer, prefix=()):
+        hints = getattr(getattr(serializer, "Meta", None), "source_hints", {})
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in hints:
+                for hint in hints[name]:
+                    if not self.add_source([*prefix, *hint.split(".")]):
+                        self.project = False
+                continue
+            if isinstance(field, serializers.SerializerMethodField) or (
+                field.source == "*"
+            ):
+                self.project = False
+                continue
+
+            bits = field.source_attrs
+            if (
+                len(bits) == 1
+                and bits[0].startswith("get_")
+                and bits[0].endswith("_display")
+            ):
+                bits = [bits[0][4:-8]]
+
+            child = getattr(field, "child", field)
+            if isinstance(child, serializers.BaseSerializer):
+                self.add_nested([*prefix, *bits], child)
+            elif not self.add_source([*prefix, *bits]):
+                self.project = False
+        return self
+
+    def add_nested(self, bits, serializer):
+        model = self.model
+        for index, bit in enumerate(bits):
+            field = model._meta.get_field(bit)
+            if field.one_to_many or field.many_to_many:
+                child = self.get_prefetch("__".join(bits[: index + 1]), field)
+                child.add_serializer(serializer, bits[index + 1 :])
+                return
+            self.select_related.add("__".join(bits[: index + 1]))
+            model = field.related_model
+        self.add_serializer(serializer, bits)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        for path, child in sorted(self.prefetch.items()):
+            queryset = queryset.prefetch_related(
+                Prefetch(path, queryset=child.apply(child.model._default_manager.all()))
+            )
+        if self.project and self.only:
+            queryset = queryset.only(*sorted(self.only | self.select_related))
+        return queryset
+
+
+@lru_cache(maxsize=None)
+def get_query_plan(serializer_class):
+    serializer = serializer_class(context={})
+    return QueryPlan(serializer.Meta.model).add_serializer(serializer)
+
+
+def plan_queryset(queryset, serializer_class):
+    return get_query_plan(serializer_class).apply(queryset)
+
+
+class QueryPlanMixin:
+    """Aplica o plano do serializer da ação atual às leituras do viewset."""
+
+    def plan_queryset(self, queryset):
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        return plan_queryset(queryset, self.get_serializer_class())
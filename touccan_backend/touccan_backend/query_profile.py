@@ -0,0 +1,229 @@
+"""
+Consultas SQL de cada requisição: quantidade, tempo e repetições.
+
+``QueryProfileMiddleware`` mede as consultas feitas durante a requisição (em
+qualquer alias, inclusive na thread do ORM sob ASGI) e agrupa cada uma pela
+sua impressão digital: o SQL com literais, parâmetros e listas de ``IN``
+trocados por ``?``. A mesma impressão digital repetida muitas vezes numa
+requisição costuma ser um N+1 (uma consulta por item de uma lista).
+
+O resultado vai para o log ``touccan_backend.query_profile`` e, com
+``HEADERS`` (por padrão só com ``DEBUG``, já que expõem o trabalho feito no
+banco), para ``Server-Timing`` (``db;dur=...``) e ``X-DB-Repeated``
+(impressões digitais acima de ``REPEATED_THRESHOLD``). ``profile_queries`` mede um bloco qualquer;
+``touccan_backend.testing.query_budget`` usa isso nos testes.
+"""
+
+import contextvars
+import hashlib
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+_profile = contextvars.ContextVar("query_profile", default=None)
+
+FINGERPRINT_RES = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def profile_options():
+    options = {
+        "ENABLED": True,
+        "HEADERS": settings.DEBUG,
+        "REPEATED_THRESHOLD": 5,
+        "LOG_QUERIES_ABOVE": 30,
+        "LOG_MS_ABOVE": 200,
+    }
+    options.update(getattr(settings, "QUERY_PROFILE", {}))
+    return options
+
+
+def fingerprint(sql):
+    for pattern, replacement in FINGERPRINT_RES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint_id(statement):
+    return hashlib.md5(statement.encode()).hexdigest()[:8]
+
+
+def cache_tables():
+    """Tabelas dos ``DatabaseCache`` configurados.
+
+    As consultas do próprio cache não são trabalho da view: contadas, cada
+    leitura de entrada ou versão de tag apareceria como um N+1.
+    """
+    return tuple(
+        cache["LOCATION"]
+        for cache in settings.CACHES.values()
+        if cache["BACKEND"] == "django.core.cache.backends.db.DatabaseCache"
+    )
+
+
+class QueryProfile:
+    """Consultas de um trecho; repassa cada uma ao perfil que o contém."""
+
+    def __init__(self, parent=None, ignored_tables=()):
+        self.parent = parent
+        self.ignored_tables = ignored_tables
+        self.count = 0
+        self.duration = 0.0
+        self.aliases = Counter()
+        self.statements = Counter()
+        self.statement_time = defaultdict(float)
+
+    def ignores(self, sql):
+        return any(table in sql for table in self.ignored_tables)
+
+    def record(self, alias, sql, duration):
+        statement = fingerprint(sql)
+        profile = self
+        while profile is not None:
+            profile.count += 1
+            profile.duration += duration
+            profile.aliases[alias] += 1
+            profile.statements[statement] += 1
+            profile.statement_time[statement] += duration
+            profile = profile.parent
+
+    def repeated(self, threshold):
+        """``[(impressão digital, vezes)]`` que passaram de ``threshold``."""
+        return [
+            (statement, total)
+            for statement, total in self.statements.most_common()
+            if total > threshold
+        ]
+
+    def report(self, threshold=1):
+        lines = [f"{self.count} consultas, {self.duration * 1000:.1f} ms"]
+        for statement, total in self.repeated(threshold):
+            lines.append(
+                f"  {total}x [{fingerprint_id(statement)}] "
+                f"{self.statement_time[statement] * 1000:.1f} ms: {statement}"
+            )
+        return "\n".join(lines)
+
+
+def profile_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None or profile.ignores(sql):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record(context["connection"].alias, sql, time.perf_counter() - start)
+
+
+def install_query_profiler(connection, **kwargs):
+    """Como ``db_routing.install_query_counter``: um wrapper por conexão."""
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_query)
+
+
+connection_created.connect(install_query_profiler)
+
+
+@contextmanager
+def profile_queries():
+    """Mede as consultas do bloco (e as repassa a um perfil externo, se houver)."""
+    profile = QueryProfile(parent=_profile.get(), ignored_tables=cache_tables())
+    token = _profile.set(profile)
+    for alias in settings.DATABASES:
+        install_query_profiler(connections[alias])
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+
+class QueryProfileMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        options = profile_options()
+        if not options["ENABLED"]:
+            return self.get_response(request)
+        with profile_queries() as profile:
+            response = self.get_response(request)
+        return self.finish(request, response, profile, options)
+
+    async def __acall__(self, request):
+        options = profile_options()
+        if not options["ENABLED"]:
+            return await self.get_response(request)
+        with profile_queries() as profile:
+            response = await self.get_response(request)
+        return self.finish(request, response, profile, options)
+
+    def finish(self, request, response, profile, options):
+        if not profile.count:
+            return response
+        repeated = profile.repeated(options["REPEATED_THRESHOLD"])
+        if options["HEADERS"]:
+            timing = (
+                f'db;dur={profile.duration * 1000:.2f};desc="{profile.count} queries"'
+            )
+            if response.has_header("Server-Timing"):
+                timing = f"{response['Server-Timing']}, {timing}"
+            response["Server-Timing"] = timing
+            if repeated:
+                response["X-DB-Repeated"] = ", ".join(
+                    f"{fingerprint_id(statement)}={total}"
+                    for statement, total in repeated
+                )
+        self.log(request, profile, repeated, options)
+        return response
+
+    def log(self, request, profile, repeated, options):
+        match = request.resolver_match
+        route = match.view_name if match else request.path
+        for statement, total in repeated:
+            logger.warning(
+                "Possível N+1 em %s %s: %d consultas [%s] %s",
+                request.method,
+                route,
+                total,
+                fingerprint_id(statement),
+                statement,
+            )
+        level = (
+            logging.INFO
+            if profile.count > options["LOG_QUERIES_ABOVE"]
+            or profile.duration * 1000 > options["LOG_MS_ABOVE"]
+            else logging.DEBUG
+        )
+        logger.log(
+            level,
+            "%s %s: %d consultas, %.1f ms (%s)",
+            request.method,
+            route,
+            profile.count,
+            profile.duration * 1000,
+            ", ".join(
+                f"{alias}={total}" for alias, total in sorted(profile.aliases.items())
+            ),
+        )
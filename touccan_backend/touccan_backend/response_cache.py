@@ -0,0 +1,228 @@
+"""
+Cache de respostas de leitura invalidado por tags.
+
+Cada resposta fica no cache do Django sob uma chave derivada do host, do
+caminho, dos parâmetros (ordenados) e do tipo de mídia negociado, junto com
+a versão de cada tag que ela contém (``product:12``, ``category:3`` ou
+coleções como ``products``). Invalidar uma tag é incrementar a sua versão:
+as entradas gravadas com a versão antiga deixam de valer na próxima leitura,
+sem precisar de um índice das entradas por tag. Cada família de tags
+(``product:*``) tem também uma versão, que avança junto com qualquer tag
+dela. Funciona com qualquer backend compartilhado entre os processos
+(banco, memcached, redis); com o local-memory, cada processo teria as suas
+versões e não veria as invalidações dos outros.
+"""
+
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from .db_routing import replica_cache_timeout
+
+
+class ResponseCache:
+    counters = ("hits", "misses")
+
+    @property
+    def options(self):
+        options = {"ALIAS": "default", "TIMEOUT": 300, "KEY_PREFIX": "response"}
+        options.update(getattr(settings, "RESPONSE_CACHE", {}))
+        return options
+
+    @property
+    def cache(self):
+        return caches[self.options["ALIAS"]]
+
+    def make_key(self, *parts):
+        digest = hashlib.md5(repr(parts).encode("utf-8"), usedforsecurity=False)
+        return f"{self.options['KEY_PREFIX']}:entry:{digest.hexdigest()}"
+
+    def tag_key(self, tag):
+        return f"{self.options['KEY_PREFIX']}:tag:{tag}"
+
+    def versions(self, tags):
+        """Versão atual de cada tag, criando as que ainda não existem."""
+        keys = {self.tag_key(tag): tag for tag in tags}
+        found = self.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in found]
+        if missing:
+            # Versões novas partem do relógio, para que uma tag despejada do
+            # cache não volte a um valor já usado por entradas antigas.
+            for key in missing:
+                self.cache.add(key, time.time_ns(), timeout=None)
+            found.update(self.cache.get_many(missing))
+        return {keys[key]: version for key, version in found.items()}
+
+    def generation(self):
+        """Versão que avança a cada invalidação, de qualquer tag."""
+        return self.versions(["*"])["*"]
+
+    def invalidate(self, *tags):
+        # ``product:12`` também avança ``product:*``, a versão da família
+        # usada pelos validadores de GET condicional, e a geração. Essas vêm
+        # primeiro: quem vê a tag nova já vê a geração nova.
+        families = {f"{tag.split(':')[0]}:*" for tag in tags if ":" in tag}
+        for tag in ["*", *sorted(families - set(tags)), *tags]:
+            key = self.tag_key(tag)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, time.time_ns(), timeout=None)
+
+    def get(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        tags = entry["versions"]
+        current = self.cache.get_many([self.tag_key(tag) for tag in tags])
+        for tag, version in tags.items():
+            if current.get(self.tag_key(tag)) != version:
+                return None
+        return entry
+
+    def set(self, key, entry):
+        timeout = replica_cache_timeout(self.options["TIMEOUT"])
+        self.cache.set(key, entry, timeout=timeout)
+
+    def cached(self, request, key):
+        """Resposta guardada em ``key`` (ou um 304), ou ``None`` se não houver."""
+        entry = self.get(key)
+        if entry is None:
+            self.count("misses")
+            return None
+        self.count("hits")
+        not_modified = get_conditional_response(
+            request,
+            etag=entry["headers"].get("ETag"),
+            last_modified=parse_http_date_safe(
+                entry["headers"].get("Last-Modified", "")
+            ),
+        )
+        if not_modified is not None:
+            return not_modified
+        response = HttpResponse(entry["content"], content_type=entry["content_type"])
+        for name, value in entry["headers"].items():
+            response[name] = value
+        response["X-Cache"] = "HIT"
+        return response
+
+    def store(self, key, generation, versions, tags, response):
+        """Guarda ``response`` (já renderizada) com as versões lidas antes dela.
+
+        Se houve uma invalidação desde ``generation``, as versões das tags
+        dos itens podem já ser as posteriores a ela: nada é guardado.
+        """
+        versions = {**versions, **self.versions(tags)}
+        if self.generation() != generation:
+            return
+        headers = {
+            name: response[name]
+            for name in ("ETag", "Last-Modified")
+            if response.has_header(name)
+        }
+        self.set(
+            key,
+            {
+                "content": response.content,
+                "content_type": response["Content-Type"],
+                "headers": headers,
+                "versions": versions,
+            },
+        )
+
+    def count(self, name):
+        key = f"{self.options['KEY_PREFIX']}:stats:{name}"
+        if not self.cache.add(key, 1, timeout=None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, timeout=None)
+
+    def stats(self):
+        """Acertos e falhas acumulados no backend (todos os processos)."""
+        prefix = f"{self.options['KEY_PREFIX']}:stats:"
+        found = self.cache.get_many([prefix + name for name in self.counters])
+        return {name: found.get(prefix + name, 0) for name in self.counters}
+
+    def reset_stats(self):
+        prefix = f"{self.options['KEY_PREFIX']}:stats:"
+        self.cache.delete_many([prefix + name for name in self.counters])
+
+
+response_cache = ResponseCache()
+
+
+class ResponseCacheMixin:
+    """Serve ``list``/``retrieve`` (e ações que usem ``cached_response``) do cache.
+
+    ``get_cache_collections`` lista as tags de coleção cuja versão é lida
+    antes de montar a resposta (uma escrita concorrente já invalida a
+    entrada); ``get_cache_tags`` extrai as tags dos objetos contidos nos
+    dados da resposta, conhecidas só depois de montá-la. Por isso a resposta
+    não é guardada se a geração mudou entre o início e o fim da montagem.
+    """
+
+    def get_cache_collections(self):
+        return []
+
+    def get_cache_tags(self, data):
+        return []
+
+    def get_cache_key(self, request):
+        params = sorted(
+            (name, value)
+            for name in request.query_params
+            for value in request.query_params.getlist(name)
+        )
+        return response_cache.make_key(
+            request.get_host(),
+            request.path,
+            params,
+            getattr(request, "accepted_media_type", ""),
+        )
+
+    def cached_response(self, request, respond):
+        if request.method != "GET":
+            return respond()
+        key = self.get_cache_key(request)
+        response = response_cache.cached(request, key)
+        if response is not None:
+            return response
+
+        generation = response_cache.generation()
+        versions = response_cache.versions(self.get_cache_collections())
+        response = respond()
+        if isinstance(response, Response) and response.status_code == 200:
+            self._cache_pending = (
+                key,
+                generation,
+                versions,
+                self.get_cache_tags(response.data),
+            )
+        response["X-Cache"] = "MISS"
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        pending = getattr(self, "_cache_pending", None)
+        if pending is not None and response.status_code == 200:
+            response.render()
+            response_cache.store(*pending, response)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, partial(super().retrieve, request, *args, **kwargs)
+        )
@@ -39,6 +39,8 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "products",
     "users",
+    "transactions",
+    "orders",
     "rest_framework",
     "django_filters",
     "corsheaders",
@@ -46,11 +48,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "touccan_backend.metrics.RouteMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "touccan_backend.query_profile.QueryProfileMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "touccan_backend.db_routing.DatabaseRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -78,14 +83,27 @@ WSGI_APPLICATION = "touccan_backend.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# touccan_backend.mysql_pool is the MySQL backend with a per-process
+# connection pool; keep CONN_MAX_AGE at 0 so connections go back to the pool
+# at the end of each request.
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.mysql",
+        "ENGINE": "touccan_backend.mysql_pool",
         "NAME": "loja_virtual",
         "USER": "thais",
         "PASSWORD": "Senha@123",
         "HOST": "localhost",
-        "PORT": "3306"
+        "PORT": "3306",
+        "CONN_MAX_AGE": 0,
+        "OPTIONS": {
+            "pool": {
+                "min_size": 2,
+                "max_size": 20,
+                "timeout": 10,
+                "max_lifetime": 1800,
+                "pre_ping": True,
+            },
+        },
     }
 }
 
@@ -126,7 +144,259 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+MEDIA_URL = "/media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Category tree snapshot (products.tree)
+# Seconds an in-process snapshot is reused before being rebuilt; writes in
+# this process invalidate it immediately through signals.
+
+CATEGORY_TREE_TTL = 60
+
+
+# Product full-text search (products.search)
+# SQLite FTS5 file holding the analyzed inverted index, local to each host;
+# build it at deploy with `manage.py rebuild_search_index` (otherwise the
+# first search builds it in the background). Every SYNC_INTERVAL seconds the
+# index re-reads products changed since its last sync, which brings in writes
+# made on other hosts; while it is missing or older than STALE_AFTER, search
+# falls back to an icontains query.
+
+PRODUCT_SEARCH = {
+    "PATH": BASE_DIR / "search_index.sqlite3",
+    "TITLE_BOOST": 5.0,
+    "MAX_RESULTS": 1000,
+    "SYNC_INTERVAL": 60,
+    "STALE_AFTER": 900,
+}
+
+
+# Search box autocomplete (products.suggest)
+# Seconds before the in-process prefix index is rebuilt from the database;
+# writes in this process are applied to it incrementally.
+
+SUGGEST_INDEX_TTL = 300
+
+
+# Catalog filter/facet bitmap index (products.facets)
+# Price facet bucket lower bounds, the largest filtered result served through
+# the index (bigger ones go to SQL) and the background reload interval.
+
+CATALOG_INDEX = {
+    "PRICE_BUCKETS": [0, 50, 100, 200, 500, 1000, 5000],
+    "MAX_IN_IDS": 2000,
+    "TTL": 300,
+}
+
+
+# API pagination (touccan_backend.pagination)
+# Every list endpoint pages by cursor over its ordering columns plus the id;
+# clients pass ?page_size= (up to 200) and ?count=exact|estimate for totals.
+
+REST_FRAMEWORK = {
+    "DEFAULT_PAGINATION_CLASS": "touccan_backend.pagination.KeysetPagination",
+    "PAGE_SIZE": 24,
+}
+
+
+# Shared cache
+# Must be shared by every worker process and host: response cache entries
+# and their tag versions (so tag invalidation and the conditional GET ETags),
+# `manage.py response_cache_stats`, the read-your-writes pin of db_routing and
+# the trending ranking all live here. Redis keeps this traffic off MySQL and
+# makes `incr` atomic; install the `redis` package and point LOCATION at the
+# server. The per-process LocMemCache is only for development (DEBUG), where
+# a single worker has nothing to share.
+
+if DEBUG:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "touccan",
+            "TIMEOUT": 300,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://127.0.0.1:6379/1",
+            "TIMEOUT": 300,
+        }
+    }
+
+
+# Read response cache (touccan_backend.response_cache)
+# Cache alias, entry lifetime in seconds and key prefix for cached catalog
+# responses; entries are invalidated per product/category by model signals.
+
+RESPONSE_CACHE = {
+    "ALIAS": "default",
+    "TIMEOUT": 300,
+    "KEY_PREFIX": "response",
+}
+
+
+# Stock reservations (products.inventory)
+# Seconds a checkout hold keeps units out of stock before
+# `manage.py sweep_reservations` returns them, and the limits of the
+# authenticated products/{slug}/reserve/ endpoint: units per call and units a
+# user may hold at once. Holds are committed only by the order's payment.
+
+STOCK_RESERVATION_TTL = 900
+STOCK_RESERVATION_MAX_QUANTITY = 10
+STOCK_RESERVATION_MAX_HELD = 20
+
+
+# "Customers also bought" (products.recommendations)
+# Neighbours kept per product, orders two products must share to count as
+# related, and the co-occurrence matrix file that lets
+# `manage.py build_recommendations` re-read only the orders changed since the
+# last run (minus LAG seconds, for transactions that commit late). Hard
+# deletes and updates that skip atualizado_em are picked up by the full
+# rebuild every FULL_REBUILD_INTERVAL seconds.
+
+PRODUCT_RECOMMENDATIONS = {
+    "TOP_K": 12,
+    "MIN_SHARED_ORDERS": 2,
+    "STATE_PATH": BASE_DIR / "recommendations.npz",
+    "LAG": 300,
+    "FULL_REBUILD_INTERVAL": 24 * 3600,
+}
+
+
+# View/cart counters and trending (products.counters)
+# Each worker buffers increments and writes them in one batch when it holds
+# MAX_PENDING products or FLUSH_INTERVAL seconds have passed; the trending
+# score halves every HALF_LIFE seconds and the ranking is rebuilt at most
+# every TRENDING_TTL seconds. With BACKGROUND_FLUSH off (the test runner) the
+# buffer is only written by an explicit flush().
+
+PRODUCT_COUNTERS = {
+    "FLUSH_INTERVAL": 10,
+    "MAX_PENDING": 500,
+    "HALF_LIFE": 6 * 3600,
+    "WEIGHTS": {"views": 1.0, "cart_adds": 5.0},
+    "TRENDING_SIZE": 100,
+    "TRENDING_TTL": 60,
+    "BACKGROUND_FLUSH": True,
+}
+
+
+# Product image renditions (products.renditions)
+# Widths generated for every upload, as WebP plus a JPEG/PNG fallback, by
+# WORKERS background threads after the upload commits; existing images are
+# backfilled with `manage.py build_renditions`.
+
+PRODUCT_IMAGE_RENDITIONS = {
+    "SIZES": {"thumb": 160, "card": 480, "zoom": 1600},
+    "WEBP_QUALITY": 80,
+    "FALLBACK_QUALITY": 85,
+    "WORKERS": 2,
+}
+
+
+# Storefront build (`manage.py build_storefront`)
+# Static pages copied from SOURCE to OUTPUT with hashed asset names, gzip and
+# brotli variants and WebP/AVIF images; serve OUTPUT using the cache_control
+# recorded for each file in OUTPUT/manifest.json.
+
+STOREFRONT = {
+    "SOURCE": BASE_DIR / "Touccan-1.5-main",
+    "OUTPUT": BASE_DIR / "storefront_dist",
+}
+
+
+# Media serving (touccan_backend.media)
+# ACCEL hands the transfer to the web server: "x-accel-redirect" (nginx, with
+# an internal location at ACCEL_PREFIX aliased to MEDIA_ROOT) or "x-sendfile"
+# (Apache mod_xsendfile). None streams the file from Django with sendfile.
+
+MEDIA_SERVING = {
+    "ACCEL": None,
+    "ACCEL_PREFIX": "/protected-media/",
+    "CACHE_CONTROL": "public, max-age=3600",
+}
+
+
+# Read replicas (touccan_backend.db_routing)
+# REPLICAS are extra DATABASES aliases that safe-method reads of viewsets with
+# ReplicaReadMixin may use; after a write the client reads from "default" for
+# STICKY_SECONDS. Locally, a replica can be a second SQLite alias pointing at
+# the same file as "default" (with "TEST": {"MIRROR": "default"}). Per-alias
+# query counts are summed per process and written to the shared cache every
+# STATS_FLUSH_INTERVAL seconds; the X-DB-Queries header follows DEBUG.
+
+DATABASE_ROUTERS = ["touccan_backend.db_routing.PrimaryReplicaRouter"]
+
+DATABASE_ROUTING = {
+    "REPLICAS": [],
+    "STICKY_SECONDS": 5,
+    "HEADERS": DEBUG,
+    "STATS_FLUSH_INTERVAL": 10,
+}
+
+
+# Worker startup (touccan_backend.startup)
+# wsgi.py/asgi.py build the URL resolvers, DRF settings and serializer fields
+# at import time when WARM_UP is on (use gunicorn --preload to do it once in
+# the master). `manage.py bench_startup` fails when boot plus the first
+# request take longer than BUDGET_MS.
+
+STARTUP = {
+    "WARM_UP": True,
+    "BUDGET_MS": 2000,
+}
+
+
+# SQL profiling (touccan_backend.query_profile)
+# Per-request query count and DB time go to Server-Timing; statements repeated
+# more than REPEATED_THRESHOLD times (likely N+1) go to X-DB-Repeated and are
+# logged as warnings. Requests above LOG_QUERIES_ABOVE queries or LOG_MS_ABOVE
+# ms of DB time are logged at INFO, the rest at DEBUG. The response headers
+# reveal query counts and timings to any client, so HEADERS follows DEBUG.
+
+QUERY_PROFILE = {
+    "ENABLED": True,
+    "HEADERS": DEBUG,
+    "REPEATED_THRESHOLD": 5,
+    "LOG_QUERIES_ABOVE": 30,
+    "LOG_MS_ABOVE": 200,
+}
+
+
+# Route metrics (touccan_backend.metrics)
+# Latency and response size histograms, status counters and in-flight gauges
+# per resolved route, served in Prometheus text format at /metrics/. Each
+# worker writes a snapshot to DIRECTORY every FLUSH_INTERVAL seconds and the
+# endpoint sums them; clear DIRECTORY when the service starts. Scrapers send
+# "Authorization: Bearer <TOKEN>"; without a TOKEN only staff users can read.
+
+ROUTE_METRICS = {
+    "ENABLED": True,
+    "FLUSH_INTERVAL": 1.0,
+    "TOKEN": None,
+}
+
+
+# Payment provider callbacks (transactions.permissions)
+# The gateway calls approve/reject/update_status with "Authorization: Bearer
+# <TOKEN>"; without a TOKEN only staff users can change transactions.
+# Customers can only read the transactions of their own orders.
+
+PAYMENT_PROVIDER = {
+    "TOKEN": None,
+}
+
+
+# Test runner (touccan_backend.testing)
+# Route metrics go to a temporary directory and product counters are only
+# written by an explicit flush() while the suite runs.
+
+TEST_RUNNER = "touccan_backend.testing.TestRunner"
@@ -0,0 +1,117 @@
+"""
+Aquecimento do processo antes da primeira requisição.
+
+O Django adia boa parte do trabalho para a primeira requisição: importar o
+URLconf (e com ele as views, serializers e o DRF), montar os resolvers,
+carregar as classes de ``REST_FRAMEWORK`` e calcular os campos de cada
+serializer. ``warm_up`` faz isso no boot, a partir de ``wsgi.py``/``asgi.py``;
+com ``gunicorn --preload`` o trabalho acontece uma vez no processo mestre e
+os workers já nascem prontos.
+
+Nada aqui abre conexão com o banco: uma conexão criada antes do fork seria
+compartilhada pelos workers.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+API_SETTINGS = (
+    "DEFAULT_RENDERER_CLASSES",
+    "DEFAULT_PARSER_CLASSES",
+    "DEFAULT_AUTHENTICATION_CLASSES",
+    "DEFAULT_PERMISSION_CLASSES",
+    "DEFAULT_THROTTLE_CLASSES",
+    "DEFAULT_CONTENT_NEGOTIATION_CLASS",
+    "DEFAULT_FILTER_BACKENDS",
+    "DEFAULT_PAGINATION_CLASS",
+    "DEFAULT_METADATA_CLASS",
+)
+
+
+def startup_options():
+    options = {"WARM_UP": True, "BUDGET_MS": 2000}
+    options.update(getattr(settings, "STARTUP", {}))
+    return options
+
+
+def callbacks(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from callbacks(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern.callback
+
+
+def serializer_classes(callback):
+    """Serializers de cada ação de uma view do DRF (``as_view``)."""
+    view_class = getattr(callback, "cls", None)
+    if view_class is None or not hasattr(view_class, "get_serializer_class"):
+        return
+    # Ações do router (``{"get": "list"}``) ou, numa ``APIView``, os métodos.
+    actions = getattr(callback, "actions", None) or {
+        method: None for method in view_class().allowed_methods
+    }
+    for method, action in actions.items():
+        view = view_class(**getattr(callback, "initkwargs", {}))
+        view.action = action
+        view.request = view.format_kwarg = None
+        view.kwargs = {}
+        try:
+            serializer_class = view.get_serializer_class()
+        except Exception:
+            # ``get_serializer_class`` que depende da requisição.
+            continue
+        yield serializer_class, method.upper() in SAFE_METHODS and hasattr(
+            view, "plan_queryset"
+        )
+
+
+def warm_serializers(patterns):
+    from .planner import get_query_plan
+
+    seen = set()
+    for callback in callbacks(patterns):
+        for serializer_class, planned in serializer_classes(callback):
+            if (serializer_class, planned) in seen:
+                continue
+            seen.add((serializer_class, planned))
+            try:
+                serializer_class(context={}).fields
+                if planned:
+                    get_query_plan(serializer_class)
+            except Exception:
+                logger.debug(
+                    "Aquecimento de %s falhou", serializer_class, exc_info=True
+                )
+    return len({serializer_class for serializer_class, _ in seen})
+
+
+def warm_up(force=False):
+    """Importa e monta o que a primeira requisição montaria.
+
+    Devolve ``{"urls": ..., "serializers": ..., "ms": ...}`` ou ``None`` se
+    ``STARTUP["WARM_UP"]`` estiver desligado.
+    """
+    if not force and not startup_options()["WARM_UP"]:
+        return None
+    from rest_framework.settings import api_settings
+
+    start = time.perf_counter()
+    resolver = get_resolver()
+    # ``reverse_dict`` monta os resolvers de todos os ``include``.
+    resolver.reverse_dict
+    for name in API_SETTINGS:
+        getattr(api_settings, name)
+    urls = sum(1 for _ in callbacks(resolver.url_patterns))
+    serializers = warm_serializers(resolver.url_patterns)
+    elapsed = (time.perf_counter() - start) * 1000
+    logger.info(
+        "Aquecimento: %d rotas, %d serializers em %.0f ms", urls, serializers, elapsed
+    )
+    return {"urls": urls, "serializers": serializers, "ms": round(elapsed, 1)}
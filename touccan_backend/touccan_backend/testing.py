@@ -0,0 +1,58 @@
+"""
+Apoio aos testes: orçamento de consultas e o runner do projeto.
+
+``assertQueryBudget`` falha o teste quando a requisição passa de um número
+máximo de consultas ou repete a mesma consulta mais que ``repeated`` vezes
+(um N+1). A mensagem traz as consultas repetidas, agrupadas como no
+``QueryProfileMiddleware``.
+
+``TestRunner`` mantém os gravadores de fundo longe do ambiente real: as
+métricas de rota vão para um diretório temporário e os contadores de
+produtos só são gravados quando o teste chama ``flush()``.
+"""
+
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+from .query_profile import profile_queries
+
+@contextmanager
+def query_budget(limit, repeated=None):
+    with profile_queries() as profile:
+        yield profile
+    if profile.count > limit:
+        raise AssertionError(
+            f"Orçamento de {limit} consultas estourado: {profile.report()}"
+        )
+    if repeated is not None and profile.repeated(repeated):
+        raise AssertionError(
+            f"Consulta repetida mais de {repeated} vezes: {profile.report(repeated)}"
+        )
+
+
+class QueryBudgetMixin:
+    """Para ``TestCase``: ``with self.assertQueryBudget(5): self.client.get(...)``."""
+
+    def assertQueryBudget(self, limit, repeated=None):
+        return query_budget(limit, repeated)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.metrics_directory = tempfile.TemporaryDirectory()
+        settings.ROUTE_METRICS = {
+            **getattr(settings, "ROUTE_METRICS", {}),
+            "DIRECTORY": self.metrics_directory.name,
+        }
+        settings.PRODUCT_COUNTERS = {
+            **getattr(settings, "PRODUCT_COUNTERS", {}),
+            "BACKGROUND_FLUSH": False,
+        }
+
+    def teardown_test_environment(self, **kwargs):
+        self.metrics_directory.cleanup()
+        super().teardown_test_environment(**kwargs)
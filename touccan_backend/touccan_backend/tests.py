@@ -0,0 +1,601 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db import connections, router
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import get_resolver, include, path, reverse
+from django.utils.http import http_date
+
+from .db_routing import (
+    DatabaseRoutingMiddleware,
+    pin_key,
+    query_counts,
+    query_stats,
+    routing_options,
+    use_replicas,
+)
+from .media import serve
+from .metrics import (
+    UNMATCHED,
+    Histogram,
+    RouteMetricsMiddleware,
+    collect,
+    render,
+    route_metrics,
+    write_json,
+)
+from .mysql_pool.pool import ConnectionPool, PooledConnectionMixin, PoolTimeout
+from .query_profile import QueryProfileMiddleware, profile_queries
+from .startup import callbacks, warm_serializers, warm_up
+from .views import metrics as metrics_view
+
+CONTENT = b"0123456789abcdef"
+
+
+class MediaServeTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        with open(os.path.join(self.root, "video.mp4"), "wb") as file:
+            file.write(CONTENT)
+        override = override_settings(MEDIA_ROOT=self.root, MEDIA_SERVING={})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.factory = RequestFactory()
+
+    def get(self, path="video.mp4", **headers):
+        response = serve(self.factory.get(f"/media/{path}", headers=headers), path)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+        self.assertEqual(response["Content-Length"], str(len(CONTENT)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Type"], "video/mp4")
+
+    def test_ranges(self):
+        for header, status, body, content_range in (
+            ("bytes=2-5", 206, b"2345", "bytes 2-5/16"),
+            ("bytes=10-", 206, b"abcdef", "bytes 10-15/16"),
+            ("bytes=-3", 206, b"def", "bytes 13-15/16"),
+            ("bytes=14-99", 206, b"ef", "bytes 14-15/16"),
+            # Vários intervalos ou sintaxe desconhecida: o arquivo inteiro.
+            ("bytes=0-1,4-5", 200, CONTENT, None),
+            ("items=0-1", 200, CONTENT, None),
+        ):
+            with self.subTest(header=header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(self.body(response), body)
+                self.assertEqual(response["Content-Length"], str(len(body)))
+                self.assertEqual(response.get("Content-Range"), content_range)
+
+    def test_unsatisfiable_range(self):
+        for header in ("bytes=16-", "bytes=5-2", "bytes=-0"):
+            with self.subTest(header=header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response["Content-Range"], "bytes */16")
+
+    def test_if_range(self):
+        full = self.get()
+        etag, modified = full["ETag"], full["Last-Modified"]
+        self.assertEqual(self.get(Range="bytes=0-3", If_Range=etag).status_code, 206)
+        self.assertEqual(
+            self.get(Range="bytes=0-3", If_Range=modified).status_code, 206
+        )
+        # A cópia do cliente é de outra versão: recebe o arquivo inteiro.
+        stale = self.get(Range="bytes=0-3", If_Range='"outra-versao"')
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(self.body(stale), CONTENT)
+        older = self.get(Range="bytes=0-3", If_Range=http_date(0))
+        self.assertEqual(older.status_code, 200)
+
+    def test_revalidation(self):
+        etag = self.get()["ETag"]
+        response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(self.get(If_None_Match='"outra"').status_code, 200)
+
+    def test_paths_outside_media_root(self):
+        for path in ("../etc/passwd", "nao-existe.mp4", ""):
+            with self.subTest(path=path):
+                with self.assertRaises(Http404):
+                    self.get(path)
+
+    def test_content_addressed_blobs_are_immutable(self):
+        path = f"ab/cd/{'0' * 64}.jpg"
+        os.makedirs(os.path.join(self.root, "ab", "cd"))
+        with open(os.path.join(self.root, path), "wb") as file:
+            file.write(CONTENT)
+        self.assertIn("immutable", self.get(path)["Cache-Control"])
+        self.assertNotIn("immutable", self.get()["Cache-Control"])
+
+    @override_settings(MEDIA_SERVING={"ACCEL": "x-accel-redirect"})
+    def test_accel_redirect(self):
+        response = self.get(Range="bytes=0-3")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/video.mp4")
+        self.assertEqual(response.content, b"")
+
+
+class AuthenticatedUser:
+    pk = 7
+    is_authenticated = True
+
+
+class DatabaseRoutingTests(SimpleTestCase):
+    """Roteador com um primário e uma réplica SQLite de verdade."""
+
+    databases = {"default"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Registrada depois da preparação dos bancos de teste: a réplica em
+        # memória não precisa de esquema para as consultas daqui.
+        replica = {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+        connections.settings["replica"] = connections.configure_settings(
+            {"default": connections.settings["default"], "replica": replica}
+        )["replica"]
+        cls.databases = {"default", "replica"}
+        cls.enterClassContext(
+            override_settings(
+                DATABASES={**connections.settings},
+                DATABASE_ROUTING={
+                    "REPLICAS": ["replica"],
+                    "STICKY_SECONDS": 5,
+                    "HEADERS": True,
+                    "STATS_FLUSH_INTERVAL": 60,
+                },
+            )
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        cls.databases = {"default"}
+        super().tearDownClass()
+
+    def setUp(self):
+        caches["default"].clear()
+        self.factory = RequestFactory()
+
+    def handle(self, request, write=False, user=None):
+        """Lê (e, se pedido, escreve) como uma view que usa réplicas."""
+        seen = {}
+
+        def view(request):
+            request.user = user or AnonymousUser()
+            use_replicas(request)
+            seen["before"] = router.db_for_read(None)
+            if write:
+                router.db_for_write(None)
+            seen["after"] = router.db_for_read(None)
+            with connections[seen["after"]].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return HttpResponse()
+
+        response = DatabaseRoutingMiddleware(view)(request)
+        return response, seen
+
+    def test_reads_go_to_the_replica(self):
+        response, seen = self.handle(self.factory.get("/"))
+        self.assertEqual(seen, {"before": "replica", "after": "replica"})
+        self.assertEqual(response["X-DB-Queries"], "replica=1")
+        self.assertNotIn("db_primary_until", response.cookies)
+
+    def test_writes_go_to_the_primary_and_pin(self):
+        response, seen = self.handle(self.factory.post("/"), write=True)
+        self.assertEqual(seen["after"], "default")
+        self.assertEqual(response["X-DB-Queries"], "default=1")
+        cookie = response.cookies["db_primary_until"].value
+
+        self.factory.cookies["db_primary_until"] = cookie
+        _, seen = self.handle(self.factory.get("/"))
+        self.assertEqual(seen["before"], "default")
+
+    def test_writes_during_safe_methods_do_not_pin(self):
+        # Ex.: o cache no banco gravando uma entrada durante um GET.
+        response, seen = self.handle(self.factory.get("/"), write=True)
+        self.assertEqual(seen, {"before": "replica", "after": "replica"})
+        self.assertNotIn("db_primary_until", response.cookies)
+
+    def test_sticky_window(self):
+        for until, pinned in (
+            (time.time() + 3, True),
+            (time.time() - 1, False),
+            # Prazo além da janela: cookie forjado, ignorado.
+            (time.time() + 3600, False),
+        ):
+            with self.subTest(until=until):
+                self.factory.cookies["db_primary_until"] = f"{until:.3f}"
+                _, seen = self.handle(self.factory.get("/"))
+                self.assertEqual(seen["before"], "default" if pinned else "replica")
+
+    def test_authenticated_users_are_pinned_in_any_client(self):
+        user = AuthenticatedUser()
+        self.handle(self.factory.post("/"), write=True, user=user)
+        self.assertTrue(caches["default"].get(pin_key(user.pk)))
+        _, seen = self.handle(RequestFactory().get("/"), user=user)
+        self.assertEqual(seen["before"], "default")
+        _, seen = self.handle(RequestFactory().get("/"))
+        self.assertEqual(seen["before"], "replica")
+
+    def test_query_counts_reach_the_cache_in_batches(self):
+        query_counts.flush()
+        caches["default"].clear()
+        with mock.patch.object(caches["default"], "incr") as incr:
+            for _ in range(3):
+                self.handle(self.factory.get("/"))
+        # Somadas no processo: nenhuma escrita no cache por requisição.
+        incr.assert_not_called()
+        self.assertEqual(query_stats(), {"default": 0, "replica": 0})
+        query_counts.flush()
+        self.assertEqual(query_stats(), {"default": 0, "replica": 3})
+
+    def test_query_header_follows_the_option(self):
+        options = {**routing_options(), "HEADERS": False}
+        with override_settings(DATABASE_ROUTING=options):
+            response, _ = self.handle(self.factory.get("/"))
+        self.assertFalse(response.has_header("X-DB-Queries"))
+
+    def test_falls_back_to_the_primary(self):
+        # Réplica listada mas ausente de DATABASES.
+        with override_settings(DATABASE_ROUTING={"REPLICAS": ["outra"]}):
+            _, seen = self.handle(self.factory.get("/"))
+        self.assertEqual(seen["before"], "default")
+        # Fora de uma requisição (comandos, threads de fundo).
+        self.assertEqual(router.db_for_read(None), "default")
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+    def ping(self):
+        if not self.alive:
+            raise OSError("conexão perdida")
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def pool(self, **options):
+        opened = []
+
+        def connect():
+            opened.append(FakeConnection(len(opened)))
+            return opened[-1]
+
+        options = {"min_size": 1, "max_size": 2, "timeout": 0.05, **options}
+        # O mesmo ping que o backend entrega ao pool.
+        ping = PooledConnectionMixin().ping_connection
+        pool = ConnectionPool(connect, ping, options)
+        self.addCleanup(pool.close)
+        return pool, opened
+
+    def test_checkout_reuses_idle_connections(self):
+        pool, opened = self.pool()
+        self.assertEqual(len(opened), 1)
+        raw, reused = pool.acquire()
+        self.assertIs(raw, opened[0])
+        self.assertTrue(reused)
+        pool.release(raw)
+        self.assertEqual(pool.acquire(), (raw, True))
+        other, reused = pool.acquire()
+        self.assertFalse(reused)
+        stats = pool.stats()
+        self.assertEqual((stats["size"], stats["in_use"], stats["idle"]), (2, 2, 0))
+        self.assertEqual((stats["checkouts"], stats["created"]), (3, 2))
+
+    def test_checkout_waits_for_a_release_up_to_the_timeout(self):
+        pool, opened = self.pool(timeout=5)
+        first, _ = pool.acquire()
+        pool.acquire()
+        threading.Timer(0.05, pool.release, [first]).start()
+        self.assertEqual(pool.acquire(), (first, True))
+        pool.options["timeout"] = 0.05
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        stats = pool.stats()
+        self.assertEqual((stats["waits"], stats["timeouts"]), (2, 1))
+        self.assertEqual(len(opened), 2)
+
+    def test_old_connections_are_recycled(self):
+        pool, opened = self.pool(max_lifetime=60)
+        pool.idle[0].created_at -= 60
+        raw, reused = pool.acquire()
+        self.assertFalse(reused)
+        self.assertTrue(opened[0].closed)
+        # Vence enquanto em uso: fechada na devolução, não volta ao pool.
+        pool.in_use[id(raw)].created_at -= 60
+        pool.release(raw)
+        self.assertTrue(raw.closed)
+        stats = pool.stats()
+        self.assertEqual((stats["recycled"], stats["size"], stats["idle"]), (2, 0, 0))
+
+    def test_broken_connections_are_replaced(self):
+        pool, opened = self.pool(ping_interval=0)
+        opened[0].alive = False
+        raw, reused = pool.acquire()
+        self.assertIs(raw, opened[1])
+        self.assertFalse(reused)
+        self.assertTrue(opened[0].closed)
+        pool.release(raw, discard=True)
+        self.assertTrue(raw.closed)
+        stats = pool.stats()
+        self.assertEqual((stats["ping_failures"], stats["closed"]), (1, 1))
+        self.assertEqual(stats["size"], 0)
+
+    def test_idle_connections_above_min_size_are_closed(self):
+        pool, opened = self.pool(max_idle=30)
+        first, _ = pool.acquire()
+        second, _ = pool.acquire()
+        pool.release(first)
+        pool.idle[0].released_at -= 30
+        pool.release(second)
+        self.assertTrue(first.closed)
+        self.assertEqual(list(pool.idle)[0].raw, second)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool, opened = self.pool(min_size=0, max_size=1)
+        connect = pool.connect
+        pool.connect = mock.Mock(side_effect=OSError("recusada"))
+        with self.assertRaises(OSError):
+            pool.acquire()
+        pool.connect = connect
+        raw, reused = pool.acquire()
+        self.assertFalse(reused)
+        # Conexão de fora do pool (ex.: de antes de um fork): só fecha.
+        stranger = FakeConnection(99)
+        pool.release(stranger)
+        self.assertTrue(stranger.closed)
+        self.assertEqual(pool.stats()["size"], 1)
+
+
+class QueryProfileHeaderTests(SimpleTestCase):
+    databases = {"default"}
+
+    def get(self):
+        def view(request):
+            for _ in range(3):
+                with connections["default"].cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            return HttpResponse()
+
+        return QueryProfileMiddleware(view)(RequestFactory().get("/"))
+
+    @override_settings(DEBUG=False, QUERY_PROFILE={"REPEATED_THRESHOLD": 2})
+    def test_headers_follow_debug_by_default(self):
+        with self.assertLogs("touccan_backend.query_profile", "WARNING"):
+            response = self.get()
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertFalse(response.has_header("X-DB-Repeated"))
+        with override_settings(DEBUG=True), self.assertLogs(
+            "touccan_backend.query_profile", "WARNING"
+        ):
+            response = self.get()
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+        self.assertRegex(response["X-DB-Repeated"], r"^[0-9a-f]{8}=3$")
+
+    @override_settings(DEBUG=True, QUERY_PROFILE={"HEADERS": False})
+    def test_headers_can_be_turned_off(self):
+        self.assertFalse(self.get().has_header("Server-Timing"))
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": "cache_de_teste",
+            }
+        }
+    )
+    def test_database_cache_queries_are_not_profiled(self):
+        with connections["default"].cursor() as cursor:
+            with profile_queries() as profile:
+                cursor.execute("CREATE TEMP TABLE cache_de_teste (chave TEXT)")
+                for _ in range(6):
+                    cursor.execute("SELECT chave FROM cache_de_teste")
+                cursor.execute("SELECT 1")
+                cursor.execute("DROP TABLE cache_de_teste")
+        self.assertEqual(profile.count, 1)
+        self.assertEqual(profile.repeated(1), [])
+
+
+class RouteMetricsTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        override = override_settings(
+            ROUTE_METRICS={"DIRECTORY": self.directory, "FLUSH_INTERVAL": 0}
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        route_metrics.clear()
+        self.addCleanup(route_metrics.clear)
+        self.middleware = RouteMetricsMiddleware(lambda request: HttpResponse("ok"))
+
+    def request(self, method="GET"):
+        self.middleware(RequestFactory().generic(method, "/nao-existe/"))
+
+    def dead_pid(self):
+        process = subprocess.Popen(["true"])
+        process.wait()
+        return process.pid
+
+    def test_nonstandard_methods_share_one_series(self):
+        for method in ("GET", "PROPFIND", "X-INVENTADO", "BREW"):
+            self.request(method)
+        self.assertEqual(
+            route_metrics.requests,
+            {(UNMATCHED, "GET", "200"): 1, (UNMATCHED, "OTHER", "200"): 3},
+        )
+        self.assertEqual(
+            route_metrics.in_flight, {(UNMATCHED, "GET"): 0, (UNMATCHED, "OTHER"): 0}
+        )
+
+    def test_collect_sums_live_and_dead_workers(self):
+        buckets = [0] * 11
+        write_json(
+            self.directory / f"{self.dead_pid()}.json",
+            {
+                "pid": 0,
+                "requests": [
+                    [UNMATCHED, "GET", "200", 4],
+                    [UNMATCHED, "GET", "500", 1],
+                ],
+                "latency": [[UNMATCHED, "GET", [5, *buckets[1:]], 0.01, 5]],
+                "sizes": [],
+                "in_flight": [[UNMATCHED, "GET", 2]],
+            },
+        )
+        self.request()
+        self.request()
+
+        for _ in range(2):
+            # Na segunda coleta o morto já está em ``archive.json``: nada em dobro.
+            aggregate = collect()
+            self.assertEqual(
+                aggregate.requests,
+                {(UNMATCHED, "GET", "200"): 6, (UNMATCHED, "GET", "500"): 1},
+            )
+            self.assertEqual(aggregate.latency[(UNMATCHED, "GET")].count, 7)
+            self.assertEqual(aggregate.sizes[(UNMATCHED, "GET")].count, 2)
+            # Só as requisições em andamento de processos vivos.
+            self.assertEqual(aggregate.in_flight, {(UNMATCHED, "GET"): 0})
+        self.assertEqual(
+            sorted(path.name for path in self.directory.glob("*.json")),
+            sorted(["archive.json", f"{os.getpid()}.json"]),
+        )
+
+        text = render(aggregate)
+        self.assertIn(
+            'touccan_http_requests_total{route="<unmatched>",method="GET",'
+            'status="200"} 6',
+            text,
+        )
+        self.assertIn(
+            'touccan_http_request_duration_seconds_bucket{route="<unmatched>",'
+            'method="GET",le="+Inf"} 7',
+            text,
+        )
+        self.assertIn(
+            'touccan_http_response_size_bytes_bucket{route="<unmatched>",'
+            'method="GET",le="256"} 2',
+            text,
+        )
+
+    def test_routes_are_labelled_by_pattern_name(self):
+        for slug in ("bola", "rede"):
+            url = reverse("products:product-detail", args=[slug])
+            self.middleware(RequestFactory().get(url))
+        self.assertEqual(
+            route_metrics.requests, {("products:product-detail", "GET", "200"): 2}
+        )
+
+    def test_exceptions_count_as_server_errors(self):
+        def fail(request):
+            raise RuntimeError("falhou")
+
+        with self.assertRaises(RuntimeError):
+            RouteMetricsMiddleware(fail)(RequestFactory().get("/nao-existe/"))
+        self.assertEqual(route_metrics.requests, {(UNMATCHED, "GET", "500"): 1})
+        self.assertEqual(route_metrics.in_flight, {(UNMATCHED, "GET"): 0})
+
+    def test_histogram_buckets_are_inclusive_and_rendered_cumulative(self):
+        histogram = Histogram(3)
+        for value in (0.1, 0.2, 0.5, 9.0):
+            histogram.observe([0.1, 0.5, 1.0], value)
+        self.assertEqual(histogram.buckets, [1, 2, 0])
+        self.assertEqual(histogram.count, 4)
+        histogram.merge([1, 2], 1.0, 3)
+        self.assertEqual((histogram.buckets, histogram.count), ([1, 2, 0], 7))
+
+        self.request()
+        text = render(collect())
+        buckets = [
+            line
+            for line in text.splitlines()
+            if line.startswith("touccan_http_response_size_bytes_bucket")
+        ]
+        # "ok" tem 2 bytes: entra na primeira faixa e em todas as seguintes.
+        self.assertTrue(all(line.endswith(" 1") for line in buckets))
+
+    def test_endpoint_requires_the_token_or_staff(self):
+        def get(**headers):
+            request = RequestFactory().get("/metrics/", headers=headers)
+            request.user = AnonymousUser()
+            return metrics_view(request)
+
+        self.assertEqual(get().status_code, 403)
+        with override_settings(
+            ROUTE_METRICS={"DIRECTORY": self.directory, "TOKEN": "segredo"}
+        ):
+            self.assertEqual(get(authorization="Bearer errado").status_code, 403)
+            response = get(authorization="Bearer segredo")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b"# TYPE touccan_http_requests_total counter", response.content)
+
+
+class StartupTests(SimpleTestCase):
+    # SimpleTestCase recusa consultas: o aquecimento não pode tocar no banco.
+
+    def test_warm_up_counts_routes_and_serializers(self):
+        result = warm_up(force=True)
+        routes = sum(1 for _ in callbacks(get_resolver().url_patterns))
+        self.assertEqual(result["urls"], routes)
+        self.assertGreater(result["serializers"], 5)
+        self.assertGreaterEqual(result["ms"], 0)
+
+    def test_can_be_turned_off(self):
+        with override_settings(STARTUP={"WARM_UP": False}):
+            self.assertIsNone(warm_up())
+            self.assertIsNotNone(warm_up(force=True))
+
+    def test_each_serializer_is_built_once(self):
+        from products.serializers import CategorySerializer
+        from rest_framework import generics
+
+        class Categories(generics.ListAPIView):
+            serializer_class = CategorySerializer
+
+        class NeedsRequest(generics.ListAPIView):
+            def get_serializer_class(self):
+                return self.request.serializer_class
+
+        patterns = [
+            path("a/", Categories.as_view()),
+            path("b/", include([path("c/", Categories.as_view())])),
+            path("d/", NeedsRequest.as_view()),
+            path("e/", lambda request: HttpResponse()),
+        ]
+        with mock.patch.object(
+            CategorySerializer, "fields", new_callable=mock.PropertyMock
+        ) as fields:
+            self.assertEqual(warm_serializers(patterns), 1)
+        fields.assert_called_once()
@@ -17,16 +17,19 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 from products.views import api_root
+from touccan_backend.media import media_urlpatterns
+from touccan_backend.views import database_pools, metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", api_root, name="api-root"),
     path("api/products/", include("products.urls")),
     path("api/users/", include("users.urls")),
+    path("api/transactions/", include("transactions.urls")),
+    path("api/orders/", include("orders.urls")),
+    path("api/database/pools/", database_pools, name="database-pools"),
+    path("metrics/", metrics, name="metrics"),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+urlpatterns += media_urlpatterns()
@@ -1,4 +1,44 @@
-from django.http import JsonResponse
+import os
+
+from django.http import HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .metrics import collect, metrics_options, render
+from .mysql_pool.pool import pool_stats
+
 
 def api_root(request):
     return JsonResponse({"message": "API TOUCCAN rodando!"})
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def database_pools(request):
+    """Estado dos pools de conexão do processo que atendeu a requisição."""
+    return Response({"pid": os.getpid(), "pools": pool_stats()})
+
+
+@require_safe
+def metrics(request):
+    """Métricas por rota de todos os workers, para o Prometheus.
+
+    Com ``ROUTE_METRICS["TOKEN"]`` o coletor envia ``Authorization: Bearer
+    <token>``; sem ele, só usuários da equipe veem as métricas.
+    """
+    options = metrics_options()
+    if options["TOKEN"]:
+        allowed = constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {options['TOKEN']}"
+        )
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponse(status=403)
+    return HttpResponse(
+        render(collect(options)),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "touccan_backend.settings")
 
 application = get_wsgi_application()
+
+# Build the URL resolvers, DRF settings and serializer fields now rather than
+# on the first request (STARTUP["WARM_UP"]; see touccan_backend.startup).
+from touccan_backend.startup import warm_up  # noqa: E402
+
+warm_up()
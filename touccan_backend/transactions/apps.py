@@ -5,3 +5,5 @@ class TransactionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transactions'
 
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,30 @@
+"""Leitura assíncrona (ASGI) do detalhe de uma transação"""
+from django.views.decorators.http import require_safe
+from touccan_backend.async_api import (
+    api_request,
+    json_response,
+    not_authenticated,
+    not_found,
+)
+from touccan_backend.db_routing import ause_replicas
+from .models import Transaction
+from .permissions import is_payment_provider, visible_to
+from .serializers import compiled_transaction
+
+
+@require_safe
+async def transaction_detail(request, pk):
+    """Mesma resposta de TransactionViewSet.retrieve, lida com o ORM assíncrono"""
+    await ause_replicas(request)
+    queryset = Transaction.objects.filter(pk=pk)
+    if not is_payment_provider(request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return not_authenticated()
+        queryset = visible_to(queryset, user)
+    queryset = compiled_transaction.values(queryset)
+    rows = [row async for row in queryset]
+    if not rows:
+        return not_found(Transaction)
+    data = await compiled_transaction.aserialize(rows, {'request': api_request(request)})
+    return json_response(data[0])
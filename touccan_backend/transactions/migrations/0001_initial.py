@@ -0,0 +1,171 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:50
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentMethod",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("description", models.TextField(blank=True)),
+                ("is_active", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Método de Pagamento",
+                "verbose_name_plural": "Métodos de Pagamento",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="Transaction",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "transaction_id",
+                    models.CharField(db_index=True, max_length=100, unique=True),
+                ),
+                (
+                    "order_id",
+                    models.CharField(
+                        db_index=True,
+                        help_text="ID do pedido no sistema externo",
+                        max_length=100,
+                    ),
+                ),
+                ("customer_name", models.CharField(max_length=200)),
+                ("customer_email", models.EmailField(max_length=254)),
+                ("customer_phone", models.CharField(blank=True, max_length=20)),
+                (
+                    "customer_document",
+                    models.CharField(blank=True, help_text="CPF/CNPJ", max_length=20),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="Valor da transação",
+                        max_digits=10,
+                        validators=[
+                            django.core.validators.MinValueValidator(Decimal("0.01"))
+                        ],
+                    ),
+                ),
+                (
+                    "currency",
+                    models.CharField(
+                        default="BRL",
+                        help_text="Código da moeda (BRL, USD, etc)",
+                        max_length=3,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pendente"),
+                            ("processing", "Processando"),
+                            ("approved", "Aprovada"),
+                            ("rejected", "Rejeitada"),
+                            ("cancelled", "Cancelada"),
+                            ("refunded", "Reembolsada"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "description",
+                    models.TextField(blank=True, help_text="Descrição da transação"),
+                ),
+                (
+                    "metadata",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Dados adicionais em formato JSON",
+                    ),
+                ),
+                (
+                    "payment_gateway_response",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Resposta do gateway de pagamento",
+                    ),
+                ),
+                (
+                    "payment_gateway_transaction_id",
+                    models.CharField(
+                        blank=True,
+                        help_text="ID da transação no gateway",
+                        max_length=200,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "processed_at",
+                    models.DateTimeField(
+                        blank=True, help_text="Data de processamento", null=True
+                    ),
+                ),
+                (
+                    "payment_method",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="transactions",
+                        to="transactions.paymentmethod",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Transação",
+                "verbose_name_plural": "Transações",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["transaction_id"], name="transaction_transac_fee96f_idx"
+                    ),
+                    models.Index(
+                        fields=["order_id"], name="transaction_order_i_0e7560_idx"
+                    ),
+                    models.Index(
+                        fields=["status"], name="transaction_status_71abbb_idx"
+                    ),
+                    models.Index(
+                        fields=["created_at", "id"],
+                        name="transaction_created_d05e33_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -80,7 +80,7 @@ class Transaction(models.Model):
             models.Index(fields=['transaction_id']),
             models.Index(fields=['order_id']),
             models.Index(fields=['status']),
-            models.Index(fields=['created_at']),
+            models.Index(fields=['created_at', 'id']),
         ]
 
     def __str__(self):
@@ -0,0 +1,47 @@
+"""Quem pode ver e alterar transações"""
+from django.apps import apps
+from django.conf import settings
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+
+
+def provider_token():
+    return getattr(settings, 'PAYMENT_PROVIDER', {}).get('TOKEN')
+
+
+def is_payment_provider(request):
+    """Retorno do gateway: ``Authorization: Bearer <PAYMENT_PROVIDER['TOKEN']>``"""
+    token = provider_token()
+    return bool(token) and constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    )
+
+
+def visible_to(queryset, user):
+    """Equipe vê tudo; o cliente, só as transações dos próprios pedidos"""
+    if user.is_staff:
+        return queryset
+    orders = (
+        apps.get_model('orders', 'Order')
+        .objects.filter(usuario=user)
+        .values_list(Cast('pk', output_field=CharField()))
+    )
+    return queryset.filter(order_id__in=orders)
+
+
+class IsStaffOrPaymentProvider(BasePermission):
+    """Ações que mudam dinheiro ou status: equipe ou o gateway de pagamento"""
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_staff) or is_payment_provider(request)
+
+
+class IsAuthenticatedOrPaymentProvider(BasePermission):
+    """Leituras: qualquer usuário logado (filtrado por ``visible_to``) ou o gateway"""
+
+    def has_permission(self, request, view):
+        return bool(
+            request.user and request.user.is_authenticated
+        ) or is_payment_provider(request)
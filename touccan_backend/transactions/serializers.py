@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from touccan_backend.compiled import CompiledSerializer
 from .models import Transaction, PaymentMethod, TransactionStatus
 
 
@@ -62,6 +63,14 @@ class TransactionSerializer(serializers.ModelSerializer):
         return value
 
 
+class CompiledTransactionSerializer(CompiledSerializer):
+    """Versão compilada do TransactionSerializer para listagens"""
+    serializer_class = TransactionSerializer
+
+
+compiled_transaction = CompiledTransactionSerializer()
+
+
 class TransactionCreateSerializer(serializers.ModelSerializer):
     """Serializer para criação de transações"""
     
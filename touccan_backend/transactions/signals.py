@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from products import inventory
+
+from .models import Transaction, TransactionStatus
+
+
+@receiver(post_save, sender=Transaction)
+def settle_stock_reservations(sender, instance, **kwargs):
+    """Confirma ou libera as reservas de estoque do pedido conforme o pagamento"""
+    if instance.status == TransactionStatus.APPROVED:
+        inventory.settle_reference(instance.order_id, approved=True)
+    elif instance.status in (TransactionStatus.REJECTED, TransactionStatus.CANCELLED):
+        inventory.settle_reference(instance.order_id, approved=False)
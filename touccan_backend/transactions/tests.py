@@ -0,0 +1,206 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from orders.models import Order
+from products import inventory
+from products.models import Category, Product, StockReservation
+from touccan_backend.testing import QueryBudgetMixin
+
+from .models import PaymentMethod, Transaction, TransactionStatus
+
+
+PROVIDER = {'TOKEN': 'segredo-do-gateway'}
+
+
+@override_settings(PAYMENT_PROVIDER=PROVIDER)
+class TransactionQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Orçamentos de consultas das leituras de transações"""
+
+    @classmethod
+    def setUpTestData(cls):
+        methods = [
+            PaymentMethod.objects.create(name=name)
+            for name in ('Pix', 'Boleto', 'Cartão')
+        ]
+        for index, status in enumerate(TransactionStatus.values * 2):
+            Transaction.objects.create(
+                transaction_id=f'TX-{index}',
+                order_id=f'PED-{index}',
+                customer_name='Cliente',
+                customer_email='cliente@example.com',
+                payment_method=methods[index % len(methods)],
+                amount=Decimal('10.00') + index,
+                status=status,
+            )
+        cls.transaction = Transaction.objects.first()
+
+    def setUp(self):
+        cache.clear()
+        # O token do gateway não consulta o banco (a sessão consultaria).
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {PROVIDER['TOKEN']}"
+
+    def test_transaction_list(self):
+        with self.assertQueryBudget(2, repeated=1):
+            response = self.client.get(reverse('transaction-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_transaction_detail(self):
+        url = reverse('transaction-detail', args=[self.transaction.pk])
+        with self.assertQueryBudget(2, repeated=1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_async_transaction_detail(self):
+        url = reverse('async-transaction-detail', args=[self.transaction.pk])
+        with self.assertQueryBudget(2, repeated=1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_transaction_stats(self):
+        # Totais e contagens por status num único agregado.
+        with self.assertQueryBudget(1):
+            response = self.client.get(reverse('transaction-stats'))
+        self.assertEqual(response.status_code, 200)
+        total = len(TransactionStatus.values) * 2
+        self.assertEqual(response.json(), {
+            'total_transactions': total,
+            'total_amount': float(sum(Decimal('10.00') + index for index in range(total))),
+            'status_counts': dict.fromkeys(TransactionStatus.values, 2),
+        })
+
+    def test_payment_method_list(self):
+        with self.assertQueryBudget(1):
+            response = self.client.get(reverse('payment-method-list'))
+        self.assertEqual(response.status_code, 200)
+
+
+class StockSettlementTests(TestCase):
+    """O resultado do pagamento confirma ou devolve as reservas do pedido"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user('vendedor', password='senha-de-teste')
+        cls.product = Product.objects.create(
+            title='Cafeteira',
+            description='Italiana',
+            price=Decimal('80.00'),
+            stock_quantity=5,
+            category=Category.objects.create(name='Casa'),
+            seller=seller,
+        )
+        cls.method = PaymentMethod.objects.create(name='Pix')
+
+    def setUp(self):
+        self.reservation = inventory.reserve(self.product.pk, 2, reference='PED-7')
+        self.payment = Transaction.objects.create(
+            transaction_id='TX-7',
+            order_id='PED-7',
+            customer_name='Cliente',
+            customer_email='cliente@example.com',
+            payment_method=self.method,
+            amount=Decimal('160.00'),
+        )
+
+    def stock(self):
+        return Product.objects.get(pk=self.product.pk).stock_quantity
+
+    def test_approval_commits_the_reservations(self):
+        self.payment.mark_as_approved()
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, StockReservation.COMMITTED)
+        self.assertEqual(self.stock(), 3)
+
+    def test_rejection_returns_the_stock(self):
+        self.payment.mark_as_rejected(reason='Saldo insuficiente')
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, StockReservation.RELEASED)
+        self.assertEqual(self.stock(), 5)
+        # Uma aprovação tardia não baixa o estoque de novo.
+        self.payment.mark_as_approved()
+        self.assertEqual(self.stock(), 5)
+
+
+@override_settings(PAYMENT_PROVIDER=PROVIDER)
+class TransactionPermissionTests(TestCase):
+    """Cliente só lê as próprias transações; o resto é da equipe e do gateway"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('cliente', password='senha-de-teste')
+        cls.stranger = User.objects.create_user('estranho', password='senha-de-teste')
+        cls.staff = User.objects.create_user(
+            'equipe', password='senha-de-teste', is_staff=True
+        )
+        method = PaymentMethod.objects.create(name='Pix')
+        order = Order.objects.create(
+            usuario=cls.customer, forma_pagamento=method, id_endereco=1
+        )
+        cls.mine, cls.other = (
+            Transaction.objects.create(
+                transaction_id=f'TX-{order_id}',
+                order_id=order_id,
+                customer_name='Cliente',
+                customer_email='cliente@example.com',
+                payment_method=method,
+                amount=Decimal('50.00'),
+            )
+            for order_id in (str(order.pk), 'PED-DE-OUTRO')
+        )
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def approve(self, transaction, **headers):
+        return self.client.post(
+            reverse('transaction-approve', args=[transaction.pk]), **headers
+        )
+
+    def test_anonymous_is_refused(self):
+        self.assertEqual(self.client.get(reverse('transaction-list')).status_code, 403)
+        self.assertEqual(self.approve(self.mine).status_code, 403)
+        url = reverse('async-transaction-detail', args=[self.mine.pk])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_customer_reads_only_own_transactions(self):
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('transaction-list'))
+        self.assertEqual(self.ids(response), [self.mine.pk])
+        hidden = self.client.get(reverse('transaction-detail', args=[self.other.pk]))
+        for name in ('transaction-detail', 'async-transaction-detail'):
+            with self.subTest(name=name):
+                url = reverse(name, args=[self.other.pk])
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), hidden.json())
+                url = reverse(name, args=[self.mine.pk])
+                self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(self.stranger)
+        self.assertEqual(self.ids(self.client.get(reverse('transaction-list'))), [])
+
+    def test_customer_cannot_change_transactions(self):
+        self.client.force_login(self.customer)
+        self.assertEqual(self.approve(self.mine).status_code, 403)
+        response = self.client.patch(
+            reverse('transaction-detail', args=[self.mine.pk]),
+            {'amount': '0.01'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(reverse('transaction-stats')).status_code, 403)
+        self.mine.refresh_from_db()
+        self.assertEqual(self.mine.status, TransactionStatus.PENDING)
+        self.assertEqual(self.mine.amount, Decimal('50.00'))
+
+    def test_gateway_and_staff_approve(self):
+        response = self.approve(
+            self.mine, HTTP_AUTHORIZATION=f"Bearer {PROVIDER['TOKEN']}"
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.approve(self.other, HTTP_AUTHORIZATION='Bearer errado')
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.approve(self.other).status_code, 200)
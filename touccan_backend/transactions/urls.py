@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import transaction_detail
 from .views import TransactionViewSet, PaymentMethodViewSet
 
 router = DefaultRouter()
@@ -7,6 +8,7 @@ router.register(r'transactions', TransactionViewSet, basename='transaction')
 router.register(r'payment-methods', PaymentMethodViewSet, basename='payment-method')
 
 urlpatterns = [
+    path('async/transactions/<int:pk>/', transaction_detail, name='async-transaction-detail'),
     path('', include(router.urls)),
 ]
 
@@ -2,29 +2,46 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from django.db.models import Q
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
+from touccan_backend.compiled import CompiledListMixin
+from touccan_backend.db_routing import ReplicaReadMixin
+from touccan_backend.planner import QueryPlanMixin
 from .models import Transaction, PaymentMethod, TransactionStatus
+from .permissions import (
+    IsAuthenticatedOrPaymentProvider,
+    IsStaffOrPaymentProvider,
+    is_payment_provider,
+    visible_to,
+)
 from .serializers import (
     TransactionSerializer,
     TransactionCreateSerializer,
     TransactionUpdateSerializer,
     TransactionStatusUpdateSerializer,
     PaymentMethodSerializer,
+    compiled_transaction,
 )
 
 
-class PaymentMethodViewSet(viewsets.ReadOnlyModelViewSet):
+class PaymentMethodViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet para métodos de pagamento (somente leitura)"""
     queryset = PaymentMethod.objects.filter(is_active=True)
     serializer_class = PaymentMethodSerializer
     permission_classes = [AllowAny]
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ReplicaReadMixin, QueryPlanMixin, CompiledListMixin, viewsets.ModelViewSet):
     """ViewSet para transações"""
     queryset = Transaction.objects.all()
-    permission_classes = [AllowAny]  # Em produção, configure autenticação adequada
+    compiled_serializer = compiled_transaction
+    read_actions = ('list', 'retrieve')
+
+    def get_permissions(self):
+        """Clientes só leem; o resto é da equipe ou do gateway de pagamento"""
+        if self.action in self.read_actions:
+            return [IsAuthenticatedOrPaymentProvider()]
+        return [IsStaffOrPaymentProvider()]
     
     def get_serializer_class(self):
         """Retorna o serializer apropriado baseado na ação"""
@@ -37,6 +54,8 @@ class TransactionViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filtra o queryset baseado nos parâmetros de query"""
         queryset = Transaction.objects.all()
+        if not is_payment_provider(self.request):
+            queryset = visible_to(queryset, self.request.user)
         
         # Filtro por order_id
         order_id = self.request.query_params.get('order_id', None)
@@ -66,7 +85,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
         if to_date:
             queryset = queryset.filter(created_at__lte=to_date)
         
-        return queryset.order_by('-created_at')
+        return self.plan_queryset(queryset.order_by('-created_at'))
 
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -141,15 +160,21 @@ class TransactionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Retorna estatísticas das transações"""
-        queryset = self.get_queryset()
-        
-        total_transactions = queryset.count()
-        total_amount = sum(t.amount for t in queryset)
-        
-        status_counts = {}
-        for status_choice in TransactionStatus.choices:
-            status_counts[status_choice[0]] = queryset.filter(status=status_choice[0]).count()
-        
+        # Uma única consulta: total, soma e uma contagem filtrada por status.
+        totals = self.get_queryset().order_by().aggregate(
+            total_transactions=Count('id'),
+            total_amount=Sum('amount'),
+            **{
+                f'status_{value}': Count('id', filter=Q(status=value))
+                for value in TransactionStatus.values
+            },
+        )
+        total_transactions = totals['total_transactions']
+        total_amount = totals['total_amount'] or 0
+        status_counts = {
+            value: totals[f'status_{value}'] for value in TransactionStatus.values
+        }
+
         return Response({
             'total_transactions': total_transactions,
             'total_amount': float(total_amount),